@@ -0,0 +1,249 @@
+"""
+Shared analysis session for the visualization helpers.
+
+An AnalysisSession owns one corpus of texts and computes each heavy artifact
+once: embeddings, reduced embeddings, 2-D projections, cluster labels and a
+single corpus-wide TF-IDF matrix (sliced per cluster for keywords). Everything
+is persisted under cache_dir/<hash of the corpus and embedding model>/, so
+re-running a plotting script with the same texts and model loads the artifacts
+instead of recomputing them.
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from embedding import embedding_model_id
+from matching_algorithm import compute_embeddings
+from projection import Projection, cluster_embeddings, layout_embeddings, reduce_dimensions
+
+
+# Custom stopwords for healthcare/resume context
+HEALTHCARE_STOPWORDS = [
+    "the", "to", "and", "of", "at", "my", "a", "an", "in", "is", "for", "with",
+    "i", "we", "this", "about", "by", "your", "as", "be", "that", "can",
+    "have", "has", "will", "would", "should", "may", "must", "could",
+    "it", "on", "or", "are", "was", "were", "been", "being", "do", "does",
+    "did", "but", "if", "so", "such", "no", "not", "only", "than", "too",
+    "very", "just", "also", "more", "most", "some", "any", "each", "all",
+    "both", "few", "own", "other", "same", "different", "new", "old",
+    "work", "working", "experience", "years", "year", "patient", "patients"
+]
+
+
+def text_hash(texts: Sequence[str]) -> str:
+    """Stable short hash of a list of texts."""
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()[:16]
+
+
+def fit_tfidf(texts: Sequence[str]) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """Fit one TF-IDF model over all texts. Returns (matrix, terms)."""
+    vectorizer = TfidfVectorizer(
+        stop_words=HEALTHCARE_STOPWORDS,
+        ngram_range=(1, 2),
+        max_features=1000
+    )
+    matrix = vectorizer.fit_transform(texts)
+    return matrix.tocsr(), vectorizer.get_feature_names_out()
+
+
+def keywords_for_groups(
+    matrix: sparse.csr_matrix,
+    terms: np.ndarray,
+    groups: Dict[int, Sequence[int]],
+    top_n: int = 3
+) -> Dict[int, str]:
+    """
+    Label each group of rows with its highest-scoring TF-IDF terms.
+    Rows are sliced out of one shared matrix, so IDF weights are corpus-wide.
+    """
+    keywords = {}
+    for label, rows in groups.items():
+        if len(rows) == 0 or len(terms) == 0:
+            keywords[label] = f"Cluster {label}"
+            continue
+        scores = np.asarray(matrix[list(rows)].sum(axis=0)).ravel()
+        top_indices = scores.argsort()[::-1][:top_n]
+        keywords[label] = ", ".join(terms[i] for i in top_indices[:2])  # Top 2 for label
+    return keywords
+
+
+class AnalysisSession:
+    """
+    Computes and caches analysis artifacts for one corpus of texts.
+
+    Pass precomputed embeddings (rows aligned with texts) to skip encoding
+    entirely; otherwise they are computed on first use.
+    """
+
+    def __init__(
+        self,
+        texts: List[str],
+        labels: Optional[Sequence[int]] = None,
+        embeddings: Optional[np.ndarray] = None,
+        cache_dir: str = "analysis_cache",
+        n_components: int = 50,
+        reduction: str = "pca",
+        max_points: Optional[int] = None,
+        random_state: int = 42
+    ):
+        self.texts = texts
+        self.labels = np.asarray(labels) if labels is not None else np.zeros(len(texts), dtype=int)
+        self.n_components = n_components
+        self.reduction = reduction
+        self.max_points = max_points
+        self.random_state = random_state
+
+        self.cache_dir = os.path.join(cache_dir, text_hash([embedding_model_id(), *texts]))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._embeddings = embeddings
+        self._row_by_text = {text: i for i, text in enumerate(texts)}
+        self._extra_embeddings: Dict[str, np.ndarray] = {}
+        self._reduced: Dict[str, np.ndarray] = {}
+        self._projections: Dict[str, Projection] = {}
+        self._clusters: Dict[int, np.ndarray] = {}
+        self._tfidf: Optional[Tuple[sparse.csr_matrix, np.ndarray]] = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Embeddings for the corpus, one row per text."""
+        if self._embeddings is None:
+            path = self._path("embeddings.npy")
+            if os.path.exists(path):
+                self._embeddings = np.load(path)
+            else:
+                print(f"Computing embeddings for {len(self.texts)} texts...")
+                self._embeddings = compute_embeddings(self.texts)
+                np.save(path, self._embeddings)
+        return self._embeddings
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeddings for arbitrary texts. Corpus texts reuse their stored rows;
+        only unseen texts are encoded (and cached for later calls).
+        """
+        path = self._path("extra_embeddings.npz")
+        if not self._extra_embeddings and os.path.exists(path):
+            self._extra_embeddings = dict(np.load(path))
+
+        missing = [
+            t for t in dict.fromkeys(texts)
+            if t not in self._row_by_text and text_hash([t]) not in self._extra_embeddings
+        ]
+        if missing:
+            print(f"Computing embeddings for {len(missing)} new texts...")
+            for text, embedding in zip(missing, compute_embeddings(missing)):
+                self._extra_embeddings[text_hash([text])] = embedding
+            np.savez(path, **self._extra_embeddings)
+
+        return np.vstack([
+            self.embeddings[self._row_by_text[t]] if t in self._row_by_text
+            else self._extra_embeddings[text_hash([t])]
+            for t in texts
+        ])
+
+    def reduced(self, texts: Optional[List[str]] = None) -> np.ndarray:
+        """
+        PCA / random-projection reduced embeddings for the corpus, or for
+        another list of texts. Clustering needs only these, not the t-SNE layout.
+        """
+        key = "corpus" if texts is None else text_hash(texts)
+        if key not in self._reduced:
+            path = self._path(f"reduced_{key}_{self.reduction}{self.n_components}.npy")
+            if os.path.exists(path):
+                self._reduced[key] = np.load(path)
+            else:
+                embeddings = self.embeddings if texts is None else self.embed(texts)
+                print(f"Reducing {embeddings.shape[0]} embeddings to {self.n_components} dimensions ({self.reduction})...")
+                reduced = reduce_dimensions(embeddings, self.n_components, self.reduction, self.random_state)
+                np.save(path, reduced)
+                self._reduced[key] = reduced
+        return self._reduced[key]
+
+    def projection(
+        self,
+        texts: Optional[List[str]] = None,
+        labels: Optional[Sequence[int]] = None,
+        always_include: Optional[List[int]] = None
+    ) -> Projection:
+        """
+        Reduced embeddings and 2-D layout for the corpus, or for another list
+        of texts (embedded through embed()).
+        """
+        sample_labels = self.labels if texts is None else labels
+        # Labels and always_include decide the stratified sample, so they are part of the key
+        sample_key = text_hash([
+            "" if sample_labels is None else ",".join(map(str, np.asarray(sample_labels).tolist())),
+            ",".join(map(str, sorted(always_include or []))),
+        ])
+        key = ("corpus" if texts is None else text_hash(texts)) + f"_{sample_key}"
+        if key in self._projections:
+            return self._projections[key]
+
+        reduced = self.reduced(texts)
+        path = self._path(
+            f"projection_{key}_{self.reduction}{self.n_components}_{self.max_points}.npz"
+        )
+        if os.path.exists(path):
+            data = np.load(path)
+            coords, indices = data["coords"], data["indices"]
+        else:
+            coords, indices = layout_embeddings(
+                reduced,
+                sample_labels,
+                max_points=self.max_points,
+                always_include=always_include,
+                random_state=self.random_state
+            )
+            np.savez(path, coords=coords, indices=indices)
+
+        projection = Projection(reduced=reduced, coords=coords, indices=indices)
+        self._projections[key] = projection
+        return projection
+
+    def cluster_labels(self, n_clusters: int = 5) -> np.ndarray:
+        """MiniBatchKMeans cluster labels over the reduced corpus embeddings."""
+        if n_clusters not in self._clusters:
+            path = self._path(f"clusters_{self.reduction}{self.n_components}_{n_clusters}.npy")
+            if os.path.exists(path):
+                self._clusters[n_clusters] = np.load(path)
+            else:
+                labels = cluster_embeddings(self.reduced(), n_clusters, self.random_state)
+                np.save(path, labels)
+                self._clusters[n_clusters] = labels
+        return self._clusters[n_clusters]
+
+    def tfidf(self) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        """One corpus-wide TF-IDF matrix and its terms."""
+        if self._tfidf is None:
+            matrix_path, terms_path = self._path("tfidf.npz"), self._path("tfidf_terms.json")
+            if os.path.exists(matrix_path) and os.path.exists(terms_path):
+                with open(terms_path) as f:
+                    terms = np.array(json.load(f), dtype=object)
+                self._tfidf = (sparse.load_npz(matrix_path).tocsr(), terms)
+            else:
+                matrix, terms = fit_tfidf(self.texts)
+                sparse.save_npz(matrix_path, matrix)
+                with open(terms_path, "w") as f:
+                    json.dump(terms.tolist(), f)
+                self._tfidf = (matrix, terms)
+        return self._tfidf
+
+    def cluster_keywords(self, n_clusters: int = 5, top_n: int = 3) -> Dict[int, str]:
+        """Top TF-IDF terms per cluster, sliced from the corpus-wide matrix."""
+        cluster_labels = self.cluster_labels(n_clusters)
+        groups = {int(label): np.flatnonzero(cluster_labels == label) for label in np.unique(cluster_labels)}
+        matrix, terms = self.tfidf()
+        return keywords_for_groups(matrix, terms, groups, top_n)
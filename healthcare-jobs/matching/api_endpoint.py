@@ -3,24 +3,41 @@ FastAPI endpoint for the matching algorithm.
 This can be deployed as a separate microservice or integrated with the Next.js app.
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import math
 import os
 
+import numpy as np
+
 from matching_algorithm import (
     Job, Candidate, MatchResult,
     match_candidate_to_job,
     match_all_candidates_to_job,
+    match_candidates_by_requirements,
     generate_ideal_resume,
     compute_embeddings,
     compute_similarity,
     fetch_jobs_from_db,
     fetch_candidates_from_db,
+    fetch_candidate_from_db,
     save_matches_to_db,
-    run_matching_pipeline
+    run_matching_pipeline,
+    JobIndex,
+    JOB_INDEX_PATH,
+    build_job_index,
+    load_job_index,
+    match_candidate_to_jobs,
+    score_jobs_against_candidates,
+    select_top_k
 )
+from cache import REQUIREMENT_CACHE_PATH, EmbeddingCache, IdealResumeCache
+from ingest import extract_and_normalize, ingest_resumes, process_match_queue
 
 app = FastAPI(
     title="Healthcare Job Matching API",
@@ -37,6 +54,78 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Precomputed ideal-resume embeddings for all jobs, loaded on first use
+job_index: Optional[JobIndex] = None
+job_index_mtime: Optional[float] = None
+
+
+def get_job_index() -> Optional[JobIndex]:
+    """
+    Return the cached job index, loading it from disk if needed. Reloads when
+    the file changes, so every serve.py worker picks up a rebuild made by
+    another worker or by the pipeline.
+    """
+    global job_index, job_index_mtime
+    mtime = os.path.getmtime(JOB_INDEX_PATH) if os.path.exists(JOB_INDEX_PATH) else None
+    if job_index is None or mtime != job_index_mtime:
+        job_index = load_job_index()
+        job_index_mtime = mtime
+    return job_index
+
+
+# Requirement and resume-chunk embeddings shared by requirement-level scoring
+requirement_cache = EmbeddingCache(REQUIREMENT_CACHE_PATH)
+
+# Resume embeddings, filled at ingest time and read when matching candidates
+embedding_cache = EmbeddingCache()
+
+# Ideal resumes by job fingerprint, so batch requests repeating a job reuse it
+ideal_cache = IdealResumeCache()
+
+# Requests only add to the caches in memory; they are written to disk in the
+# background at most every CACHE_SAVE_INTERVAL seconds, and on shutdown
+CACHE_SAVE_INTERVAL = float(os.getenv("CACHE_SAVE_INTERVAL", "60"))
+cache_saver: Optional[asyncio.Task] = None
+
+
+def save_caches() -> None:
+    ideal_cache.save()
+    embedding_cache.save()
+    requirement_cache.save()
+
+
+async def save_caches_periodically() -> None:
+    while True:
+        await asyncio.sleep(CACHE_SAVE_INTERVAL)
+        try:
+            await run_in_threadpool(save_caches)
+        except Exception as e:
+            print(f"⚠️ Failed to save caches: {e}")
+
+
+@app.on_event("startup")
+async def start_cache_saver():
+    # Started per process, so serve.py's forked workers each get their own
+    global cache_saver
+    cache_saver = asyncio.create_task(save_caches_periodically())
+
+
+@app.on_event("shutdown")
+async def stop_cache_saver():
+    if cache_saver is not None:
+        cache_saver.cancel()
+    await run_in_threadpool(save_caches)
+
+# PDF text extraction is CPU-bound; keep it off the event loop
+pdf_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global pdf_pool
+    if pdf_pool is None:
+        pdf_pool = ProcessPoolExecutor(max_workers=2)
+    return pdf_pool
+
 
 # ============================================================================
 # Request/Response Models
@@ -61,11 +150,27 @@ class CandidateInput(BaseModel):
     resume_text: str
 
 
+class BatchMatchRequest(BaseModel):
+    jobs: List[JobInput]
+    candidates: List[CandidateInput]
+    threshold: float = 0.5
+    top_k: Optional[int] = None
+    include_scores: bool = False
+
+
 class MatchResponse(BaseModel):
     job_id: str
     user_id: str
     similarity_score: float
     match_percentage: str
+    requirement_coverage: Optional[Dict[str, float]] = None
+
+
+class BatchMatchResponse(BaseModel):
+    matches: Dict[str, List[MatchResponse]]
+    failed_jobs: List[str] = []
+    # Full (jobs x candidates) score matrix in request order, if requested
+    scores: Optional[List[List[Optional[float]]]] = None
 
 
 class IdealResumeResponse(BaseModel):
@@ -73,6 +178,18 @@ class IdealResumeResponse(BaseModel):
     ideal_resume: str
 
 
+class JobIndexResponse(BaseModel):
+    status: str
+    jobs_indexed: int
+
+
+class IngestResponse(BaseModel):
+    user_id: str
+    characters: int
+    queued: bool
+    matches_created: int = 0
+
+
 class PipelineResponse(BaseModel):
     status: str
     jobs_processed: int
@@ -80,6 +197,29 @@ class PipelineResponse(BaseModel):
     matches_created: int
 
 
+def to_job(job: JobInput) -> Job:
+    return Job(
+        job_id=job.job_id,
+        job_name=job.job_name,
+        company_name=job.company_name,
+        city=job.city,
+        state=job.state,
+        hourly_wage_minimum=job.hourly_wage_minimum,
+        hourly_wage_maximum=job.hourly_wage_maximum,
+        job_description=job.job_description,
+        job_requirements=job.job_requirements
+    )
+
+
+def to_candidate(candidate: CandidateInput) -> Candidate:
+    return Candidate(
+        user_id=candidate.user_id,
+        name=candidate.name,
+        email=candidate.email,
+        resume_text=candidate.resume_text
+    )
+
+
 # ============================================================================
 # Endpoints
 # ============================================================================
@@ -91,28 +231,13 @@ async def root():
 
 @app.post("/match/single", response_model=MatchResponse)
 async def match_single_candidate(job: JobInput, candidate: CandidateInput):
-    """Match a single candidate to a single job."""
+    """
+    Match a single candidate to a single job.
+    Runs in the threadpool, so concurrent requests for the same job share
+    one ideal-resume call instead of queueing behind each other.
+    """
     try:
-        job_obj = Job(
-            job_id=job.job_id,
-            job_name=job.job_name,
-            company_name=job.company_name,
-            city=job.city,
-            state=job.state,
-            hourly_wage_minimum=job.hourly_wage_minimum,
-            hourly_wage_maximum=job.hourly_wage_maximum,
-            job_description=job.job_description,
-            job_requirements=job.job_requirements
-        )
-        
-        candidate_obj = Candidate(
-            user_id=candidate.user_id,
-            name=candidate.name,
-            email=candidate.email,
-            resume_text=candidate.resume_text
-        )
-        
-        result = match_candidate_to_job(job_obj, candidate_obj)
+        result = await run_in_threadpool(match_candidate_to_job, to_job(job), to_candidate(candidate))
         
         return MatchResponse(
             job_id=result.job_id,
@@ -124,12 +249,61 @@ async def match_single_candidate(job: JobInput, candidate: CandidateInput):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/match/batch", response_model=BatchMatchResponse)
+async def match_batch(request: BatchMatchRequest):
+    """
+    Match many jobs against many candidates in one request.
+    Each distinct job's ideal resume is generated once and cached across
+    requests; all resumes are encoded in batches. Returns the matches above
+    threshold per job (best top_k if set), and the full score matrix with
+    include_scores.
+    """
+    try:
+        jobs = [to_job(job) for job in request.jobs]
+        candidates = [to_candidate(candidate) for candidate in request.candidates]
+        scores, failed_jobs = await run_in_threadpool(
+            score_jobs_against_candidates, jobs, candidates, ideal_cache, embedding_cache
+        )
+        
+        matches: Dict[str, List[MatchResponse]] = {}
+        for job, row in zip(jobs, scores):
+            if job.job_id in failed_jobs:
+                continue
+            above = np.flatnonzero(row >= request.threshold)
+            matches[job.job_id] = [
+                MatchResponse(
+                    job_id=job.job_id,
+                    user_id=candidates[i].user_id,
+                    similarity_score=float(row[i]),
+                    match_percentage=f"{row[i]:.1%}"
+                )
+                for i in above[select_top_k(row[above], request.top_k)]
+            ]
+        
+        return BatchMatchResponse(
+            matches=matches,
+            failed_jobs=failed_jobs,
+            scores=[
+                [None if math.isnan(score) else round(float(score), 6) for score in row]
+                for row in scores
+            ] if request.include_scores else None
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/match/job/{job_id}", response_model=List[MatchResponse])
 async def match_all_candidates_for_job(
     job_id: str,
-    threshold: float = 0.5
+    threshold: float = 0.5,
+    top_k: Optional[int] = None,
+    scoring: Literal["ideal_resume", "requirements"] = "ideal_resume"
 ):
-    """Match all candidates in the database to a specific job."""
+    """
+    Match all candidates in the database to a specific job.
+    Set top_k to return only the best matches. scoring=requirements skips
+    the ideal resume (no LLM call) and reports per-requirement coverage.
+    """
     try:
         # Fetch job from database
         jobs = fetch_jobs_from_db()
@@ -145,7 +319,56 @@ async def match_all_candidates_for_job(
             return []
         
         # Run matching
-        matches = match_all_candidates_to_job(job, candidates, threshold)
+        if scoring == "requirements":
+            matches = await run_in_threadpool(
+                match_candidates_by_requirements,
+                job, candidates, threshold, top_k=top_k, cache=requirement_cache
+            )
+        else:
+            matches = await run_in_threadpool(match_all_candidates_to_job, job, candidates, threshold, top_k=top_k)
+        
+        return [
+            MatchResponse(
+                job_id=m.job_id,
+                user_id=m.user_id,
+                similarity_score=m.similarity_score,
+                match_percentage=f"{m.similarity_score:.1%}",
+                requirement_coverage=m.requirement_coverage
+            )
+            for m in matches
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/match/candidate/{user_id}", response_model=List[MatchResponse])
+async def match_jobs_for_candidate(
+    user_id: str,
+    top_k: int = 10,
+    threshold: float = 0.5
+):
+    """
+    Find the top jobs for one candidate using the precomputed job index.
+    Matches are saved to the database right away.
+    """
+    try:
+        index = get_job_index()
+        if index is None:
+            raise HTTPException(
+                status_code=503,
+                detail="Job index not built yet. Run the pipeline or POST /job-index/rebuild."
+            )
+        
+        candidate = await run_in_threadpool(fetch_candidate_from_db, user_id)
+        if not candidate:
+            raise HTTPException(status_code=404, detail=f"Candidate {user_id} not found or has no resume")
+        
+        matches = await run_in_threadpool(
+            match_candidate_to_jobs, candidate, index, top_k, threshold, embedding_cache
+        )
+        await run_in_threadpool(save_matches_to_db, matches)
         
         return [
             MatchResponse(
@@ -162,23 +385,85 @@ async def match_all_candidates_for_job(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/candidates/{user_id}/resume", response_model=IngestResponse)
+async def upload_resume(
+    user_id: str,
+    file: UploadFile = File(...),
+    match_now: bool = False,
+    top_k: int = 10,
+    threshold: float = 0.5
+):
+    """
+    Ingest a PDF resume: extract and normalize its text, store it, embed it
+    and queue the candidate for matching. With match_now, the candidate is
+    matched against the job index right away.
+    """
+    try:
+        data = await file.read()
+        text = await asyncio.get_running_loop().run_in_executor(get_pdf_pool(), extract_and_normalize, data)
+        if not text:
+            raise HTTPException(status_code=422, detail="No text could be extracted from the PDF")
+        
+        # Matched right away, or queued for the next /match/queue/process
+        index = get_job_index() if match_now else None
+        if not await run_in_threadpool(ingest_resumes, {user_id: text}, embedding_cache, index is None):
+            raise HTTPException(status_code=404, detail=f"Candidate {user_id} not found")
+        
+        matches_created = 0
+        if index is not None:
+            candidate = Candidate(user_id=user_id, name="", email="", resume_text=text)
+            matches = await run_in_threadpool(
+                match_candidate_to_jobs, candidate, index, top_k, threshold, embedding_cache
+            )
+            await run_in_threadpool(save_matches_to_db, matches)
+            matches_created = len(matches)
+        
+        return IngestResponse(
+            user_id=user_id,
+            characters=len(text),
+            queued=index is None,
+            matches_created=matches_created
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/match/queue/process")
+async def process_queued_candidates(top_k: int = 10, threshold: float = 0.5):
+    """Match every candidate queued by resume ingestion against the job index."""
+    try:
+        matched = await run_in_threadpool(process_match_queue, top_k, threshold, embedding_cache)
+        return {"status": "completed", "candidates_matched": matched}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/job-index/rebuild", response_model=JobIndexResponse)
+async def rebuild_job_index():
+    """
+    Regenerate ideal resumes for all jobs and rebuild the job index. The index
+    is saved to JOB_INDEX_PATH, so other serve.py workers reload it too.
+    """
+    global job_index, job_index_mtime
+    try:
+        jobs = await run_in_threadpool(fetch_jobs_from_db)
+        job_index = await run_in_threadpool(build_job_index, jobs, JOB_INDEX_PATH)
+        job_index_mtime = os.path.getmtime(JOB_INDEX_PATH)
+        return JobIndexResponse(status="completed", jobs_indexed=len(job_index.job_ids))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/generate-ideal-resume", response_model=IdealResumeResponse)
 async def generate_ideal_resume_endpoint(job: JobInput):
-    """Generate an ideal resume for a job posting using GPT-4o."""
+    """
+    Generate an ideal resume for a job posting using GPT-4o.
+    Concurrent requests for the same job share one call.
+    """
     try:
-        job_obj = Job(
-            job_id=job.job_id,
-            job_name=job.job_name,
-            company_name=job.company_name,
-            city=job.city,
-            state=job.state,
-            hourly_wage_minimum=job.hourly_wage_minimum,
-            hourly_wage_maximum=job.hourly_wage_maximum,
-            job_description=job.job_description,
-            job_requirements=job.job_requirements
-        )
-        
-        ideal_resume = generate_ideal_resume(job_obj)
+        ideal_resume = await run_in_threadpool(generate_ideal_resume, to_job(job))
         
         return IdealResumeResponse(
             job_id=job.job_id,
@@ -192,14 +477,23 @@ async def generate_ideal_resume_endpoint(job: JobInput):
 async def run_full_pipeline(
     background_tasks: BackgroundTasks,
     threshold: float = 0.5,
-    async_mode: bool = False
+    async_mode: bool = False,
+    top_k: Optional[int] = None,
+    top_m: Optional[int] = None
 ):
     """
     Run the complete matching pipeline for all jobs and candidates.
     Can be run synchronously or in the background.
+    top_k / top_m cap the saved matches per job / per candidate.
     """
+    global job_index
+    # The pipeline rewrites the job index on disk; reload it on next use
+    job_index = None
+    
     if async_mode:
-        background_tasks.add_task(run_matching_pipeline, threshold)
+        background_tasks.add_task(
+            run_matching_pipeline, similarity_threshold=threshold, top_k=top_k, top_m=top_m
+        )
         return PipelineResponse(
             status="started",
             jobs_processed=0,
@@ -208,7 +502,7 @@ async def run_full_pipeline(
         )
     else:
         try:
-            results = run_matching_pipeline(threshold)
+            results = run_matching_pipeline(similarity_threshold=threshold, top_k=top_k, top_m=top_m)
             return PipelineResponse(
                 status="completed",
                 jobs_processed=results["jobs"],
@@ -225,7 +519,9 @@ async def health_check():
     return {
         "status": "healthy",
         "openai_configured": bool(os.getenv("OPENAI_API_KEY")),
-        "supabase_configured": bool(os.getenv("SUPABASE_URL"))
+        "supabase_configured": bool(os.getenv("SUPABASE_URL")),
+        "storage_backend": os.getenv("STORAGE_BACKEND", "supabase"),
+        "worker_pid": os.getpid()
     }
 
 
@@ -0,0 +1,252 @@
+"""
+Columnar run artifacts for offline analysis.
+
+Every matching run writes a versioned directory under ARTIFACTS_DIR
+(<kind>-<UTC timestamp>-<pid>, optionally with a shard suffix):
+
+- scores.parquet: one row per scored pair (job_id, user_id, score, ...),
+  written in row groups as the run goes. Without pyarrow installed, each
+  chunk of rows is written as scores.<column>.partNNNNN.npy as the run goes,
+  and close() joins the parts into one scores.<column>.npy per column.
+- embeddings.f32: every embedding used in the run as one float32 matrix,
+  read back with np.memmap, plus embedding_ids.npy / embedding_kinds.npy
+  saying which row belongs to which job ("job") or candidate ("candidate").
+- manifest.json: format version, embedding model, run parameters and
+  summary. It is written last, so only completed runs are listed.
+
+The loaders memory-map the files, so analysis scripts read scores and
+embeddings without re-querying the database or re-encoding anything.
+Embeddings and .npy score columns are not copied into memory; Parquet
+columns are read from a memory-mapped file but converted to numpy arrays,
+which copies columns that span several row groups.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from embedding import embedding_model_id
+
+ARTIFACTS_DIR = os.getenv("RUN_ARTIFACTS_DIR", "run_artifacts")
+ARTIFACT_FORMAT_VERSION = 1
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        return None
+
+
+class RunArtifactWriter:
+    """Streams one run's scores and embeddings to disk; call close() at the end."""
+
+    def __init__(
+        self,
+        kind: str,
+        params: Optional[Dict] = None,
+        root: str = ARTIFACTS_DIR,
+        suffix: str = "",
+        chunk_rows: int = 100_000
+    ):
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.run_id = f"{kind}-{stamp}-{os.getpid()}{suffix}"
+        self.run_dir = os.path.join(root, self.run_id)
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.kind = kind
+        self.params = params or {}
+        self.chunk_rows = chunk_rows
+
+        self._pa = _pyarrow()
+        self._parquet_writer = None
+        self._columns: Dict[str, List[np.ndarray]] = {}
+        self._pending_rows = 0
+        self._npy_parts: Dict[str, List[str]] = {}
+        self.score_rows = 0
+
+        self._embedding_file = None
+        self._embedding_ids: List[str] = []
+        self._embedding_kinds: List[str] = []
+        self._embedding_dim: Optional[int] = None
+
+    def add_scores(self, **columns: Sequence) -> None:
+        """Append score rows; every column must have the same length."""
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError(f"Score columns have different lengths: {lengths}")
+        for name, values in columns.items():
+            self._columns.setdefault(name, []).append(np.asarray(values))
+        self._pending_rows += lengths.pop()
+        if self._pending_rows >= self.chunk_rows:
+            self._flush_scores()
+
+    def _flush_scores(self) -> None:
+        if not self._pending_rows:
+            return
+        chunk = {name: np.concatenate(parts) for name, parts in self._columns.items()}
+        self._columns = {}
+        self.score_rows += self._pending_rows
+        self._pending_rows = 0
+        if self._pa is None:
+            # No Parquet without pyarrow; write the chunk's columns as .npy parts
+            for name, values in chunk.items():
+                parts = self._npy_parts.setdefault(name, [])
+                path = os.path.join(self.run_dir, f"scores.{name}.part{len(parts):05d}.npy")
+                np.save(path, values)
+                parts.append(path)
+            return
+        table = self._pa.table({name: self._pa.array(values) for name, values in chunk.items()})
+        if self._parquet_writer is None:
+            self._parquet_writer = self._pa.parquet.ParquetWriter(
+                os.path.join(self.run_dir, "scores.parquet"), table.schema
+            )
+        self._parquet_writer.write_table(table)
+
+    def add_embeddings(self, ids: Sequence[str], kind: str, embeddings: np.ndarray) -> None:
+        """Append embedding rows for ids (kind: "job" or "candidate")."""
+        if not len(ids):
+            return
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self._embedding_dim is None:
+            self._embedding_dim = embeddings.shape[1]
+            self._embedding_file = open(os.path.join(self.run_dir, "embeddings.f32"), "wb")
+        elif embeddings.shape[1] != self._embedding_dim:
+            raise ValueError(f"Expected {self._embedding_dim}-dim embeddings, got {embeddings.shape[1]}")
+        self._embedding_file.write(embeddings.tobytes())
+        self._embedding_ids.extend(str(i) for i in ids)
+        self._embedding_kinds.extend([kind] * len(ids))
+
+    def close(self, summary: Optional[Dict] = None) -> str:
+        """Finish every file and write the manifest. Returns the run directory."""
+        self._flush_scores()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        for name, paths in self._npy_parts.items():
+            _join_npy_parts(paths, os.path.join(self.run_dir, f"scores.{name}.npy"))
+        if self._embedding_file is not None:
+            self._embedding_file.close()
+            np.save(os.path.join(self.run_dir, "embedding_ids.npy"), np.array(self._embedding_ids, dtype=str))
+            np.save(os.path.join(self.run_dir, "embedding_kinds.npy"), np.array(self._embedding_kinds, dtype=str))
+
+        manifest = {
+            "format_version": ARTIFACT_FORMAT_VERSION,
+            "run_id": self.run_id,
+            "kind": self.kind,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "embedding_model": embedding_model_id(),
+            "params": self.params,
+            "summary": summary or {},
+            "scores": {
+                "format": "parquet" if self._pa is not None else "npy",
+                "rows": self.score_rows,
+            },
+            "embeddings": {
+                "rows": len(self._embedding_ids),
+                "dim": self._embedding_dim,
+                "dtype": "float32",
+            },
+        }
+        with open(os.path.join(self.run_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2, default=str)
+        return self.run_dir
+
+
+def _join_npy_parts(paths: List[str], path: str) -> None:
+    """Concatenate 1-D .npy files into one, through memory maps, then remove the parts."""
+    parts = [np.load(part, mmap_mode="r") for part in paths]
+    # String columns may have a different width per part; take the widest
+    dtype = np.result_type(*parts)
+    joined = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(sum(len(p) for p in parts),))
+    offset = 0
+    for part in parts:
+        joined[offset:offset + len(part)] = part
+        offset += len(part)
+    joined.flush()
+    del joined, parts
+    for part in paths:
+        os.remove(part)
+
+
+@dataclass
+class RunEmbeddings:
+    """Memory-mapped embedding matrix of a run and which id each row belongs to."""
+    ids: np.ndarray
+    kinds: np.ndarray
+    matrix: np.ndarray
+
+    def of_kind(self, kind: str):
+        """(ids, embeddings) of the rows of one kind."""
+        rows = np.flatnonzero(self.kinds == kind)
+        return self.ids[rows], self.matrix[rows]
+
+
+def list_runs(root: str = ARTIFACTS_DIR, kind: Optional[str] = None) -> List[str]:
+    """Completed run directories, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    runs = []
+    for name in sorted(os.listdir(root)):
+        run_dir = os.path.join(root, name)
+        if not os.path.exists(os.path.join(run_dir, "manifest.json")):
+            continue
+        if kind is None or load_manifest(run_dir)["kind"] == kind:
+            runs.append(run_dir)
+    return sorted(runs, key=lambda run_dir: load_manifest(run_dir)["created_at"])
+
+
+def latest_run(root: str = ARTIFACTS_DIR, kind: Optional[str] = None) -> Optional[str]:
+    runs = list_runs(root, kind)
+    return runs[-1] if runs else None
+
+
+def load_manifest(run_dir: str) -> Dict:
+    with open(os.path.join(run_dir, "manifest.json")) as f:
+        return json.load(f)
+
+
+def load_scores(run_dir: str, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+    """
+    Score table columns as arrays: memory-mapped for .npy columns, read from
+    a memory-mapped file (but copied where a column spans several row
+    groups) for Parquet.
+    """
+    manifest = load_manifest(run_dir)
+    if manifest["scores"]["format"] == "npy":
+        names = columns or [
+            name[len("scores."):-len(".npy")]
+            for name in sorted(os.listdir(run_dir))
+            if name.startswith("scores.") and name.endswith(".npy")
+        ]
+        return {name: np.load(os.path.join(run_dir, f"scores.{name}.npy"), mmap_mode="r") for name in names}
+
+    path = os.path.join(run_dir, "scores.parquet")
+    if not manifest["scores"]["rows"] or not os.path.exists(path):
+        return {name: np.array([]) for name in columns or []}
+    pa = _pyarrow()
+    if pa is None:
+        raise ImportError("pyarrow is required to read scores.parquet")
+    table = pa.parquet.read_table(path, columns=columns, memory_map=True)
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def load_embeddings(run_dir: str) -> Optional[RunEmbeddings]:
+    """The run's embeddings as a read-only memmap, or None if it saved none."""
+    shape = load_manifest(run_dir)["embeddings"]
+    if not shape["rows"]:
+        return None
+    return RunEmbeddings(
+        ids=np.load(os.path.join(run_dir, "embedding_ids.npy")),
+        kinds=np.load(os.path.join(run_dir, "embedding_kinds.npy")),
+        matrix=np.memmap(
+            os.path.join(run_dir, "embeddings.f32"),
+            dtype=np.float32,
+            mode="r",
+            shape=(shape["rows"], shape["dim"])
+        )
+    )
@@ -0,0 +1,139 @@
+"""
+Write-behind buffer for match results.
+
+Rows are collected in memory and written in bulk once batch_size rows are
+pending or flush_interval seconds have passed since the oldest pending row,
+instead of one database round trip per row. The buffer is flushed on close
+and at interpreter exit; SIGINT/SIGTERM only raise in the main thread, so the
+run unwinds and the exit flush writes what is pending, and a stopped run keeps
+every score it already paid for. Batches that still fail after retries, or
+whose write was interrupted, are appended to a local JSONL file
+(FAILED_WRITES_PATH) so they can be replayed later.
+"""
+
+import atexit
+import json
+import os
+import signal
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from concurrency import call_with_retry
+
+FAILED_WRITES_PATH = os.getenv("FAILED_WRITES_PATH", "failed_writes.jsonl")
+
+
+class BatchWriter:
+    """
+    Buffers rows and hands them to write_rows in batches.
+    write_rows receives a list of row dicts and should raise on failure.
+    Safe to use from several threads.
+    """
+
+    def __init__(
+        self,
+        write_rows: Callable[[List[Dict]], None],
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+        max_retries: int = 3,
+        failed_path: str = FAILED_WRITES_PATH,
+        handle_signals: bool = True
+    ):
+        self.write_rows = write_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.failed_path = failed_path
+
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.batches_written = 0
+
+        self._pending: List[Dict] = []
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._failed_lock = threading.Lock()
+        self._closed = threading.Event()
+
+        # Time-based flush for slow producers
+        self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._timer.start()
+
+        atexit.register(self.close)
+        if handle_signals and threading.current_thread() is threading.main_thread():
+            self._install_signal_handlers()
+
+    def add(self, row: Dict) -> None:
+        """Queue a row; flushes when the batch is full."""
+        with self._lock:
+            self._pending.append(row)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write everything pending now."""
+        with self._lock:
+            batch, self._pending, self._oldest = self._pending, [], None
+        if batch:
+            self._write(batch)
+
+    def close(self) -> None:
+        """Flush and stop the background timer. Safe to call more than once."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self.flush()
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _write(self, batch: List[Dict]) -> None:
+        try:
+            # Serialize writes so batches land in order and counters stay consistent
+            with self._write_lock:
+                call_with_retry(self.write_rows, batch, max_retries=self.max_retries)
+                self.rows_written += len(batch)
+                self.batches_written += 1
+        except BaseException as e:
+            # Also on KeyboardInterrupt/SystemExit: the batch is no longer pending
+            # anywhere else, so save it before the interrupt propagates
+            self._save_failed(batch, e)
+            if not isinstance(e, Exception):
+                raise
+
+    def _save_failed(self, batch: List[Dict], error: BaseException) -> None:
+        with self._failed_lock:
+            self.rows_failed += len(batch)
+            print(f"  ⚠️ Failed to write {len(batch)} rows, saved to {self.failed_path}: {error!r}")
+            with open(self.failed_path, "a") as f:
+                for row in batch:
+                    f.write(json.dumps(row, default=str) + "\n")
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(min(1.0, self.flush_interval)):
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval
+            if due:
+                self.flush()
+
+    def _install_signal_handlers(self) -> None:
+        # The handler runs on the main thread, which may be inside add() or
+        # _write() holding a lock; it must not flush itself. Raising unwinds
+        # out of those locks and the atexit close() flushes what is pending.
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            previous = signal.getsignal(signum)
+
+            def handler(signum, frame, previous=previous):
+                if callable(previous):
+                    previous(signum, frame)
+                raise SystemExit(128 + signum)
+
+            signal.signal(signum, handler)
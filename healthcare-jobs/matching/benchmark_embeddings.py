@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Compare embedding models on speed, memory and ranking quality.
+
+Every model encodes the same jobs and candidate resumes; each job's
+candidates are ranked by cosine similarity and compared against the
+reference model (the first one, multilingual-e5-large by default):
+
+- recall@K: share of the reference top-K that the model also ranks top-K
+- spearman: rank correlation of all candidate scores per job
+- label recall@K: if the dataset has labels, share of known good
+  candidates ranked in the model's top-K
+
+A model spec is a SentenceTransformer name, optionally with a truncated
+output dimension: intfloat/multilingual-e5-base@256. The winner is then
+deployed with EMBEDDING_MODEL / EMBEDDING_DIM.
+
+Usage:
+    python benchmark_embeddings.py --models intfloat/multilingual-e5-large \\
+        intfloat/multilingual-e5-base intfloat/multilingual-e5-small \\
+        intfloat/multilingual-e5-large@256 --top-k 10
+
+    python benchmark_embeddings.py --data reference_set.json --output results.json
+
+The --data file holds {"jobs": [{"id", "text"}], "candidates": [{"id", "text"}],
+"labels": {job_id: [user_id, ...]}} (labels optional). Without it, jobs and
+candidates are read from the configured storage backend.
+"""
+
+import argparse
+import gc
+import json
+import resource
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from embedding import EMBEDDING_MODEL, encode, load_model, parse_model_id
+
+
+def load_reference_set(path: Optional[str], max_jobs: int, max_candidates: int) -> Dict:
+    """Jobs, candidates and optional labels from a JSON file or the database."""
+    if path:
+        with open(path) as f:
+            data = json.load(f)
+    else:
+        from storage import get_storage
+        storage = get_storage()
+        data = {
+            "jobs": [
+                {
+                    "id": row["job_id"],
+                    "text": "\n".join(
+                        [row.get("job_name") or "", row.get("job_description") or ""]
+                        + list(row.get("job_requirements") or [])
+                    )
+                }
+                for row in storage.select_all("jobs")
+            ],
+            "candidates": [
+                {"id": row["user_id"], "text": row["resume_text"]}
+                for row in storage.select_all("u_candidates")
+                if row.get("resume_text")
+            ],
+        }
+    data["jobs"] = data["jobs"][:max_jobs]
+    data["candidates"] = data["candidates"][:max_candidates]
+    data.setdefault("labels", {})
+    return data
+
+
+def top_k_sets(scores: np.ndarray, k: int) -> List[set]:
+    """Indices of the k best candidates for each job (row)."""
+    k = min(k, scores.shape[1])
+    return [set(row) for row in np.argpartition(-scores, k - 1, axis=1)[:, :k]]
+
+
+def spearman(a: np.ndarray, b: np.ndarray) -> float:
+    """Spearman rank correlation of two score vectors (ties broken by order)."""
+    rank_a = np.argsort(np.argsort(a)).astype(float)
+    rank_b = np.argsort(np.argsort(b)).astype(float)
+    if rank_a.std() == 0 or rank_b.std() == 0:
+        return 1.0
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+def rss_mb() -> float:
+    """Current resident memory of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 1e6
+    except OSError:
+        # ru_maxrss is in KB on Linux, bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1e6 if sys.platform == "darwin" else 1e3)
+
+
+def benchmark_model(spec: str, job_texts: List[str], candidate_texts: List[str], batch_size: int) -> Dict:
+    """Load one model and time encoding the reference set. Returns scores and stats."""
+    model_name, dim = parse_model_id(spec)
+
+    rss_before = rss_mb()
+    start = time.time()
+    model = load_model(model_name)
+    load_seconds = time.time() - start
+    params_mb = sum(p.numel() * p.element_size() for p in model.parameters()) / 1e6
+
+    # Warm up so the first batch's setup cost doesn't skew throughput
+    encode(model, candidate_texts[:batch_size], batch_size, dim, show_progress_bar=False)
+
+    start = time.time()
+    candidate_embeddings = encode(model, candidate_texts, batch_size, dim, show_progress_bar=False)
+    encode_seconds = time.time() - start
+    job_embeddings = encode(model, job_texts, batch_size, dim, show_progress_bar=False)
+
+    stats = {
+        "model": spec,
+        "dim": int(candidate_embeddings.shape[1]),
+        "load_seconds": round(load_seconds, 2),
+        "params_mb": round(params_mb, 1),
+        "rss_mb": round(rss_mb() - rss_before, 1),
+        "texts_per_second": round(len(candidate_texts) / encode_seconds, 1) if encode_seconds else None,
+    }
+    scores = (job_embeddings @ candidate_embeddings.T + 1) / 2
+
+    del model
+    gc.collect()
+    return {"stats": stats, "scores": scores}
+
+
+def compare(scores: np.ndarray, reference: np.ndarray, k: int) -> Dict:
+    """Ranking agreement of scores with the reference model's scores."""
+    ours, theirs = top_k_sets(scores, k), top_k_sets(reference, k)
+    recall = np.mean([len(a & b) / len(b) for a, b in zip(ours, theirs)])
+    correlation = np.mean([spearman(s, r) for s, r in zip(scores, reference)])
+    return {f"recall@{k}": round(float(recall), 3), "spearman": round(float(correlation), 3)}
+
+
+def label_recall(scores: np.ndarray, data: Dict, k: int) -> Optional[float]:
+    """Share of labeled good candidates that land in the top k, over labeled jobs."""
+    positions = {c["id"]: i for i, c in enumerate(data["candidates"])}
+    top = top_k_sets(scores, k)
+    hits = total = 0
+    for row, job in enumerate(data["jobs"]):
+        relevant = {positions[u] for u in data["labels"].get(str(job["id"]), []) if u in positions}
+        hits += len(relevant & top[row])
+        total += len(relevant)
+    return round(hits / total, 3) if total else None
+
+
+def print_table(rows: List[Dict], k: int) -> None:
+    columns = ["model", "dim", "texts_per_second", "params_mb", "rss_mb", "load_seconds",
+               f"recall@{k}", "spearman", f"label_recall@{k}"]
+    widths = {c: max(len(c), *(len(str(r.get(c, "-"))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, "-")).ljust(widths[c]) for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding models against a reference model")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=[EMBEDDING_MODEL, "intfloat/multilingual-e5-base", "intfloat/multilingual-e5-small"],
+        help="Model specs (name or name@dim). The first is the reference"
+    )
+    parser.add_argument("--data", type=str, default=None, help="JSON reference set. Default: read from storage")
+    parser.add_argument("--top-k", type=int, default=10, help="K for recall@K")
+    parser.add_argument("--max-jobs", type=int, default=200, help="Jobs to evaluate")
+    parser.add_argument("--max-candidates", type=int, default=2000, help="Candidates to evaluate")
+    parser.add_argument("--batch-size", type=int, default=16, help="Encoding batch size")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.data is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+
+    data = load_reference_set(args.data, args.max_jobs, args.max_candidates)
+    job_texts = [job["text"] for job in data["jobs"]]
+    candidate_texts = [candidate["text"] for candidate in data["candidates"]]
+    if not job_texts or not candidate_texts:
+        print("❌ Reference set needs at least one job and one candidate")
+        return 1
+    print(f"📊 {len(job_texts)} jobs x {len(candidate_texts)} candidates, {len(args.models)} models")
+
+    rows = []
+    reference = None
+    for spec in args.models:
+        print(f"  Encoding with {spec}...")
+        result = benchmark_model(spec, job_texts, candidate_texts, args.batch_size)
+        if reference is None:
+            reference = result["scores"]
+        row = result["stats"]
+        row.update(compare(result["scores"], reference, args.top_k))
+        row[f"label_recall@{args.top_k}"] = label_recall(result["scores"], data, args.top_k)
+        rows.append(row)
+
+    print()
+    print_table(rows, args.top_k)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
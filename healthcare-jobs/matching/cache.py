@@ -0,0 +1,181 @@
+"""
+Persistent caches for the expensive steps of the pipeline.
+
+- IdealResumeCache: GPT-4o ideal resumes keyed by a fingerprint of the job
+  fields that feed the prompt, so unchanged jobs never hit the LLM again
+- EmbeddingCache: embeddings keyed by a hash of the exact text, so unchanged
+  resumes are never re-encoded. A second instance at REQUIREMENT_CACHE_PATH
+  holds requirement strings and resume chunks for requirement-level scoring
+
+Both are plain files next to the scripts (override the paths with
+IDEAL_RESUME_CACHE_PATH / EMBEDDING_CACHE_PATH / REQUIREMENT_CACHE_PATH;
+embedding caches get the model id inserted, e.g.
+embedding_cache.intfloat_multilingual-e5-large.npz) and are safe to share
+between threads. save() merges with entries other processes have saved
+in the meantime, under a file lock.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from embedding import embedding_model_id, model_path
+
+if TYPE_CHECKING:
+    from matching_algorithm import Job
+
+IDEAL_RESUME_CACHE_PATH = os.getenv("IDEAL_RESUME_CACHE_PATH", "ideal_resume_cache.json")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.npz")
+REQUIREMENT_CACHE_PATH = os.getenv("REQUIREMENT_CACHE_PATH", "requirement_embedding_cache.npz")
+
+
+def job_fingerprint(job: "Job") -> str:
+    """Hash of every job field that feeds the ideal-resume prompt."""
+    fields = [
+        job.job_name, job.company_name, job.city, job.state,
+        str(job.hourly_wage_minimum), str(job.hourly_wage_maximum),
+        job.job_description, "\n".join(job.job_requirements or []),
+    ]
+    return hashlib.sha1("\x1f".join(f or "" for f in fields).encode("utf-8")).hexdigest()
+
+
+def text_key(text: str, namespace: str = "") -> str:
+    """Cache key for a single text (namespace separates embedding models)."""
+    return hashlib.sha1(f"{namespace}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+class IdealResumeCache:
+    """
+    Job fingerprint -> ideal resume, stored as one JSON file.
+    put() only updates memory; call save() once per batch or run.
+    """
+
+    def __init__(self, path: str = IDEAL_RESUME_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._resumes: Dict[str, str] = {}
+        self._pending: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._resumes = json.load(f)
+
+    def __contains__(self, job: "Job") -> bool:
+        return job_fingerprint(job) in self._resumes
+
+    def get(self, job: "Job") -> Optional[str]:
+        return self._resumes.get(job_fingerprint(job))
+
+    def put(self, job: "Job", ideal_resume: str) -> None:
+        with self._lock:
+            self._resumes[job_fingerprint(job)] = ideal_resume
+            self._pending[job_fingerprint(job)] = ideal_resume
+
+    def save(self) -> None:
+        """
+        Write resumes added since the last save. Entries other processes
+        saved in the meantime (e.g. other API workers) are kept.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            with open(f"{self.path}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if os.path.exists(self.path):
+                    with open(self.path) as f:
+                        self._resumes = {**self._resumes, **json.load(f)}
+                self._resumes.update(self._pending)
+                tmp_path = f"{self.path}.{os.getpid()}-{threading.get_ident()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(self._resumes, f)
+                os.replace(tmp_path, self.path)
+            self._pending = {}
+
+
+class EmbeddingCache:
+    """
+    Text hash -> embedding vector, stored as one .npz (keys + matrix).
+    Each embedding model id (the namespace) has its own file, so switching
+    EMBEDDING_MODEL or EMBEDDING_DIM never mixes vectors of different models
+    or sizes in one matrix.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, namespace: Optional[str] = None):
+        self.namespace = namespace if namespace is not None else embedding_model_id()
+        self.path = model_path(path, self.namespace) if self.namespace else path
+        self._lock = threading.Lock()
+        # The matrix loaded here is never modified or rebound: serve.py loads it
+        # before forking, and workers share its pages as long as none writes them.
+        # Vectors added later live in _saved (written) and _pending (not yet written).
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._saved: Dict[str, np.ndarray] = {}
+        self._pending: Dict[str, np.ndarray] = {}
+        if os.path.exists(self.path):
+            data = np.load(self.path)
+            self._rows = {key: i for i, key in enumerate(data["keys"].tolist())}
+            self._matrix = data["embeddings"]
+            self._matrix.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._saved) + len(self._pending)
+
+    def __contains__(self, text: str) -> bool:
+        key = text_key(text, self.namespace)
+        return key in self._pending or key in self._saved or key in self._rows
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = text_key(text, self.namespace)
+        if key in self._pending:
+            return self._pending[key]
+        if key in self._saved:
+            return self._saved[key]
+        if key in self._rows:
+            return self._matrix[self._rows[key]]
+        return None
+
+    def split(self, texts: List[str]) -> Tuple[List[int], List[int]]:
+        """Positions of texts that are cached and of texts that still need encoding."""
+        cached, missing = [], []
+        for i, text in enumerate(texts):
+            (cached if text in self else missing).append(i)
+        return cached, missing
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray) -> None:
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                self._pending[text_key(text, self.namespace)] = embedding
+
+    def save(self) -> None:
+        """
+        Write pending embeddings to disk. Entries other processes saved since
+        this cache was loaded are kept (e.g. resumes embedded at ingest time).
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            with open(f"{self.path}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                keys: List[str] = []
+                matrix: Optional[np.ndarray] = None
+                if os.path.exists(self.path):
+                    data = np.load(self.path)
+                    keys = data["keys"].tolist()
+                    matrix = data["embeddings"]
+                on_disk = set(keys)
+                # Pick up rows other processes saved, copied so the file's matrix isn't kept alive
+                for i, key in enumerate(keys):
+                    if key not in self._rows and key not in self._saved and key not in self._pending:
+                        self._saved[key] = matrix[i].copy()
+                new_keys = [key for key in self._pending if key not in on_disk]
+                if new_keys:
+                    new_rows = np.vstack([self._pending[key] for key in new_keys])
+                    merged = new_rows if matrix is None else np.vstack([matrix, new_rows])
+                    tmp_path = f"{self.path}.tmp.npz"
+                    np.savez(tmp_path, keys=np.array(keys + new_keys, dtype=str), embeddings=merged)
+                    os.replace(tmp_path, self.path)
+            self._saved.update(self._pending)
+            self._pending = {}
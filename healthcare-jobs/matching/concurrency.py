@@ -0,0 +1,156 @@
+"""
+Concurrency helpers for network-bound work (OpenAI calls).
+
+- RateLimiter spaces calls out to a requests-per-minute budget across threads
+- call_with_retry retries transient failures with exponential backoff
+- run_concurrently runs a function over many items with a bounded number in
+  flight and yields results as soon as each one finishes
+- SingleFlight coalesces concurrent calls for the same key into one call
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class RateLimiter:
+    """Thread-safe limiter allowing at most requests_per_minute calls to start."""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        """Block until the caller may start its next request."""
+        if self.interval == 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def call_with_retry(
+    fn: Callable[..., R],
+    *args,
+    max_retries: int = 3,
+    base_delay: float = 1.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    rate_limiter: Optional[RateLimiter] = None,
+    **kwargs
+) -> R:
+    """
+    Call fn, retrying exceptions in retry_on up to max_retries times with
+    exponential backoff and jitter. Other exceptions propagate immediately.
+    """
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except retry_on as e:
+            if attempt >= max_retries:
+                raise
+            delay = base_delay * (2 ** attempt) * (1 + random.random())
+            print(f"  Retrying in {delay:.1f}s after error: {e}")
+            time.sleep(delay)
+            attempt += 1
+
+
+def run_concurrently(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    max_concurrency: int = 8,
+    rate_limiter: Optional[RateLimiter] = None,
+    max_retries: int = 3,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+) -> Iterator[Tuple[T, Optional[R], Optional[BaseException]]]:
+    """
+    Run fn over items with at most max_concurrency calls in flight.
+    Yields (item, result, error) in completion order; exactly one of result
+    and error is set.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        futures = {
+            executor.submit(
+                call_with_retry, fn, item,
+                max_retries=max_retries,
+                retry_on=retry_on,
+                rate_limiter=rate_limiter
+            ): item
+            for item in items
+        }
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+
+class SingleFlight:
+    """
+    Coalesces duplicate in-flight work across threads. While a call for a
+    key is running, later callers with the same key wait for it and get the
+    same result (or exception) instead of starting their own. Results are
+    not kept once the call finishes; caching is up to the caller.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., R], *args, **kwargs) -> R:
+        """fn(*args, **kwargs), run once for all concurrent callers with this key."""
+        return self.do_many([key], lambda keys: [fn(*args, **kwargs)])[0]
+
+    def do_many(self, keys: Sequence[Hashable], fn: Callable[[List[Hashable]], Sequence[R]]) -> List[R]:
+        """
+        Results for keys, in order. Keys already in flight in another thread
+        are waited for; the rest (each once, even if repeated in keys) are
+        computed by a single fn(missing_keys) call returning one result per key.
+        """
+        futures: Dict[Hashable, Future] = {}
+        leading: List[Hashable] = []
+        with self._lock:
+            for key in keys:
+                if key in futures:
+                    continue
+                future = self._calls.get(key)
+                if future is None:
+                    future = self._calls[key] = Future()
+                    leading.append(key)
+                futures[key] = future
+
+        # Compute our own keys before waiting on anyone else's, so two
+        # overlapping batches can never wait on each other
+        if leading:
+            try:
+                results = fn(leading)
+                if len(results) != len(leading):
+                    raise ValueError(f"Expected {len(leading)} results, got {len(results)}")
+                for key, result in zip(leading, results):
+                    futures[key].set_result(result)
+            except BaseException as e:
+                for key in leading:
+                    if not futures[key].done():
+                        futures[key].set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    for key in leading:
+                        self._calls.pop(key, None)
+                # Never leave a waiter blocked, whatever happened above
+                for key in leading:
+                    if not futures[key].done():
+                        futures[key].set_exception(RuntimeError(f"No result computed for {key!r}"))
+        return [futures[key].result() for key in keys]
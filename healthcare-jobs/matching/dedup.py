@@ -0,0 +1,102 @@
+"""
+Near-duplicate job detection with MinHash + LSH.
+
+Employers often post the same role many times (one per unit or city). Jobs
+whose prompt-relevant text (title, company, description, requirements) is
+nearly identical are grouped so that each group needs only one ideal resume
+and one embedding. Location and wage are deliberately left out of the
+comparison since they barely change what the ideal candidate looks like.
+"""
+
+import re
+import zlib
+import numpy as np
+from typing import Dict, List, Set, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from matching_algorithm import Job
+
+# Largest prime below 2**32, so (a * x) never overflows uint64
+_PRIME = 4294967291
+
+
+def job_text(job: "Job") -> str:
+    """The job fields that feed the ideal-resume prompt, minus location/wage."""
+    return " ".join([
+        job.job_name or "",
+        job.company_name or "",
+        job.job_description or "",
+        " ".join(job.job_requirements or []),
+    ])
+
+
+def shingles(text: str, k: int = 3) -> Set[str]:
+    """Word k-grams of the lowercased text."""
+    words = re.findall(r"[a-z0-9+#]+", text.lower())
+    if len(words) < k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+class MinHasher:
+    """MinHash signatures using num_perm random universal hash functions."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 42):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, items: Set[str]) -> np.ndarray:
+        if not items:
+            return np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        hashes = np.array([zlib.crc32(item.encode("utf-8")) % _PRIME for item in items], dtype=np.uint64)
+        # (a * x + b) mod p for every (permutation, shingle)
+        permuted = (np.outer(self.a, hashes) % _PRIME + self.b[:, None]) % _PRIME
+        return permuted.min(axis=1)
+
+
+def group_near_duplicate_jobs(
+    jobs: List["Job"],
+    threshold: float = 0.9,
+    num_perm: int = 128,
+    bands: int = 16
+) -> List[List[int]]:
+    """
+    Group jobs whose estimated Jaccard similarity is at least threshold.
+    Returns lists of positions into jobs; the first position of each group is
+    its canonical job. Jobs without duplicates form groups of one.
+    """
+    if not jobs:
+        return []
+
+    hasher = MinHasher(num_perm)
+    signatures = np.vstack([hasher.signature(shingles(job_text(job))) for job in jobs])
+    rows = num_perm // bands
+
+    # Union-find over positions
+    parent = list(range(len(jobs)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # LSH: jobs sharing any band bucket are candidate pairs, verified on the full signature
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = {}
+        for i, signature in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            buckets.setdefault(signature.tobytes(), []).append(i)
+        for members in buckets.values():
+            for other in members[1:]:
+                first, second = find(members[0]), find(other)
+                if first == second:
+                    continue
+                if np.mean(signatures[members[0]] == signatures[other]) >= threshold:
+                    parent[max(first, second)] = min(first, second)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(jobs)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(groups.values(), key=lambda g: g[0])
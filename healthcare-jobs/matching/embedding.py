@@ -0,0 +1,68 @@
+"""
+Embedding model configuration and encoding.
+
+The encoder is chosen per deployment with EMBEDDING_MODEL (any
+SentenceTransformer name, default intfloat/multilingual-e5-large) and
+optionally EMBEDDING_DIM, which keeps only the first N dimensions of each
+vector (re-normalized). Use benchmark_embeddings.py to compare the options
+against the large model before switching.
+
+Embeddings from different configurations are not comparable (nor always
+the same size), so each configuration gets its own cache files
+(model_path) and the job index records the embedding_model_id() it was
+built with.
+"""
+
+import os
+import re
+from typing import List, Optional
+
+import numpy as np
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "intfloat/multilingual-e5-large")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0")) or None
+
+
+def embedding_model_id(model_name: str = EMBEDDING_MODEL, dim: Optional[int] = EMBEDDING_DIM) -> str:
+    """Identifier of an encoder configuration, e.g. 'intfloat/multilingual-e5-base@256'."""
+    return f"{model_name}@{dim}" if dim else model_name
+
+
+def model_path(path: str, model_id: Optional[str] = None) -> str:
+    """path with the model id inserted before the extension: embedding_cache.<model>.npz"""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_id or embedding_model_id())
+    root, ext = os.path.splitext(path)
+    return f"{root}.{slug}{ext}"
+
+
+def parse_model_id(model_id: str):
+    """Inverse of embedding_model_id: (model_name, dim or None)."""
+    name, _, dim = model_id.partition("@")
+    return name, int(dim) if dim else None
+
+
+def load_model(model_name: str = EMBEDDING_MODEL):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def encode(
+    model,
+    texts: List[str],
+    batch_size: int = 16,
+    dim: Optional[int] = EMBEDDING_DIM,
+    show_progress_bar: bool = True
+) -> np.ndarray:
+    """Normalized embeddings for texts, truncated to dim dimensions if set."""
+    # For e5 models, we need to add instruction prefix for better results
+    prefixed_texts = [f"query: {text}" for text in texts]
+    embeddings = np.array(model.encode(
+        prefixed_texts,
+        batch_size=batch_size,
+        show_progress_bar=show_progress_bar,
+        normalize_embeddings=True  # Normalize for cosine similarity
+    ))
+    if dim and dim < embeddings.shape[1]:
+        embeddings = embeddings[:, :dim]
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings
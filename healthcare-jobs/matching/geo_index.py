@@ -0,0 +1,146 @@
+"""
+Offline geo lookups for commute feasibility.
+
+Town/city names are resolved against a bundled coordinate table
+(data/town_coordinates.csv, no network calls), and candidates are bucketed
+into a lat/lon grid so that each job only computes distances to candidates in
+nearby cells. Distances are straight-line (haversine) miles, which never
+exceed the driving distance, so rejecting on them never drops a pair a
+recruiter would have accepted.
+"""
+
+import csv
+import os
+import re
+import numpy as np
+from typing import Dict, List, Optional, Set, Tuple
+
+from prefilter import normalize_city, normalize_state
+
+
+TOWN_COORDINATES_PATH = os.path.join(os.path.dirname(__file__), "data", "town_coordinates.csv")
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.0
+
+
+def haversine_miles(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Distance in miles from one point to many points at once."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+
+def parse_commute_miles(answer: Optional[str]) -> Optional[float]:
+    """
+    Parse a commute answer ("<5 miles", "5-10", "10-20", "20+") into a maximum
+    distance in miles. Returns None for "20+" or anything unrecognized, which
+    means no limit is enforced.
+    """
+    answer = (answer or "").strip()
+    if not answer or "+" in answer:
+        return None
+    numbers = re.findall(r"\d+(?:\.\d+)?", answer)
+    if not numbers:
+        return None
+    return float(numbers[-1])
+
+
+class TownGazetteer:
+    """Town/city -> (lat, lon) lookups from the bundled coordinate table."""
+
+    def __init__(self, path: str = TOWN_COORDINATES_PATH):
+        self.by_town_state: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        by_town: Dict[str, List[Tuple[float, float]]] = {}
+
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                coords = (float(row["lat"]), float(row["lon"]))
+                town = normalize_city(row["town"])
+                self.by_town_state[(town, normalize_state(row["state"]))] = coords
+                by_town.setdefault(town, []).append(coords)
+
+        # A bare town name is only usable when it isn't ambiguous across states
+        self.by_town = {town: coords[0] for town, coords in by_town.items() if len(coords) == 1}
+
+    def lookup(self, location: Optional[str], state: Optional[str] = None) -> Optional[Tuple[float, float]]:
+        """
+        Resolve "Town", "Town, ST" or a separate town/state pair to coordinates.
+        Returns None when the place isn't in the table.
+        """
+        parts = [p.strip() for p in (location or "").split(",") if p.strip()]
+        if not parts:
+            return None
+        town = normalize_city(parts[0])
+        if len(parts) >= 2 and not state:
+            state = parts[-1]
+        if state:
+            coords = self.by_town_state.get((town, normalize_state(state)))
+            if coords:
+                return coords
+        return self.by_town.get(town)
+
+
+class CommuteGridIndex:
+    """
+    Spatial grid over candidate home locations.
+
+    Only candidates with a known location and a bounded commute limit are put
+    in the grid; everyone else (unknown town, "20+" miles) is always reachable.
+    """
+
+    def __init__(
+        self,
+        locations: List[Optional[Tuple[float, float]]],
+        max_miles: List[Optional[float]],
+        cell_degrees: float = 0.5
+    ):
+        self.size = len(locations)
+        self.cell_degrees = cell_degrees
+        self.unbounded: Set[int] = set()
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+
+        self.lats = np.zeros(self.size)
+        self.lons = np.zeros(self.size)
+        self.limits = np.full(self.size, np.inf)
+
+        for i, (coords, limit) in enumerate(zip(locations, max_miles)):
+            if coords is None or limit is None:
+                self.unbounded.add(i)
+                continue
+            self.lats[i], self.lons[i] = coords
+            self.limits[i] = limit
+            self.cells.setdefault(self._cell(*coords), []).append(i)
+
+        bounded = self.limits[np.isfinite(self.limits)]
+        self.search_radius = float(bounded.max()) if bounded.size else 0.0
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(np.floor(lat / self.cell_degrees)), int(np.floor(lon / self.cell_degrees))
+
+    def reachable(self, lat: float, lon: float) -> Set[int]:
+        """Positions of candidates whose commute limit covers a job at (lat, lon)."""
+        reachable = set(self.unbounded)
+        if not self.cells:
+            return reachable
+
+        # Cells that could hold anyone within the largest commute limit
+        lat_span = self.search_radius / MILES_PER_DEGREE_LAT
+        lon_span = lat_span / max(np.cos(np.radians(lat)), 0.01)
+        row_min, col_min = self._cell(lat - lat_span, lon - lon_span)
+        row_max, col_max = self._cell(lat + lat_span, lon + lon_span)
+
+        nearby = [
+            i
+            for row in range(row_min, row_max + 1)
+            for col in range(col_min, col_max + 1)
+            for i in self.cells.get((row, col), [])
+        ]
+        if not nearby:
+            return reachable
+
+        nearby = np.array(nearby)
+        distances = haversine_miles(lat, lon, self.lats[nearby], self.lons[nearby])
+        reachable.update(nearby[distances <= self.limits[nearby]].tolist())
+        return reachable
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Resume ingestion: PDF -> text -> embedding -> match queue.
+
+Text is extracted from uploaded PDFs in a process pool (PyPDF2 is pure
+Python and CPU-bound), normalized, and written to u_candidates.resume_text.
+The resume is embedded right away and stored in the shared embedding cache,
+so the matching pipeline and the candidate endpoint read the vector instead
+of encoding the resume in the hot path. Each ingested candidate is queued in
+MATCH_QUEUE_PATH for incremental matching against the job index.
+
+Bulk usage (files named <user_id>.pdf):
+    python ingest.py resumes/ --match
+"""
+
+import argparse
+import fcntl
+import glob
+import io
+import os
+import re
+import sys
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+MATCH_QUEUE_PATH = os.getenv("MATCH_QUEUE_PATH", "match_queue.txt")
+
+
+def extract_pdf_text(data: bytes) -> str:
+    """Text of every page of a PDF, in order."""
+    reader = PdfReader(io.BytesIO(data))
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def normalize_resume_text(text: str) -> str:
+    """Clean extracted text: unicode forms, hyphenated line breaks, stray whitespace."""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = "".join(ch for ch in text if ch.isprintable() or ch == "\n")
+    lines = [re.sub(r"\s+", " ", line).strip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def extract_and_normalize(data: bytes) -> str:
+    return normalize_resume_text(extract_pdf_text(data))
+
+
+def extract_many(
+    pdfs: Iterable[Tuple[str, bytes]],
+    max_workers: Optional[int] = None
+) -> Iterator[Tuple[str, Optional[str], Optional[Exception]]]:
+    """
+    Extract (user_id, pdf bytes) pairs in a process pool, in input order.
+    Only a few PDFs per worker are read ahead, so large batches stream
+    through without being loaded into memory at once.
+    Yields (user_id, text, error).
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for user_id, data in pdfs:
+            in_flight.append((user_id, pool.submit(extract_and_normalize, data)))
+            if len(in_flight) >= 4 * max_workers:
+                yield _result(*in_flight.popleft())
+        while in_flight:
+            yield _result(*in_flight.popleft())
+
+
+def _result(user_id: str, future) -> Tuple[str, Optional[str], Optional[Exception]]:
+    try:
+        return user_id, future.result(), None
+    except Exception as e:
+        return user_id, None, e
+
+
+class MatchQueue:
+    """Candidate ids waiting for incremental matching, one per line in a file."""
+
+    def __init__(self, path: str = MATCH_QUEUE_PATH):
+        self.path = path
+
+    def add(self, user_ids: Iterable[str]) -> None:
+        with open(self.path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.writelines(f"{user_id}\n" for user_id in user_ids)
+
+    def peek(self) -> Tuple[List[str], int]:
+        """
+        Queued ids (each once, in order) and the number of queue lines they
+        were read from, leaving the queue as it is.
+        """
+        if not os.path.exists(self.path):
+            return [], 0
+        with open(self.path) as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            lines = [line.strip() for line in f]
+        return list(dict.fromkeys(line for line in lines if line)), len(lines)
+
+    def remove(self, user_ids: Iterable[str], lines: int) -> None:
+        """
+        Take ids that are done off the first `lines` lines (those peek read);
+        ids queued again since then stay queued.
+        """
+        done = set(user_ids)
+        if not done or not os.path.exists(self.path):
+            return
+        with open(self.path, "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            queued = f.readlines()
+            remaining = [line for line in queued[:lines] if line.strip() and line.strip() not in done]
+            f.seek(0)
+            f.truncate()
+            f.writelines(remaining + queued[lines:])
+
+
+def ingest_resumes(resumes: Dict[str, str], embedding_cache=None, queue: bool = True) -> int:
+    """
+    Store normalized resume texts for existing candidates, embed them at
+    ingest time and (unless queue=False) queue them for matching. Resumes
+    for user ids that are not in u_candidates are skipped. A passed-in
+    embedding_cache is left for its owner to save (the API's periodic saver,
+    the CLI once the whole batch is done).
+    Returns how many were ingested.
+    """
+    from cache import EmbeddingCache
+    from matching_algorithm import compute_embeddings_cached, storage
+
+    resumes = {user_id: text for user_id, text in resumes.items() if text}
+    if not resumes:
+        return 0
+
+    updated = storage.update_many(
+        "u_candidates",
+        [{"user_id": user_id, "resume_text": text} for user_id, text in resumes.items()],
+        key_columns=("user_id",),
+        update_columns=("resume_text",)
+    )
+    unknown = len(resumes) - len(updated)
+    if unknown:
+        print(f"  ⚠️ Skipped {unknown} resumes for unknown candidates")
+    if not updated:
+        return 0
+
+    cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+    compute_embeddings_cached([row["resume_text"] for row in updated], cache)
+    if embedding_cache is None:
+        cache.save()
+    if queue:
+        MatchQueue().add(row["user_id"] for row in updated)
+    return len(updated)
+
+
+def process_match_queue(top_k: int = 10, similarity_threshold: float = 0.5, embedding_cache=None) -> int:
+    """
+    Match every queued candidate against the job index and save the matches.
+    Candidates leave the queue only once their matches are saved, so ids not
+    reached because of an error are matched by the next call. As with
+    ingest_resumes, a passed-in embedding_cache is not saved here.
+    """
+    from cache import EmbeddingCache
+    from matching_algorithm import fetch_candidate_from_db, load_job_index, match_candidate_to_jobs, save_matches_to_db
+
+    job_index = load_job_index()
+    if job_index is None:
+        print("⚠️ No job index yet; queued candidates will be matched by the next pipeline run.")
+        return 0
+
+    cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+    queue = MatchQueue()
+    user_ids, lines = queue.peek()
+    done = []
+    matched = 0
+    try:
+        for user_id in user_ids:
+            candidate = fetch_candidate_from_db(user_id)
+            if candidate is not None:
+                matches = match_candidate_to_jobs(candidate, job_index, top_k, similarity_threshold, embedding_cache=cache)
+                save_matches_to_db(matches)
+                matched += 1
+            done.append(user_id)
+    finally:
+        queue.remove(done, lines)
+        if embedding_cache is None:
+            cache.save()
+    return matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest PDF resumes named <user_id>.pdf")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories of PDFs")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes. Default: one per core")
+    parser.add_argument("--batch-size", type=int, default=256, help="Resumes embedded and stored per batch")
+    parser.add_argument("--match", action="store_true", help="Match the ingested candidates right away")
+    parser.add_argument("--top-k", type=int, default=10, help="Jobs kept per candidate with --match")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files += sorted(glob.glob(os.path.join(path, "*.pdf"))) if os.path.isdir(path) else [path]
+    print(f"📄 Extracting {len(files)} resumes...")
+
+    def read_all():
+        for path in files:
+            with open(path, "rb") as f:
+                yield os.path.splitext(os.path.basename(path))[0], f.read()
+
+    from cache import EmbeddingCache
+    cache = EmbeddingCache()
+    ingested = 0
+    failed = 0
+    batch: Dict[str, str] = {}
+    try:
+        for user_id, text, error in extract_many(read_all(), args.workers):
+            if error is not None or not text:
+                print(f"  ✗ {user_id}: {error or 'no text found'}")
+                failed += 1
+                continue
+            batch[user_id] = text
+            if len(batch) >= args.batch_size:
+                ingested += ingest_resumes(batch, cache)
+                batch = {}
+        ingested += ingest_resumes(batch, cache)
+        print(f"Ingested {ingested} resumes ({failed} failed)")
+
+        if args.match:
+            print(f"Matched {process_match_queue(args.top_k, embedding_cache=cache)} candidates")
+    finally:
+        cache.save()
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
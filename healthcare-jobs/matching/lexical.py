@@ -0,0 +1,178 @@
+"""
+BM25 inverted index over candidate resumes.
+
+Dense embeddings blur exact credentials ("ACLS", "CCRN", "BLS") that job
+requirements ask for by name. The lexical index scores candidates on those
+exact terms in milliseconds, without encoding anything, so it can be used:
+
+- as a recall stage: only the top recall_size candidates per job are encoded
+  and scored with embeddings
+- as a fused score: similarity = (1 - w) * dense + w * normalized BM25
+
+The index is updated incrementally (add() replaces a candidate's previous
+resume) and persisted to LEXICAL_INDEX_PATH between runs.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from matching_algorithm import Job
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "lexical_index.json")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "our", "the", "to", "we", "will", "with", "you", "your",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; keeps short credential tokens like 'rn' or 'bls'."""
+    return [t for t in re.findall(r"[a-z0-9][a-z0-9+#\-]*", (text or "").lower()) if t not in STOPWORDS]
+
+
+def job_query(job: "Job") -> str:
+    """Text a job is searched with: its title and requirements."""
+    return " ".join([job.job_name or ""] + list(job.job_requirements or []))
+
+
+class BM25Index:
+    """Incremental Okapi BM25 index keyed by document id (candidate user_id)."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.lengths: List[int] = []
+        self.hashes: List[str] = []
+        self.doc_terms: List[Dict[str, int]] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, doc_id: str, text: str) -> bool:
+        """Index or re-index one document. Returns False if it was unchanged."""
+        digest = hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+        with self._lock:
+            position = self.positions.get(doc_id)
+            if position is not None and self.hashes[position] == digest:
+                return False
+            if position is None:
+                position = len(self.doc_ids)
+                self.positions[doc_id] = position
+                self.doc_ids.append(doc_id)
+                self.lengths.append(0)
+                self.hashes.append("")
+                self.doc_terms.append({})
+            else:
+                # Drop the previous version's postings
+                for term in self.doc_terms[position]:
+                    del self.postings[term][position]
+                self.total_length -= self.lengths[position]
+
+            terms = Counter(tokenize(text))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[position] = tf
+            self.doc_terms[position] = dict(terms)
+            self.lengths[position] = sum(terms.values())
+            self.hashes[position] = digest
+            self.total_length += self.lengths[position]
+            return True
+
+    def add_many(self, docs: Iterable[Sequence[str]]) -> int:
+        """Index (doc_id, text) pairs. Returns how many were new or changed."""
+        return sum(self.add(doc_id, text) for doc_id, text in docs)
+
+    def scores(self, query: str, doc_ids: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        BM25 score of every indexed document for the query, or of doc_ids in
+        that order (0 for ids not in the index).
+        """
+        n = len(self.doc_ids)
+        totals = np.zeros(n)
+        if n:
+            lengths = np.asarray(self.lengths, dtype=float)
+            norm = self.k1 * (1 - self.b + self.b * lengths / (self.total_length / n))
+            for term in set(tokenize(query)):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                rows = np.fromiter(posting.keys(), dtype=int, count=len(posting))
+                tf = np.fromiter(posting.values(), dtype=float, count=len(posting))
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                totals[rows] += idf * tf * (self.k1 + 1) / (tf + norm[rows])
+        if doc_ids is None:
+            return totals
+        return np.array([totals[self.positions[d]] if d in self.positions else 0.0 for d in doc_ids])
+
+    def search(self, query: str, top_n: int = 100) -> List[tuple]:
+        """Best (doc_id, score) pairs for the query, highest first."""
+        scores = self.scores(query)
+        top = np.argsort(-scores)[:top_n]
+        return [(self.doc_ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def save(self, path: str = LEXICAL_INDEX_PATH) -> None:
+        with self._lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "k1": self.k1, "b": self.b,
+                    "doc_ids": self.doc_ids,
+                    "hashes": self.hashes,
+                    "doc_terms": self.doc_terms,
+                }, f)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = LEXICAL_INDEX_PATH) -> "BM25Index":
+        """Load a saved index, or return an empty one if there is none."""
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with open(path) as f:
+            data = json.load(f)
+        index.k1, index.b = data["k1"], data["b"]
+        index.doc_ids = data["doc_ids"]
+        index.hashes = data["hashes"]
+        index.doc_terms = data["doc_terms"]
+        index.positions = {doc_id: i for i, doc_id in enumerate(index.doc_ids)}
+        index.lengths = [sum(terms.values()) for terms in index.doc_terms]
+        index.total_length = sum(index.lengths)
+        for position, terms in enumerate(index.doc_terms):
+            for term, tf in terms.items():
+                index.postings.setdefault(term, {})[position] = tf
+        return index
+
+
+def normalize_scores(scores: np.ndarray) -> np.ndarray:
+    """Scale BM25 scores to [0, 1] by the best score for this query."""
+    best = scores.max() if len(scores) else 0.0
+    return scores / best if best > 0 else np.zeros_like(scores)
+
+
+def recall_positions(
+    index: BM25Index,
+    job: "Job",
+    candidate_ids: Sequence[str],
+    positions: Sequence[int],
+    recall_size: int
+) -> List[int]:
+    """The recall_size of positions whose candidates score best for the job's query."""
+    if len(positions) <= recall_size:
+        return list(positions)
+    scores = index.scores(job_query(job), [candidate_ids[i] for i in positions])
+    best = np.argpartition(-scores, recall_size - 1)[:recall_size]
+    return sorted(positions[i] for i in best)
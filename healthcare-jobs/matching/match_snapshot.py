@@ -0,0 +1,112 @@
+"""
+Local snapshot of the match scores last written to the database.
+
+Most scores are identical from one pipeline run to the next, and rewriting
+them costs a database write each and wakes up whatever watches
+matches.updated_at. With a snapshot of what was last written, a run only
+writes the difference:
+
+- inserts: pairs that are now a match and were not before
+- updates: pairs whose score moved by more than epsilon
+- deletes: pairs that were scored this run and fell below the similarity
+  threshold
+
+Pairs that were not scored this run (pruned by the prefilter, dropped by
+lexical recall) or that were cut by top-k/top-m are left as they are:
+matches rows carry app state such as questionnaire_sent, so a row is only
+deleted on evidence that the pair no longer matches. Rows whose
+questionnaire was sent are never deleted (see save_match_changes).
+
+The snapshot is seeded from the matches table the first time, and only
+tracks writes made through it. Matches written by the API endpoints
+(save_matches_to_db) bypass it and are never reconciled by a pipeline run.
+Delete MATCH_SNAPSHOT_PATH to resync after the table was changed elsewhere.
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from matching_algorithm import MatchResult
+    from storage import Storage
+
+MATCH_SNAPSHOT_PATH = os.getenv("MATCH_SNAPSHOT_PATH", "match_snapshot.json")
+
+
+@dataclass
+class MatchChanges:
+    """What a set of match results changes relative to the snapshot."""
+    inserts: List["MatchResult"] = field(default_factory=list)
+    updates: List["MatchResult"] = field(default_factory=list)
+    deletes: List[Tuple[str, str]] = field(default_factory=list)
+    unchanged: int = 0
+
+
+class MatchSnapshot:
+    """job_id -> {user_id: score} as last written, stored as one JSON file."""
+
+    def __init__(self, path: str = MATCH_SNAPSHOT_PATH, storage: Optional["Storage"] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._scores: Dict[str, Dict[str, float]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._scores = json.load(f)
+        elif storage is not None:
+            print("📸 No match snapshot yet; reading current matches from the database...")
+            for row in storage.select_all("matches"):
+                self._scores.setdefault(str(row["job_id"]), {})[str(row["user_id"])] = float(
+                    row.get("similarity_score") or 0.0
+                )
+
+    def __len__(self) -> int:
+        return sum(len(users) for users in self._scores.values())
+
+    def diff(
+        self,
+        matches: List["MatchResult"],
+        below_threshold: Iterable[Tuple[str, str]],
+        epsilon: float = 0.001
+    ) -> MatchChanges:
+        """
+        Changes needed to write matches, and to delete the (job_id, user_id)
+        pairs in below_threshold (scored this run, no longer a match) that
+        were written before.
+        """
+        changes = MatchChanges()
+        with self._lock:
+            for match in matches:
+                previous = self._scores.get(str(match.job_id), {}).get(str(match.user_id))
+                if previous is None:
+                    changes.inserts.append(match)
+                elif abs(match.similarity_score - previous) > epsilon:
+                    changes.updates.append(match)
+                else:
+                    changes.unchanged += 1
+
+            for job_id, user_id in below_threshold:
+                job_id, user_id = str(job_id), str(user_id)
+                if user_id in self._scores.get(job_id, {}):
+                    changes.deletes.append((job_id, user_id))
+        return changes
+
+    def apply(self, changes: MatchChanges) -> None:
+        """Record changes once they have been written."""
+        with self._lock:
+            for match in changes.inserts + changes.updates:
+                self._scores.setdefault(str(match.job_id), {})[str(match.user_id)] = float(match.similarity_score)
+            for job_id, user_id in changes.deletes:
+                users = self._scores.get(job_id, {})
+                users.pop(user_id, None)
+                if not users:
+                    self._scores.pop(job_id, None)
+
+    def save(self) -> None:
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._scores, f)
+            os.replace(tmp_path, self.path)
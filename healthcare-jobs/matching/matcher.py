@@ -1,25 +1,29 @@
 #!/usr/bin/env python3
 """
 AI Job Matching Script
-Fetches candidates and jobs from Supabase, uses OpenAI to score each pair,
+Fetches candidates and jobs from the database (Supabase or local SQLite), uses OpenAI to score each pair,
 and saves results to matches_duplicates table.
 """
 
+import argparse
 import os
 import time
 from datetime import datetime, timezone
+from typing import Optional
 from dotenv import load_dotenv
-from supabase import create_client
 from openai import OpenAI
 
+from geo_index import TownGazetteer, CommuteGridIndex, parse_commute_miles
+from batch_writer import BatchWriter
+from artifacts import ARTIFACTS_DIR, RunArtifactWriter
+from storage import get_storage
+from planner import ExecutionPlan, ThroughputStats, estimate_tokens, project_llm_seconds
+
 # Load environment variables
 load_dotenv()
 
 # Initialize clients
-supabase = create_client(
-    os.getenv('SUPABASE_URL'),
-    os.getenv('SUPABASE_SERVICE_KEY')
-)
+storage = get_storage()
 openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
 # Standard prompt template
@@ -40,23 +44,26 @@ Consider: location/commute compatibility and overall profile alignment based on
 
 Respond with ONLY a single integer between 0 and 100. No other text."""
 
+COMMUTE_FIELD = 'How far are you willing to commute (<5 miles, 5-10, 10-20, 20+)'
+
 
 def fetch_all_jobs():
     """Fetch all jobs from matching_jobs table."""
-    response = supabase.table('matching_jobs').select('*').execute()
-    return response.data
+    return storage.select_all('matching_jobs')
 
 
 def fetch_all_candidates():
     """Fetch all candidates from matching_candidates table."""
-    response = supabase.table('matching_candidates').select('*').execute()
-    return response.data
+    return storage.select_all('matching_candidates')
 
 
-def get_match_score(job: dict, candidate: dict) -> int:
-    """Call OpenAI to get a match score for a candidate-job pair."""
-    
-    prompt = MATCHING_PROMPT.format(
+# Delay between scoring calls to avoid rate limiting
+REQUEST_DELAY = 0.1
+
+
+def build_matching_prompt(job: dict, candidate: dict) -> str:
+    """Fill the matching prompt for a candidate-job pair."""
+    return MATCHING_PROMPT.format(
         # Job fields
         job_location=job.get('Location (City/Town)', ''),
         job_state=job.get('State', ''),
@@ -64,9 +71,15 @@ def get_match_score(job: dict, candidate: dict) -> int:
         
         # Candidate fields
         candidate_location=candidate.get('Location (Town/City)', ''),
-        commute_distance=candidate.get('How far are you willing to commute (<5 miles, 5-10, 10-20, 20+)', ''),
+        commute_distance=candidate.get(COMMUTE_FIELD, ''),
         candidate_summary=candidate.get('Person AI Chatbot Summary', '')
     )
+
+
+def get_match_score(job: dict, candidate: dict) -> int:
+    """Call OpenAI to get a match score for a candidate-job pair."""
+    
+    prompt = build_matching_prompt(job, candidate)
     
     try:
         response = openai_client.chat.completions.create(
@@ -85,20 +98,71 @@ def get_match_score(job: dict, candidate: dict) -> int:
         return None
 
 
-def save_match(candidate_id: int, job_id: int, score: int):
-    """Save a match result to matches_duplicates table."""
+def build_commute_index(candidates: list, gazetteer: TownGazetteer) -> CommuteGridIndex:
+    """Index candidate home towns and commute limits for distance checks."""
+    return CommuteGridIndex(
+        locations=[gazetteer.lookup(c.get('Location (Town/City)', '')) for c in candidates],
+        max_miles=[parse_commute_miles(c.get(COMMUTE_FIELD, '')) for c in candidates]
+    )
+
+
+def insert_matches(rows: list):
+    """Bulk-insert match results into matches_duplicates table."""
+    storage.insert_many('matches_duplicates', rows)
+
+
+def reachable_candidates(job: dict, gazetteer: TownGazetteer, commute_index: CommuteGridIndex):
+    """Positions of candidates within commute range of the job, or None if the job town is unknown."""
+    job_coords = gazetteer.lookup(job.get('Location (City/Town)', ''), job.get('State', ''))
+    return commute_index.reachable(*job_coords) if job_coords else None
+
+
+def plan_matching(batch_size: int = 500) -> ExecutionPlan:
+    """Work out what run_matching would do, without calling OpenAI or writing matches."""
+    stats = ThroughputStats()
+    jobs = fetch_all_jobs()
+    candidates = fetch_all_candidates()
     
-    data = {
-        'candidate_id': candidate_id,
-        'job_id': job_id,
-        'score': score
-    }
+    gazetteer = TownGazetteer()
+    commute_index = build_commute_index(candidates, gazetteer)
     
-    supabase.table('matches_duplicates').insert(data).execute()
+    llm_calls = 0
+    prompt_tokens = 0
+    for job in jobs:
+        reachable = reachable_candidates(job, gazetteer, commute_index)
+        for position, candidate in enumerate(candidates):
+            if reachable is not None and position not in reachable:
+                continue
+            llm_calls += 1
+            prompt_tokens += estimate_tokens(build_matching_prompt(job, candidate))
+    
+    # Calls run one at a time with a fixed pause; scores are inserted batch_size at a time
+    db_writes = -(-llm_calls // batch_size)
+    return ExecutionPlan(
+        jobs=len(jobs),
+        candidates=len(candidates),
+        pairs_total=len(jobs) * len(candidates),
+        pairs_scored=llm_calls,
+        llm_model="gpt-4o-mini",
+        llm_calls=llm_calls,
+        llm_calls_saved=len(jobs) * len(candidates) - llm_calls,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=2 * llm_calls,
+        db_writes=db_writes,
+        stage_seconds={
+            "match_score": project_llm_seconds(llm_calls, stats.seconds_per_unit("match_score") + REQUEST_DELAY),
+            "db_write": db_writes * stats.seconds_per_unit("db_write"),
+        },
+        measured_stages={stage: stats.is_measured(stage) for stage in ("match_score", "db_write")}
+    )
 
 
-def run_matching():
-    """Main function to run the matching algorithm."""
+def run_matching(batch_size: int = 500, flush_interval: float = 5.0, artifacts_dir: Optional[str] = ARTIFACTS_DIR):
+    """
+    Main function to run the matching algorithm.
+    Every score is also written to a columnar run artifact under artifacts_dir
+    (see artifacts.py) unless artifacts_dir is empty.
+    """
     
     print("=" * 60)
     print("AI Job Matching Algorithm")
@@ -117,10 +181,25 @@ def run_matching():
     print(f"\nTotal pairs to evaluate: {total_pairs}")
     print("-" * 60)
     
+    # Reject pairs beyond the candidate's commute range without asking the LLM
+    gazetteer = TownGazetteer()
+    commute_index = build_commute_index(candidates, gazetteer)
+    stats = ThroughputStats()
+    
+    def timed_insert(rows: list):
+        started = time.perf_counter()
+        insert_matches(rows)
+        stats.record("db_write", 1, time.perf_counter() - started)
+    
+    # Scores are written in bulk in the background, and flushed on exit or Ctrl-C
+    writer = BatchWriter(timed_insert, batch_size=batch_size, flush_interval=flush_interval)
+    artifacts = RunArtifactWriter("matcher", root=artifacts_dir) if artifacts_dir else None
+    
     # Process each pair
     processed = 0
     successful = 0
     failed = 0
+    too_far = 0
     
     for job in jobs:
         job_id = job.get('Job ID')
@@ -128,26 +207,40 @@ def run_matching():
         
         print(f"\nProcessing Job {job_id}: {job_title}")
         
-        for candidate in candidates:
+        reachable = reachable_candidates(job, gazetteer, commute_index)
+        
+        for position, candidate in enumerate(candidates):
             candidate_id = candidate.get('Number')
             candidate_name = candidate.get('Person', 'Unknown')
             
             processed += 1
             print(f"  [{processed}/{total_pairs}] Candidate {candidate_id} ({candidate_name})...", end=" ")
             
+            if reachable is not None and position not in reachable:
+                print("SKIPPED (beyond commute range)")
+                too_far += 1
+                continue
+            
             # Get match score from OpenAI
+            started = time.perf_counter()
             score = get_match_score(job, candidate)
+            stats.record("match_score", 1, time.perf_counter() - started)
             
             if score is not None:
                 print(f"Score: {score}")
-                save_match(candidate_id, job_id, score)
+                writer.add({'candidate_id': candidate_id, 'job_id': job_id, 'score': score})
+                if artifacts is not None:
+                    artifacts.add_scores(candidate_id=[candidate_id], job_id=[job_id], score=[score])
                 successful += 1
             else:
                 print("FAILED")
                 failed += 1
             
             # Small delay to avoid rate limiting
-            time.sleep(0.1)
+            time.sleep(REQUEST_DELAY)
+    
+    writer.close()
+    stats.save()
     
     # Summary
     print("\n" + "=" * 60)
@@ -156,7 +249,57 @@ def run_matching():
     print(f"Total pairs processed: {processed}")
     print(f"Successful matches: {successful}")
     print(f"Failed matches: {failed}")
+    print(f"Saved to database: {writer.rows_written} ({writer.batches_written} batches)")
+    if writer.rows_failed:
+        print(f"Failed to save: {writer.rows_failed} (written to {writer.failed_path})")
+    print(f"Skipped (beyond commute range): {too_far}")
+    if artifacts is not None:
+        run_dir = artifacts.close(summary={
+            "pairs_processed": processed,
+            "successful": successful,
+            "failed": failed,
+            "skipped_commute": too_far,
+        })
+        print(f"Run artifacts: {run_dir}")
 
 
 if __name__ == "__main__":
-    run_matching()
+    parser = argparse.ArgumentParser(description="Score every candidate-job pair with OpenAI")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the execution plan (LLM calls, tokens, cost, projected time) without running it"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Scores per bulk insert. Default: 500"
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=5.0,
+        help="Write pending scores at least this often, in seconds. Default: 5"
+    )
+    parser.add_argument(
+        "--artifacts-dir",
+        default=ARTIFACTS_DIR,
+        help="Where the run's score table is written. Default: run_artifacts"
+    )
+    parser.add_argument(
+        "--no-artifacts",
+        action="store_true",
+        help="Don't write a run artifact"
+    )
+    args = parser.parse_args()
+    
+    if args.dry_run:
+        print("🔍 DRY RUN MODE - No changes will be saved")
+        plan_matching(batch_size=args.batch_size).print()
+    else:
+        run_matching(
+            batch_size=args.batch_size,
+            flush_interval=args.flush_interval,
+            artifacts_dir=None if args.no_artifacts else args.artifacts_dir
+        )
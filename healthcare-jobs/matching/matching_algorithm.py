@@ -10,31 +10,52 @@ This module implements a matching algorithm that:
 
 import os
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Sequence, Tuple, Optional
 from dataclasses import dataclass
 from dotenv import load_dotenv
-from openai import OpenAI
-from sentence_transformers import SentenceTransformer
+from openai import OpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
 from sklearn.metrics.pairwise import cosine_similarity
-from supabase import create_client, Client
+import heapq
 import json
+import time
+from functools import partial
+
+from prefilter import CandidateIndex
+from sharding import Shard, in_shard, shard_label, shard_path
+from concurrency import RateLimiter, SingleFlight, call_with_retry, run_concurrently
+from dedup import group_near_duplicate_jobs
+from embedding import EMBEDDING_MODEL, embedding_model_id, encode, load_model
+from cache import REQUIREMENT_CACHE_PATH, IdealResumeCache, EmbeddingCache, job_fingerprint
+from planner import ExecutionPlan, ThroughputStats, estimate_tokens, project_llm_seconds
+from stages import StagePipeline
+from storage import Storage, get_storage
+from requirement_scoring import (
+    CandidateChunks, job_requirements, max_similarity, requirement_scores, resume_chunks, unique_requirements
+)
+from artifacts import ARTIFACTS_DIR, RunArtifactWriter
+from scheduler import PRIORITY_CRITERIA, SCHEDULE_STATE_PATH, JobScheduler, RunBudget
+from match_snapshot import MATCH_SNAPSHOT_PATH, MatchSnapshot
+from lexical import LEXICAL_INDEX_PATH, BM25Index, job_query, normalize_scores, recall_positions
 
 # Load environment variables
 load_dotenv()
 
 # Initialize clients
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL", ""),
-    os.getenv("SUPABASE_SERVICE_KEY", "")
-)
+storage: Storage = get_storage()
 
 # Initialize sentence transformer model
-# Using multilingual-e5-large as suggested by professor's code
-print("Loading SentenceTransformer model...")
-embedding_model = SentenceTransformer("intfloat/multilingual-e5-large")
+# Using multilingual-e5-large as suggested by professor's code (EMBEDDING_MODEL overrides)
+print(f"Loading SentenceTransformer model {embedding_model_id()}...")
+embedding_model = load_model(EMBEDDING_MODEL)
 print("Model loaded successfully!")
 
+# OpenAI errors worth retrying; anything else (auth, bad request) fails fast
+RETRYABLE_OPENAI_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+
+# Where the precomputed job index (ideal-resume embeddings for all jobs) lives
+JOB_INDEX_PATH = os.getenv("JOB_INDEX_PATH", "job_index.npz")
+
 
 @dataclass
 class Job:
@@ -48,6 +69,10 @@ class Job:
     hourly_wage_maximum: float
     job_description: str
     job_requirements: List[str]
+    department: str = ""
+    # Scheduling: higher priority is matched first (e.g. paying employers)
+    priority: float = 0.0
+    created_at: Optional[str] = None
 
 
 @dataclass
@@ -68,14 +93,24 @@ class MatchResult:
     similarity_score: float
     ideal_resume_embedding: np.ndarray
     candidate_embedding: np.ndarray
+    # Best similarity per requirement (requirement-level scoring only)
+    requirement_coverage: Optional[Dict[str, float]] = None
 
 
-def generate_ideal_resume(job: Job) -> str:
-    """
-    Use GPT-4o to generate an ideal resume/candidate profile based on job description.
-    This serves as the "ground truth" for what a perfect candidate would look like.
-    """
-    prompt = f"""Based on the following job posting, generate an ideal candidate resume/profile 
+@dataclass
+class JobIndex:
+    """Precomputed ideal-resume embeddings for all jobs (row i belongs to job_ids[i])"""
+    job_ids: List[str]
+    ideal_resumes: List[str]
+    embeddings: np.ndarray
+
+
+IDEAL_RESUME_SYSTEM_PROMPT = "You are an expert healthcare recruiter who knows exactly what makes an ideal candidate for healthcare positions. Generate realistic and detailed candidate profiles."
+
+
+def build_ideal_resume_prompt(job: Job) -> str:
+    """Build the GPT-4o prompt used to generate a job's ideal resume."""
+    return f"""Based on the following job posting, generate an ideal candidate resume/profile 
 that would be a perfect match for this position. Include relevant skills, experience, 
 education, and qualifications that would make someone an ideal candidate.
 
@@ -100,13 +135,31 @@ Generate a comprehensive ideal candidate profile that includes:
 Write this as if it were the text content of an actual resume, focusing on healthcare-specific 
 qualifications and experience that would make someone perfect for this role."""
 
+
+# Concurrent requests for the same job (or text) share one GPT-4o call (or encode)
+ideal_resume_flight = SingleFlight()
+embedding_flight = SingleFlight()
+
+
+def generate_ideal_resume(job: Job) -> str:
+    """
+    Use GPT-4o to generate an ideal resume/candidate profile based on job description.
+    This serves as the "ground truth" for what a perfect candidate would look like.
+    Concurrent calls for the same job (by fingerprint) share one request.
+    """
+    return ideal_resume_flight.do(job_fingerprint(job), _generate_ideal_resume, job)
+
+
+def _generate_ideal_resume(job: Job) -> str:
+    prompt = build_ideal_resume_prompt(job)
+
     try:
         response = openai_client.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {
                     "role": "system",
-                    "content": "You are an expert healthcare recruiter who knows exactly what makes an ideal candidate for healthcare positions. Generate realistic and detailed candidate profiles."
+                    "content": IDEAL_RESUME_SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
@@ -122,20 +175,77 @@ qualifications and experience that would make someone perfect for this role."""
         raise
 
 
+def generate_ideal_resume_timed(job: Job, stats: Optional[ThroughputStats] = None) -> str:
+    """generate_ideal_resume, recording per-call latency in stats when given."""
+    started = time.perf_counter()
+    ideal_resume = generate_ideal_resume(job)
+    if stats is not None:
+        stats.record("ideal_resume", 1, time.perf_counter() - started)
+    return ideal_resume
+
+
+def iter_ideal_resumes(
+    jobs: List[Job],
+    max_concurrency: int = 8,
+    requests_per_minute: float = 120,
+    max_retries: int = 3,
+    stats: Optional[ThroughputStats] = None
+):
+    """
+    Generate ideal resumes for many jobs concurrently.
+    At most max_concurrency GPT-4o calls are in flight, call starts are spaced
+    to requests_per_minute, and transient errors are retried with backoff.
+    Yields (job, ideal_resume) as each call finishes; jobs that still fail
+    after retries are yielded with ideal_resume=None.
+    Per-call latency is recorded in stats when given.
+    """
+    rate_limiter = RateLimiter(requests_per_minute)
+    for job, ideal_resume, error in run_concurrently(
+        partial(generate_ideal_resume_timed, stats=stats), jobs,
+        max_concurrency=max_concurrency,
+        rate_limiter=rate_limiter,
+        max_retries=max_retries,
+        retry_on=RETRYABLE_OPENAI_ERRORS
+    ):
+        if error is not None:
+            print(f"  ✗ Ideal resume failed for {job.job_name}: {error}")
+        yield job, ideal_resume
+
+
 def compute_embeddings(texts: List[str], batch_size: int = 16) -> np.ndarray:
     """
     Compute embeddings for a list of texts using SentenceTransformer.
-    Uses the multilingual-e5-large model as recommended.
-    """
-    # For e5 models, we need to add instruction prefix for better results
-    prefixed_texts = [f"query: {text}" for text in texts]
-    embeddings = embedding_model.encode(
-        prefixed_texts, 
-        batch_size=batch_size, 
-        show_progress_bar=True,
-        normalize_embeddings=True  # Normalize for cosine similarity
-    )
-    return np.array(embeddings)
+    Uses the configured model (multilingual-e5-large by default).
+    Each distinct text is encoded once, and texts already being encoded by
+    another thread are waited for instead of encoded again.
+    """
+    if not texts:
+        return encode(embedding_model, texts, batch_size=batch_size)
+    return np.vstack(embedding_flight.do_many(
+        texts, lambda missing: list(encode(embedding_model, missing, batch_size=batch_size))
+    ))
+
+
+def compute_embeddings_cached(
+    texts: List[str],
+    cache: EmbeddingCache,
+    stats: Optional[ThroughputStats] = None
+) -> np.ndarray:
+    """
+    Same as compute_embeddings, but texts already in the cache are not
+    re-encoded. New embeddings are added to the cache (call cache.save()
+    to persist them).
+    """
+    cached, missing = cache.split(texts)
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        started = time.perf_counter()
+        new_embeddings = compute_embeddings(missing_texts)
+        if stats is not None:
+            stats.record("encode", len(missing), time.perf_counter() - started)
+        cache.put_many(missing_texts, new_embeddings)
+    
+    return np.vstack([cache.get(text) for text in texts])
 
 
 def compute_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> float:
@@ -155,6 +265,22 @@ def compute_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> float:
     return float(normalized_score)
 
 
+def compute_similarity_matrix(embeddings1: np.ndarray, embeddings2: np.ndarray) -> np.ndarray:
+    """
+    Compute all pairwise similarities between two sets of embeddings.
+    Returns a (len(embeddings1), len(embeddings2)) matrix in the same [0, 1]
+    range as compute_similarity.
+    """
+    if embeddings1.ndim == 1:
+        embeddings1 = embeddings1.reshape(1, -1)
+    if embeddings2.ndim == 1:
+        embeddings2 = embeddings2.reshape(1, -1)
+    
+    # compute_embeddings normalizes, so the dot product is the cosine similarity
+    similarities = embeddings1 @ embeddings2.T
+    return (similarities + 1) / 2
+
+
 def compute_distance(embedding1: np.ndarray, embedding2: np.ndarray) -> float:
     """
     Compute Euclidean distance between two embeddings.
@@ -196,60 +322,363 @@ def match_candidate_to_job(
     )
 
 
+def select_top_k(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first.
+    Uses argpartition so only the selected k are sorted; k=None sorts all.
+    """
+    if k is None or k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.array([], dtype=int)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class TopMatchesPerCandidate:
+    """
+    Keeps only each candidate's best M matches across all jobs.
+    Uses one bounded min-heap per candidate, so memory stays at
+    (candidates x M) no matter how many jobs are processed.
+    """
+    
+    def __init__(self, max_per_candidate: int):
+        self.max_per_candidate = max_per_candidate
+        self._heaps: Dict[str, List[Tuple[float, int, MatchResult]]] = {}
+        self._counter = 0  # tie-breaker so MatchResults are never compared
+    
+    def add(self, matches: List[MatchResult]) -> None:
+        for match in matches:
+            heap = self._heaps.setdefault(match.user_id, [])
+            entry = (match.similarity_score, self._counter, match)
+            self._counter += 1
+            if len(heap) < self.max_per_candidate:
+                heapq.heappush(heap, entry)
+            elif entry[0] > heap[0][0]:
+                heapq.heapreplace(heap, entry)
+    
+    def results(self) -> List[MatchResult]:
+        """All kept matches, best first within each candidate."""
+        return [
+            entry[2]
+            for heap in self._heaps.values()
+            for entry in sorted(heap, reverse=True)
+        ]
+
+
+def score_jobs_against_candidates(
+    jobs: List[Job],
+    candidates: List[Candidate],
+    ideal_cache: IdealResumeCache,
+    embedding_cache: EmbeddingCache,
+    llm_concurrency: int = 8,
+    llm_requests_per_minute: float = 120
+) -> Tuple[np.ndarray, List[str]]:
+    """
+    Similarity of every candidate to every job, as a (jobs x candidates) matrix.
+    Each distinct job's ideal resume is generated once (concurrently, and only
+    if not already cached) and all texts are encoded in batches.
+    Returns (scores, failed_job_ids); rows of jobs whose ideal resume could
+    not be generated are NaN.
+    """
+    # Identical postings share one ideal resume
+    unique_jobs = list({job_fingerprint(job): job for job in jobs}.values())
+    to_generate = [job for job in unique_jobs if job not in ideal_cache]
+    if to_generate:
+        print(f"Generating {len(to_generate)} ideal resumes ({len(unique_jobs) - len(to_generate)} cached)...")
+        for job, ideal_resume in iter_ideal_resumes(to_generate, llm_concurrency, llm_requests_per_minute):
+            if ideal_resume is not None:
+                ideal_cache.put(job, ideal_resume)
+    
+    ideal_resumes = [ideal_cache.get(job) for job in jobs]
+    ready = [i for i, resume in enumerate(ideal_resumes) if resume is not None]
+    scores = np.full((len(jobs), len(candidates)), np.nan)
+    if ready and candidates:
+        ideal_embeddings = compute_embeddings_cached([ideal_resumes[i] for i in ready], embedding_cache)
+        candidate_embeddings = compute_embeddings_cached([c.resume_text for c in candidates], embedding_cache)
+        scores[ready] = compute_similarity_matrix(ideal_embeddings, candidate_embeddings)
+    
+    failed_job_ids = [job.job_id for job, resume in zip(jobs, ideal_resumes) if resume is None]
+    return scores, failed_job_ids
+
+
 def match_all_candidates_to_job(
     job: Job,
     candidates: List[Candidate],
-    similarity_threshold: float = 0.5
-) -> List[MatchResult]:
+    similarity_threshold: float = 0.5,
+    ideal_resume: Optional[str] = None,
+    ideal_embedding: Optional[np.ndarray] = None,
+    top_k: Optional[int] = None,
+    candidate_embeddings: Optional[np.ndarray] = None,
+    lexical_index: Optional[BM25Index] = None,
+    lexical_weight: float = 0.0,
+    recall_size: Optional[int] = None,
+    return_scores: bool = False
+):
     """
     Match all candidates to a single job.
-    Only returns matches above the similarity threshold.
+    Only returns matches above the similarity threshold, and only the best
+    top_k of those when top_k is set.
+    Pass candidate_embeddings (rows aligned with candidates) to skip encoding.
+    With return_scores, returns (matches, scores) where scores has every
+    candidate's similarity (NaN for candidates dropped by lexical recall).
+    
+    With a lexical_index, recall_size keeps only the candidates whose resumes
+    best match the job's title and requirements by BM25 before anything is
+    encoded, and lexical_weight > 0 fuses the normalized BM25 score into the
+    similarity: (1 - w) * dense + w * lexical.
     """
     print(f"\nMatching candidates to job: {job.job_name}")
     
+    kept = None
+    total_candidates = len(candidates)
+    if lexical_index is not None and recall_size is not None and len(candidates) > recall_size:
+        kept = recall_positions(
+            lexical_index, job, [c.user_id for c in candidates], range(len(candidates)), recall_size
+        )
+        print(f"Lexical recall kept {len(kept)}/{len(candidates)} candidates")
+        candidates = [candidates[i] for i in kept]
+        if candidate_embeddings is not None:
+            candidate_embeddings = candidate_embeddings[kept]
+    
     # Generate ideal resume once for efficiency
-    print("Generating ideal resume with GPT-4o...")
-    ideal_resume = generate_ideal_resume(job)
-    print(f"Ideal resume generated ({len(ideal_resume)} characters)")
+    if ideal_resume is None:
+        print("Generating ideal resume with GPT-4o...")
+        ideal_resume = generate_ideal_resume(job)
+        print(f"Ideal resume generated ({len(ideal_resume)} characters)")
     
     # Compute ideal resume embedding
-    print("Computing ideal resume embedding...")
-    ideal_embedding = compute_embeddings([ideal_resume])[0]
+    if ideal_embedding is None:
+        print("Computing ideal resume embedding...")
+        ideal_embedding = compute_embeddings([ideal_resume])[0]
     
     # Compute all candidate embeddings at once for efficiency
-    print(f"Computing embeddings for {len(candidates)} candidates...")
-    candidate_texts = [c.resume_text for c in candidates]
-    candidate_embeddings = compute_embeddings(candidate_texts)
+    if candidate_embeddings is None:
+        print(f"Computing embeddings for {len(candidates)} candidates...")
+        candidate_texts = [c.resume_text for c in candidates]
+        candidate_embeddings = compute_embeddings(candidate_texts)
+    
+    # Calculate all similarities in one pass
+    similarities = compute_similarity_matrix(ideal_embedding, candidate_embeddings)[0]
+    if lexical_index is not None and lexical_weight > 0:
+        lexical = normalize_scores(lexical_index.scores(job_query(job), [c.user_id for c in candidates]))
+        similarities = (1 - lexical_weight) * similarities + lexical_weight * lexical
+    above = np.flatnonzero(similarities >= similarity_threshold)
+    selected = above[select_top_k(similarities[above], top_k)]
     
-    # Calculate similarities
     matches = []
-    for i, candidate in enumerate(candidates):
-        similarity = compute_similarity(ideal_embedding, candidate_embeddings[i])
-        
-        if similarity >= similarity_threshold:
-            matches.append(MatchResult(
-                job_id=job.job_id,
-                user_id=candidate.user_id,
-                similarity_score=similarity,
-                ideal_resume_embedding=ideal_embedding,
-                candidate_embedding=candidate_embeddings[i]
-            ))
-            print(f"  ✓ {candidate.name}: {similarity:.2%} match")
-        else:
-            print(f"  ✗ {candidate.name}: {similarity:.2%} (below threshold)")
+    for i in selected:
+        candidate = candidates[i]
+        matches.append(MatchResult(
+            job_id=job.job_id,
+            user_id=candidate.user_id,
+            similarity_score=float(similarities[i]),
+            ideal_resume_embedding=ideal_embedding,
+            # Copy so kept matches don't pin the whole per-job embedding matrix in memory
+            candidate_embedding=candidate_embeddings[i].copy()
+        ))
+        print(f"  ✓ {candidate.name}: {similarities[i]:.2%} match")
     
-    # Sort by similarity score (highest first)
-    matches.sort(key=lambda m: m.similarity_score, reverse=True)
+    below = len(candidates) - len(above)
+    print(f"  ✗ {below} below threshold" + (f", {len(above) - len(selected)} beyond top {top_k}" if top_k else ""))
     
+    if return_scores:
+        if kept is not None:
+            scores = np.full(total_candidates, np.nan)
+            scores[kept] = similarities
+            return matches, scores
+        return matches, similarities
     return matches
 
 
+def compute_candidate_chunks(
+    candidates: List[Candidate],
+    cache: EmbeddingCache,
+    stats: Optional[ThroughputStats] = None
+) -> List[np.ndarray]:
+    """Chunk embeddings per candidate, encoded in one batch (cached chunks are reused)."""
+    chunks = [resume_chunks(c.resume_text) for c in candidates]
+    flat = compute_embeddings_cached([chunk for texts in chunks for chunk in texts], cache, stats)
+    offsets = np.cumsum([0] + [len(texts) for texts in chunks])
+    return [flat[offsets[i]:offsets[i + 1]] for i in range(len(candidates))]
+
+
+def match_candidates_by_requirements(
+    job: Job,
+    candidates: List[Candidate],
+    similarity_threshold: float = 0.5,
+    top_k: Optional[int] = None,
+    requirement_embeddings: Optional[np.ndarray] = None,
+    candidate_chunks: Optional[CandidateChunks] = None,
+    coverage_threshold: float = 0.9,
+    cache: Optional[EmbeddingCache] = None,
+    lexical_index: Optional[BM25Index] = None,
+    lexical_weight: float = 0.0,
+    return_scores: bool = False
+):
+    """
+    Score candidates against each of the job's requirements, without an
+    ideal resume (no LLM call). A candidate's similarity for a requirement is
+    its best-matching resume chunk; the match score is the mean over
+    requirements, and requirement_coverage reports each requirement's score.
+    Pass requirement_embeddings (rows aligned with job_requirements(job)) and
+    candidate_chunks to skip encoding; otherwise they come from cache (the
+    shared requirement cache by default).
+    With a lexical_index, lexical_weight > 0 fuses the normalized BM25 score
+    into the match score, as in match_all_candidates_to_job.
+    With return_scores, returns (matches, scores) with every candidate's score.
+    """
+    print(f"\nMatching candidates to job requirements: {job.job_name}")
+    requirements = job_requirements(job)
+    
+    if requirement_embeddings is None or candidate_chunks is None:
+        cache = cache if cache is not None else EmbeddingCache(REQUIREMENT_CACHE_PATH)
+    if requirement_embeddings is None:
+        requirement_embeddings = compute_embeddings_cached(requirements, cache)
+    if candidate_chunks is None:
+        print(f"Computing chunk embeddings for {len(candidates)} candidates...")
+        candidate_chunks = CandidateChunks.from_blocks(compute_candidate_chunks(candidates, cache))
+    
+    # One matrix product and a segmented max for all candidates
+    per_requirement = max_similarity(requirement_embeddings, candidate_chunks)
+    similarities, coverage = requirement_scores(per_requirement, coverage_threshold)
+    if lexical_index is not None and lexical_weight > 0:
+        lexical = normalize_scores(lexical_index.scores(job_query(job), [c.user_id for c in candidates]))
+        similarities = (1 - lexical_weight) * similarities + lexical_weight * lexical
+    above = np.flatnonzero(similarities >= similarity_threshold)
+    selected = above[select_top_k(similarities[above], top_k)]
+    
+    job_embedding = requirement_embeddings.mean(axis=0)
+    job_embedding /= np.linalg.norm(job_embedding)
+    candidate_embeddings = candidate_chunks.candidate_means()
+    
+    matches = []
+    for i in selected:
+        candidate = candidates[i]
+        matches.append(MatchResult(
+            job_id=job.job_id,
+            user_id=candidate.user_id,
+            similarity_score=float(similarities[i]),
+            ideal_resume_embedding=job_embedding,
+            candidate_embedding=candidate_embeddings[i],
+            requirement_coverage={
+                requirement: float(per_requirement[r, i]) for r, requirement in enumerate(requirements)
+            }
+        ))
+        print(f"  ✓ {candidate.name}: {similarities[i]:.2%} match, "
+              f"{coverage[i]:.0%} of {len(requirements)} requirements covered")
+    
+    below = len(candidates) - len(above)
+    print(f"  ✗ {below} below threshold" + (f", {len(above) - len(selected)} beyond top {top_k}" if top_k else ""))
+    
+    if return_scores:
+        return matches, similarities
+    return matches
+
+
+def build_job_index(jobs: List[Job], save_path: Optional[str] = JOB_INDEX_PATH) -> JobIndex:
+    """
+    Generate an ideal resume for every job and embed them all in one batch.
+    The resulting matrix lets a single candidate be scored against every job
+    without touching GPT-4o again.
+    """
+    print(f"Building job index for {len(jobs)} jobs...")
+    generated = [(job, resume) for job, resume in iter_ideal_resumes(jobs) if resume is not None]
+    ideal_resumes = [resume for _, resume in generated]
+    embeddings = compute_embeddings(ideal_resumes) if ideal_resumes else np.zeros((0, 0))
+    
+    job_index = JobIndex(
+        job_ids=[job.job_id for job, _ in generated],
+        ideal_resumes=ideal_resumes,
+        embeddings=embeddings
+    )
+    
+    if save_path:
+        save_job_index(job_index, save_path)
+    
+    return job_index
+
+
+def save_job_index(job_index: JobIndex, save_path: str = JOB_INDEX_PATH) -> None:
+    """
+    Save a job index to disk as a compressed .npz file. The file is replaced
+    atomically, so API workers reloading it never read a partial write.
+    """
+    tmp_path = f"{save_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            job_ids=np.array(job_index.job_ids, dtype=str),
+            ideal_resumes=np.array(job_index.ideal_resumes, dtype=str),
+            embeddings=job_index.embeddings,
+            model=np.array(embedding_model_id())
+        )
+    os.replace(tmp_path, save_path)
+    print(f"Job index ({len(job_index.job_ids)} jobs) saved to {save_path}")
+
+
+def load_job_index(load_path: str = JOB_INDEX_PATH) -> Optional[JobIndex]:
+    """
+    Load a job index from disk. Returns None if it has not been built yet,
+    or was built with a different embedding model.
+    """
+    if not os.path.exists(load_path):
+        return None
+    
+    data = np.load(load_path)
+    model = str(data["model"]) if "model" in data else "intfloat/multilingual-e5-large"
+    if model != embedding_model_id():
+        print(f"⚠️ Job index was built with {model}, not {embedding_model_id()}; rebuild it.")
+        return None
+    return JobIndex(
+        job_ids=data["job_ids"].tolist(),
+        ideal_resumes=data["ideal_resumes"].tolist(),
+        embeddings=data["embeddings"]
+    )
+
+
+def match_candidate_to_jobs(
+    candidate: Candidate,
+    job_index: JobIndex,
+    top_k: int = 10,
+    similarity_threshold: float = 0.5,
+    embedding_cache: Optional[EmbeddingCache] = None
+) -> List[MatchResult]:
+    """
+    Find the best jobs for a single candidate.
+    The resume is embedded once and scored against the precomputed job index
+    with one matrix product, so no ideal resumes are regenerated. With an
+    embedding_cache, a resume embedded at ingest time is not encoded again.
+    """
+    if not job_index.job_ids:
+        return []
+    
+    if embedding_cache is not None:
+        candidate_embedding = compute_embeddings_cached([candidate.resume_text], embedding_cache)[0]
+    else:
+        candidate_embedding = compute_embeddings([candidate.resume_text])[0]
+    similarities = compute_similarity_matrix(candidate_embedding, job_index.embeddings)[0]
+    
+    # Only the top_k jobs are needed, so avoid sorting the whole row
+    top_indices = select_top_k(similarities, top_k)
+    
+    return [
+        MatchResult(
+            job_id=job_index.job_ids[i],
+            user_id=candidate.user_id,
+            similarity_score=float(similarities[i]),
+            ideal_resume_embedding=job_index.embeddings[i],
+            candidate_embedding=candidate_embedding
+        )
+        for i in top_indices
+        if similarities[i] >= similarity_threshold
+    ]
+
+
 def fetch_jobs_from_db() -> List[Job]:
     """Fetch all active jobs from the database."""
-    response = supabase.table("jobs").select("*").execute()
-    
     jobs = []
-    for row in response.data:
+    for row in storage.select_all("jobs"):
         jobs.append(Job(
             job_id=row["job_id"],
             job_name=row["job_name"],
@@ -259,7 +688,10 @@ def fetch_jobs_from_db() -> List[Job]:
             hourly_wage_minimum=float(row.get("hourly_wage_minimum", 0)),
             hourly_wage_maximum=float(row.get("hourly_wage_maximum", 0)),
             job_description=row.get("job_description", ""),
-            job_requirements=row.get("job_requirements", [])
+            job_requirements=row.get("job_requirements", []),
+            department=row.get("department") or "",
+            priority=float(row.get("priority") or 0),
+            created_at=row.get("created_at")
         ))
     
     return jobs
@@ -267,10 +699,8 @@ def fetch_jobs_from_db() -> List[Job]:
 
 def fetch_candidates_from_db() -> List[Candidate]:
     """Fetch all candidates with resumes from the database."""
-    response = supabase.table("u_candidates").select("*").execute()
-    
     candidates = []
-    for row in response.data:
+    for row in storage.select_all("u_candidates"):
         if row.get("resume_text"):  # Only include candidates with resume text
             candidates.append(Candidate(
                 user_id=row["user_id"],
@@ -283,85 +713,684 @@ def fetch_candidates_from_db() -> List[Candidate]:
     return candidates
 
 
+def fetch_candidate_from_db(user_id: str) -> Optional[Candidate]:
+    """Fetch a single candidate by user_id. Returns None if missing or without a resume."""
+    rows = storage.select_where("u_candidates", user_id=user_id)
+    
+    if not rows or not rows[0].get("resume_text"):
+        return None
+    
+    row = rows[0]
+    return Candidate(
+        user_id=row["user_id"],
+        name=row.get("name", ""),
+        email=row.get("email", ""),
+        resume_text=row.get("resume_text", ""),
+        preferences=row.get("preferences")
+    )
+
+
 def save_matches_to_db(matches: List[MatchResult]) -> None:
-    """Save match results to the database."""
-    for match in matches:
-        # Check if match already exists
-        existing = supabase.table("matches").select("match_id").eq(
-            "job_id", match.job_id
-        ).eq("user_id", match.user_id).execute()
-        
-        if existing.data:
-            # Update existing match
-            supabase.table("matches").update({
-                "similarity_score": match.similarity_score,
-                "updated_at": "now()"
-            }).eq("job_id", match.job_id).eq("user_id", match.user_id).execute()
-        else:
-            # Insert new match
-            supabase.table("matches").insert({
+    """
+    Save match results to the database.
+    Existing matches only get a new score, so questionnaire state is kept.
+    """
+    storage.upsert_many(
+        "matches",
+        [
+            {
                 "job_id": match.job_id,
                 "user_id": match.user_id,
                 "similarity_score": match.similarity_score,
                 "questionnaire_sent": False,
-                "match_failed": False
-            }).execute()
+                "match_failed": False,
+                "updated_at": "now()"
+            }
+            for match in matches
+        ],
+        key_columns=("job_id", "user_id"),
+        update_columns=("similarity_score", "updated_at")
+    )
     
     print(f"Saved {len(matches)} matches to database")
 
 
-def run_matching_pipeline(similarity_threshold: float = 0.5) -> Dict:
+def save_match_changes(
+    matches: List[MatchResult],
+    snapshot: MatchSnapshot,
+    below_threshold: List[Tuple[str, str]],
+    epsilon: float = 0.001
+) -> Dict[str, int]:
+    """
+    Write only what changed since the last run: new matches, scores that
+    moved by more than epsilon, and deletions of previously written pairs
+    in below_threshold (scored this run and no longer a match). Rows whose
+    questionnaire was already sent are never deleted.
+    Returns the write counts.
+    """
+    changes = snapshot.diff(matches, below_threshold, epsilon)
+    if changes.inserts or changes.updates:
+        save_matches_to_db(changes.inserts + changes.updates)
+    if changes.deletes:
+        storage.delete_many(
+            "matches",
+            [{"job_id": job_id, "user_id": user_id} for job_id, user_id in changes.deletes],
+            key_columns=("job_id", "user_id"),
+            where={"questionnaire_sent": False}
+        )
+    snapshot.apply(changes)
+    return {
+        "inserted": len(changes.inserts),
+        "updated": len(changes.updates),
+        "deleted": len(changes.deletes),
+        "unchanged": changes.unchanged,
+    }
+
+
+def fetch_pipeline_inputs(
+    shard: Optional[Shard] = None,
+    shard_by: str = "jobs"
+) -> Tuple[List[Job], List[Candidate]]:
+    """
+    Fetch jobs and candidates, keeping only this shard's slice of one of them.
+    Shard membership is a hash of the id, not a stored column, so every shard
+    still reads both tables in full.
+    """
+    jobs = fetch_jobs_from_db()
+    candidates = fetch_candidates_from_db()
+    if shard_by == "jobs":
+        jobs = [j for j in jobs if in_shard(j.job_id, shard)]
+    else:
+        candidates = [c for c in candidates if in_shard(c.user_id, shard)]
+    return jobs, candidates
+
+
+def load_indexed_jobs(shard: Optional[Shard], shard_by: str) -> Dict[str, Tuple[str, np.ndarray]]:
+    """
+    Candidate shards share the job set, so they reuse the ideal resumes in
+    the existing job index instead of each generating their own.
+    """
+    if shard is None or shard_by != "candidates":
+        return {}
+    existing_index = load_job_index()
+    if existing_index is None:
+        print("\n⚠️ No job index found; every candidate shard will generate its own ideal resumes.")
+        return {}
+    return {
+        job_id: (existing_index.ideal_resumes[i], existing_index.embeddings[i])
+        for i, job_id in enumerate(existing_index.job_ids)
+    }
+
+
+def compute_feasible_candidates(
+    jobs: List[Job],
+    candidates: List[Candidate],
+    use_prefilter: bool = True
+) -> Dict[str, List[int]]:
+    """Positions of the candidates each job will be scored against."""
+    if not use_prefilter:
+        everyone = list(range(len(candidates)))
+        return {job.job_id: everyone for job in jobs}
+    candidate_index = CandidateIndex(candidates)
+    return {job.job_id: candidate_index.feasible_candidates(job) for job in jobs}
+
+
+def load_lexical_index(candidates: List[Candidate], save: bool = True) -> BM25Index:
+    """Load the saved BM25 index and add new or changed resumes."""
+    index = BM25Index.load(LEXICAL_INDEX_PATH)
+    updated = index.add_many((c.user_id, c.resume_text) for c in candidates)
+    print(f"   Lexical index: {len(index)} resumes ({updated} new or changed)")
+    if save and updated:
+        index.save(LEXICAL_INDEX_PATH)
+    return index
+
+
+def apply_lexical_recall(
+    feasible: Dict[str, List[int]],
+    jobs: List[Job],
+    candidates: List[Candidate],
+    lexical_index: BM25Index,
+    recall_size: int
+) -> Dict[str, List[int]]:
+    """Keep only each job's recall_size best feasible candidates by BM25."""
+    candidate_ids = [c.user_id for c in candidates]
+    return {
+        job.job_id: recall_positions(lexical_index, job, candidate_ids, feasible[job.job_id], recall_size)
+        for job in jobs
+    }
+
+
+def group_jobs_for_generation(
+    jobs: List[Job],
+    dedup_threshold: Optional[float] = 0.9
+) -> List[List[Job]]:
+    """Group near-duplicate postings; the first job of each group is canonical."""
+    if dedup_threshold is None or len(jobs) < 2:
+        return [[job] for job in jobs]
+    return [[jobs[i] for i in group] for group in group_near_duplicate_jobs(jobs, dedup_threshold)]
+
+
+def plan_matching_pipeline(
+    similarity_threshold: float = 0.5,
+    use_prefilter: bool = True,
+    shard: Optional[Shard] = None,
+    shard_by: str = "jobs",
+    llm_concurrency: int = 8,
+    llm_requests_per_minute: float = 120,
+    dedup_threshold: Optional[float] = 0.9,
+    top_k: Optional[int] = None,
+    top_m: Optional[int] = None,
+    lexical_weight: float = 0.0,
+    recall_size: Optional[int] = None,
+    scoring: str = "ideal_resume"
+) -> ExecutionPlan:
     """
-    Run the complete matching pipeline:
-    1. Fetch all jobs and candidates
-    2. Generate ideal resumes for each job
-    3. Compute matches for all candidate-job pairs
-    4. Save results to database
+    Work out what run_matching_pipeline would do with the same arguments,
+    without calling the LLM, encoding anything or writing to the database.
+    """
+    stats = ThroughputStats()
+    ideal_cache = IdealResumeCache()
+    embedding_cache = EmbeddingCache()
+    
+    jobs, candidates = fetch_pipeline_inputs(shard, shard_by)
+    feasible = compute_feasible_candidates(jobs, candidates, use_prefilter)
+    if recall_size is not None:
+        feasible = apply_lexical_recall(
+            feasible, jobs, candidates, load_lexical_index(candidates, save=False), recall_size
+        )
+    pairs_scored = sum(len(positions) for positions in feasible.values())
+    
+    if scoring == "requirements":
+        indexed_jobs, groups = {}, []
+    else:
+        indexed_jobs = load_indexed_jobs(shard, shard_by)
+        groups = group_jobs_for_generation([j for j in jobs if j.job_id not in indexed_jobs], dedup_threshold)
+    to_generate = [group[0] for group in groups if group[0] not in ideal_cache]
+    cached_resumes = [ideal_cache.get(group[0]) for group in groups if group[0] in ideal_cache]
+    
+    system_tokens = estimate_tokens(IDEAL_RESUME_SYSTEM_PROMPT)
+    prompt_tokens = sum(system_tokens + estimate_tokens(build_ideal_resume_prompt(job)) for job in to_generate)
+    completion_tokens = int(len(to_generate) * stats.value("ideal_resume_completion_tokens", 900))
+    
+    # Candidates that are feasible for at least one job, plus new ideal resumes
+    used_positions = sorted({i for positions in feasible.values() for i in positions})
+    if scoring == "requirements":
+        # Distinct requirements and resume chunks, in the requirement cache
+        texts = unique_requirements(jobs)[0]
+        texts += [chunk for i in used_positions for chunk in resume_chunks(candidates[i].resume_text)]
+        cached_texts, missing_texts = EmbeddingCache(REQUIREMENT_CACHE_PATH).split(texts)
+    else:
+        texts = [candidates[i].resume_text for i in used_positions]
+        texts += [resume for resume in cached_resumes if resume]
+        cached_texts, missing_texts = embedding_cache.split(texts)
+    texts_to_encode = len(missing_texts) + len(to_generate)
+    
+    # Each saved match is a select plus an insert/update
+    expected_matches = pairs_scored * stats.value("match_rate", 1.0)
+    if top_k:
+        expected_matches = min(expected_matches, top_k * len(jobs))
+    if top_m:
+        expected_matches = min(expected_matches, top_m * len(candidates))
+    # Unchanged scores are skipped, so only the measured share is written
+    db_writes = int(2 * expected_matches * stats.value("write_rate", 1.0))
+    
+    return ExecutionPlan(
+        jobs=len(jobs),
+        candidates=len(candidates),
+        pairs_total=len(jobs) * len(candidates),
+        pairs_scored=pairs_scored,
+        llm_model="gpt-4o",
+        llm_calls=len(to_generate),
+        llm_cache_hits=len(cached_resumes) + len(indexed_jobs),
+        llm_calls_saved=sum(len(group) - 1 for group in groups),
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        texts_to_encode=texts_to_encode,
+        texts_cached=len(cached_texts),
+        db_writes=db_writes,
+        stage_seconds={
+            "ideal_resume": project_llm_seconds(
+                len(to_generate), stats.seconds_per_unit("ideal_resume"),
+                llm_concurrency, llm_requests_per_minute
+            ),
+            "encode": texts_to_encode * stats.seconds_per_unit("encode"),
+            "db_write": db_writes * stats.seconds_per_unit("db_write"),
+        },
+        measured_stages={stage: stats.is_measured(stage) for stage in ("ideal_resume", "encode", "db_write")}
+    )
+
+
+def run_matching_pipeline(
+    similarity_threshold: float = 0.5,
+    use_prefilter: bool = True,
+    shard: Optional[Shard] = None,
+    shard_by: str = "jobs",
+    llm_concurrency: int = 8,
+    llm_requests_per_minute: float = 120,
+    dedup_threshold: Optional[float] = 0.9,
+    top_k: Optional[int] = None,
+    top_m: Optional[int] = None,
+    lexical_weight: float = 0.0,
+    recall_size: Optional[int] = None,
+    scoring: str = "ideal_resume",
+    queue_size: int = 16,
+    write_epsilon: float = 0.001,
+    artifacts_dir: Optional[str] = ARTIFACTS_DIR,
+    priority: Sequence[str] = PRIORITY_CRITERIA,
+    deadline: Optional[float] = None,
+    max_llm_calls: Optional[int] = None
+) -> Dict:
     """
+    Run the complete matching pipeline as concurrent stages connected by
+    bounded queues, so the LLM, the CPU and the database are busy at the
+    same time:
+    1. fetch     - fetch jobs and candidates, prefilter, group near-duplicates
+    2. generate  - ideal resume per job group (llm_concurrency threads)
+    3. encode    - ideal-resume and candidate embeddings (one thread, CPU)
+    4. score     - similarity for the pairs that pass the hard-constraint
+                   prefilter (location, wage, department)
+    5. persist   - write each job's changed matches to the database
+    Afterwards the job index is saved so new candidates can be matched
+    without a full run. Each stage's utilization is printed and returned.
+    
+    With shard=(i, N), only the jobs (or candidates, with shard_by="candidates")
+    whose id hashes to shard i are processed, so N workers split a run
+    without overlapping writes. When sharding by candidates, ideal resumes are
+    taken from the existing job index instead of being regenerated by every
+    worker.
+    
+    Ideal-resume calls are capped at llm_requests_per_minute. When a later
+    stage falls behind, its queue (queue_size items) fills up and earlier
+    stages wait rather than buffering the whole run in memory.
+    
+    Near-duplicate postings (MinHash Jaccard >= dedup_threshold over title,
+    company, description and requirements) share one ideal resume and
+    embedding. Pass dedup_threshold=None to generate one per job.
+    
+    top_k keeps at most that many matches per job and top_m at most that many
+    per candidate, so the number of saved rows is bounded by the pool size.
+    With top_m, matches can only be saved once every job has been scored,
+    so it cannot be combined with sharding by jobs (each shard would keep
+    up to top_m per candidate); shard by candidates instead.
+    
+    recall_size and lexical_weight use a BM25 index over resumes (see
+    lexical.py): only each job's recall_size best lexical matches are encoded
+    and scored, and lexical_weight blends the BM25 score into similarity.
+    
+    scoring="requirements" skips ideal resumes (and the LLM) entirely and
+    scores candidates per requirement (see match_candidates_by_requirements);
+    every distinct requirement string is embedded once for the whole run.
+    
+    Only changes are written (see match_snapshot.py): new matches, scores
+    that moved by more than write_epsilon, and deletions of pairs scored
+    below similarity_threshold this run (unless their questionnaire was
+    sent). The write counts are returned under "writes".
+    
+    Jobs are processed in priority order (see scheduler.py). With a deadline
+    (Unix time) or max_llm_calls, no new jobs are started once either is
+    reached; everything already scored is saved as usual, and the jobs left
+    over are first in line on the next run.
+    
+    Every scored pair's similarity and every embedding used are written as
+    a columnar run artifact under artifacts_dir (see artifacts.py); pass
+    artifacts_dir=None to skip it.
+    
+    Ideal resumes and embeddings are cached on disk between runs, and stage
+    timings are recorded for plan_matching_pipeline's estimates.
+    """
+    if top_m and shard is not None and shard_by == "jobs":
+        raise ValueError("top_m needs every job in one run; shard by candidates instead")
+    
     print("=" * 60)
     print("HEALTHCARE JOB MATCHING PIPELINE")
+    if shard is not None:
+        print(f"Shard {shard[0]}/{shard[1]} (by {shard_by})")
     print("=" * 60)
     
-    # Fetch data
-    print("\n📋 Fetching jobs from database...")
-    jobs = fetch_jobs_from_db()
-    print(f"   Found {len(jobs)} jobs")
+    stats = ThroughputStats()
+    ideal_cache = IdealResumeCache()
+    embedding_cache = EmbeddingCache()
+    requirement_cache = EmbeddingCache(REQUIREMENT_CACHE_PATH)
+    snapshot = MatchSnapshot(shard_path(MATCH_SNAPSHOT_PATH, shard), storage)
+    scheduler = JobScheduler(priority, shard_path(SCHEDULE_STATE_PATH, shard))
+    budget = RunBudget(deadline, max_llm_calls)
+    rate_limiter = RateLimiter(llm_requests_per_minute)
+    by_requirements = scoring == "requirements"
+    artifacts = RunArtifactWriter(
+        "matching_pipeline",
+        params={
+            "similarity_threshold": similarity_threshold, "use_prefilter": use_prefilter,
+            "shard": shard, "shard_by": shard_by, "top_k": top_k, "top_m": top_m,
+            "lexical_weight": lexical_weight, "recall_size": recall_size, "scoring": scoring,
+        },
+        root=artifacts_dir,
+        suffix=f".shard-{shard_label(shard)}" if shard is not None else ""
+    ) if artifacts_dir else None
     
-    print("\n👤 Fetching candidates from database...")
-    candidates = fetch_candidates_from_db()
-    print(f"   Found {len(candidates)} candidates with resumes")
+    jobs: List[Job] = []
+    candidates: List[Candidate] = []
+    feasible: Dict[str, List[int]] = {}
+    lexical_index: Optional[BM25Index] = None
+    candidate_embeddings: Dict[int, np.ndarray] = {}
+    requirement_matrix = np.zeros((0, 0))
+    requirement_rows: Dict[str, List[int]] = {}
+    per_candidate = TopMatchesPerCandidate(top_m) if top_m else None
+    unmatched_pairs = []
+    all_matches = []
+    writes = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    scored_job_ids = []
+    indexed_job_ids = []
+    ideal_resumes = []
+    ideal_embeddings = []
+    failed_jobs = []
+    completion_tokens = []
+    llm_calls_saved = 0
+    pairs_total = 0
+    pairs_scored = 0
     
-    if not jobs or not candidates:
-        print("\n⚠️ No jobs or candidates found. Exiting.")
-        return {"jobs": 0, "candidates": 0, "matches": 0}
+    def fetch():
+        """Yield (group, ideal_resume, ideal_embedding); the last two are None until generated."""
+        nonlocal jobs, candidates, feasible, lexical_index, llm_calls_saved, requirement_matrix, requirement_rows
+        print("\n📋 Fetching jobs and candidates from database...")
+        jobs, candidates = fetch_pipeline_inputs(shard, shard_by)
+        jobs = scheduler.prioritize(jobs)
+        print(f"   Found {len(jobs)} jobs")
+        print(f"   Found {len(candidates)} candidates with resumes")
+        if not jobs or not candidates:
+            return
+        
+        indexed_jobs = load_indexed_jobs(shard, shard_by)
+        if use_prefilter:
+            print("\n🔎 Indexing candidate preferences...")
+        feasible = compute_feasible_candidates(jobs, candidates, use_prefilter)
+        if recall_size is not None or lexical_weight > 0:
+            lexical_index = load_lexical_index(candidates)
+        if recall_size is not None:
+            feasible = apply_lexical_recall(feasible, jobs, candidates, lexical_index, recall_size)
+        
+        if by_requirements:
+            requirement_texts, requirement_rows = unique_requirements(jobs)
+            print(f"\n📝 Embedding {len(requirement_texts)} distinct requirements "
+                  f"({sum(map(len, requirement_rows.values()))} across all jobs)...")
+            requirement_matrix = compute_embeddings_cached(requirement_texts, requirement_cache, stats)
+            for job in jobs:
+                if budget.expired():
+                    return
+                yield [job], None, None
+            return
+        
+        groups = group_jobs_for_generation([j for j in jobs if j.job_id not in indexed_jobs], dedup_threshold)
+        llm_calls_saved = sum(len(group) - 1 for group in groups)
+        print(f"\n🤖 Preparing ideal resumes for {len(groups)} job groups "
+              f"({llm_calls_saved} postings shared with near-duplicates; "
+              f"{llm_concurrency} concurrent, {llm_requests_per_minute:g}/min)...")
+        
+        # Indexed jobs and generation groups go out interleaved in the
+        # scheduler's order, so a fresh urgent posting isn't queued behind
+        # every previously indexed one. A group goes as early as its most
+        # urgent posting.
+        rank = {job.job_id: i for i, job in enumerate(jobs)}
+        items = [(rank[job.job_id], ([job],) + indexed_jobs[job.job_id]) for job in jobs if job.job_id in indexed_jobs]
+        items += [(min(rank[job.job_id] for job in group), (group, None, None)) for group in groups]
+        items.sort(key=lambda item: item[0])
+        for _, item in items:
+            if budget.expired():
+                return
+            yield item
     
-    # Run matching for each job
-    all_matches = []
-    for job in jobs:
-        matches = match_all_candidates_to_job(job, candidates, similarity_threshold)
+    def generate(item):
+        group, ideal_resume, ideal_embedding = item
+        # Queued jobs past the deadline are left for the next run
+        if budget.expired():
+            return []
+        if ideal_resume is None and not by_requirements:
+            canonical = group[0]
+            ideal_resume = ideal_cache.get(canonical)
+            if ideal_resume is None:
+                if not budget.take_llm_call():
+                    return []
+                try:
+                    ideal_resume = call_with_retry(
+                        generate_ideal_resume_timed, canonical,
+                        stats=stats,
+                        retry_on=RETRYABLE_OPENAI_ERRORS,
+                        rate_limiter=rate_limiter
+                    )
+                except Exception as e:
+                    print(f"  ✗ Ideal resume failed for {canonical.job_name}: {e}")
+                    failed_jobs.extend(job.job_id for job in group)
+                    return []
+                ideal_cache.put(canonical, ideal_resume)
+                completion_tokens.append(estimate_tokens(ideal_resume))
+                print(f"Ideal resume ready for: {canonical.job_name} ({len(ideal_resume)} characters)"
+                      + (f", shared with {len(group) - 1} similar postings" if len(group) > 1 else ""))
+        return [(group, ideal_resume, ideal_embedding)]
+    
+    def encode(item):
+        group, ideal_resume, ideal_embedding = item
+        if ideal_embedding is None and not by_requirements:
+            ideal_embedding = compute_embeddings_cached([ideal_resume], embedding_cache, stats)[0]
+        
+        # Candidates are encoded the first time any job needs them
+        # (as one vector, or as chunk vectors when scoring by requirements)
+        needed = sorted({i for job in group for i in feasible[job.job_id]} - candidate_embeddings.keys())
+        if needed and by_requirements:
+            new_embeddings = compute_candidate_chunks([candidates[i] for i in needed], requirement_cache, stats)
+            candidate_embeddings.update(zip(needed, new_embeddings))
+        elif needed:
+            new_embeddings = compute_embeddings_cached(
+                [candidates[i].resume_text for i in needed], embedding_cache, stats
+            )
+            candidate_embeddings.update(zip(needed, new_embeddings))
+        
+        ready = []
+        for job in group:
+            positions = feasible[job.job_id]
+            if not positions:
+                job_embeddings = None
+            elif by_requirements:
+                job_embeddings = CandidateChunks.from_blocks([candidate_embeddings[i] for i in positions])
+            else:
+                job_embeddings = np.vstack([candidate_embeddings[i] for i in positions])
+            ready.append((job, ideal_resume, ideal_embedding, positions, job_embeddings))
+        return ready
+    
+    def score(item):
+        nonlocal pairs_total, pairs_scored
+        job, ideal_resume, ideal_embedding, positions, job_embeddings = item
+        if not by_requirements:
+            indexed_job_ids.append(job.job_id)
+            ideal_resumes.append(ideal_resume)
+            ideal_embeddings.append(ideal_embedding)
+        
+        if use_prefilter or recall_size is not None:
+            print(f"   {job.job_name}: {len(positions)}/{len(candidates)} candidates pass prefilter/recall")
+        pairs_total += len(candidates)
+        pairs_scored += len(positions)
+        scored_job_ids.append(job.job_id)
+        if not positions:
+            matches = []
+        elif by_requirements:
+            matches, job_scores = match_candidates_by_requirements(
+                job, [candidates[i] for i in positions], similarity_threshold,
+                top_k=top_k,
+                requirement_embeddings=requirement_matrix[requirement_rows[job.job_id]],
+                candidate_chunks=job_embeddings,
+                lexical_index=lexical_index,
+                lexical_weight=lexical_weight,
+                return_scores=True
+            )
+        else:
+            matches, job_scores = match_all_candidates_to_job(
+                job, [candidates[i] for i in positions], similarity_threshold,
+                ideal_resume=ideal_resume,
+                ideal_embedding=ideal_embedding,
+                top_k=top_k,
+                candidate_embeddings=job_embeddings,
+                lexical_index=lexical_index,
+                lexical_weight=lexical_weight,
+                return_scores=True
+            )
+        below_threshold = []
+        if positions:
+            user_ids = [candidates[i].user_id for i in positions]
+            # NaN (not recalled, so not scored) compares False and is kept
+            below_threshold = [(job.job_id, user_ids[i]) for i in np.flatnonzero(job_scores < similarity_threshold)]
+        if artifacts is not None and positions:
+            matched = {m.user_id for m in matches}
+            artifacts.add_scores(
+                job_id=[job.job_id] * len(positions),
+                user_id=user_ids,
+                score=job_scores.astype(np.float32),
+                matched=[user_id in matched for user_id in user_ids]
+            )
+        if per_candidate is not None:
+            per_candidate.add(matches)
+            unmatched_pairs.extend(below_threshold)
+            return []
+        return [([job], matches, below_threshold)]
+    
+    def persist(item):
+        scored_jobs, matches, below_threshold = item
+        started = time.perf_counter()
+        counts = save_match_changes(matches, snapshot, below_threshold, write_epsilon)
+        # Only jobs whose matches are written count as scored for the scheduler
+        scheduler.mark_scored(scored_jobs)
+        written = counts["inserted"] + counts["updated"] + counts["deleted"]
+        if written:
+            stats.record("db_write", 2 * written, time.perf_counter() - started)
+        for key, count in counts.items():
+            writes[key] += count
         all_matches.extend(matches)
     
-    # Save to database
-    print("\n💾 Saving matches to database...")
-    save_matches_to_db(all_matches)
+    pipeline = (
+        StagePipeline()
+        .add_stage("generate", generate, workers=llm_concurrency, queue_size=queue_size)
+        .add_stage("encode", encode, queue_size=queue_size)
+        .add_stage("score", score, queue_size=queue_size)
+        .add_stage("persist", persist, queue_size=queue_size)
+    )
+    # Whatever a failing stage leaves behind is kept: the caches hold paid-for
+    # LLM calls and embeddings, the snapshot and schedule only what was written
+    try:
+        pipeline.run(fetch())
+    
+        if not jobs or not candidates:
+            print("\n⚠️ No jobs or candidates found. Exiting.")
+            if artifacts is not None:
+                artifacts.close()
+            return {"jobs": 0, "candidates": 0, "matches": 0, "pairs_total": 0, "pairs_scored": 0,
+                    "prune_ratio": 0.0, "shard_by": shard_by}
+    
+        if per_candidate is not None:
+            print("\n💾 Saving matches to database...")
+            scored = set(scored_job_ids)
+            persist(([job for job in jobs if job.job_id in scored], per_candidate.results(), unmatched_pairs))
+    
+        pipeline.print_report()
+    
+        scored = set(scored_job_ids)
+        leftover_jobs = [job.job_id for job in jobs if job.job_id not in scored and job.job_id not in failed_jobs]
+    
+        # Keep the ideal-resume embeddings around for candidate -> jobs lookups.
+        # Job shards each write their slice; the coordinator merges them.
+        if (shard is None or shard_by == "jobs") and ideal_embeddings:
+            index_path = shard_path(JOB_INDEX_PATH, shard)
+            index = JobIndex(
+                job_ids=list(indexed_job_ids),
+                ideal_resumes=list(ideal_resumes),
+                embeddings=np.vstack(ideal_embeddings)
+            )
+            # Jobs not reached this run keep their previous entry
+            previous = load_job_index(index_path) if leftover_jobs or failed_jobs else None
+            if previous is not None:
+                current = {job.job_id for job in jobs} - scored
+                kept = [i for i, job_id in enumerate(previous.job_ids) if job_id in current]
+                index.job_ids += [previous.job_ids[i] for i in kept]
+                index.ideal_resumes += [previous.ideal_resumes[i] for i in kept]
+                index.embeddings = np.vstack([index.embeddings, previous.embeddings[kept]])
+            save_job_index(index, index_path)
+    
+        if artifacts is not None:
+            if by_requirements:
+                job_vectors = [requirement_matrix[requirement_rows[job_id]].mean(axis=0) for job_id in scored_job_ids]
+                candidate_vectors = [block.mean(axis=0) for block in candidate_embeddings.values()]
+            else:
+                job_vectors = ideal_embeddings
+                candidate_vectors = list(candidate_embeddings.values())
+            if job_vectors:
+                job_matrix = np.vstack(job_vectors)
+                artifacts.add_embeddings(
+                    scored_job_ids if by_requirements else indexed_job_ids,
+                    "job",
+                    job_matrix / np.linalg.norm(job_matrix, axis=1, keepdims=True)
+                )
+            if candidate_vectors:
+                candidate_matrix = np.vstack(candidate_vectors)
+                artifacts.add_embeddings(
+                    [candidates[i].user_id for i in candidate_embeddings],
+                    "candidate",
+                    candidate_matrix / np.linalg.norm(candidate_matrix, axis=1, keepdims=True)
+                )
+    
+        if completion_tokens:
+            stats.set_value("ideal_resume_completion_tokens", float(np.mean(completion_tokens)))
+        if pairs_scored and not (top_k or top_m):
+            stats.set_value("match_rate", len(all_matches) / pairs_scored)
+        if all_matches:
+            stats.set_value("write_rate", (writes["inserted"] + writes["updated"]) / len(all_matches))
+        stats.save()
+    finally:
+        snapshot.save()
+        scheduler.save()
+        ideal_cache.save()
+        embedding_cache.save()
+        requirement_cache.save()
     
     # Summary
     print("\n" + "=" * 60)
     print("MATCHING COMPLETE")
     print("=" * 60)
-    print(f"Jobs processed: {len(jobs)}")
+    print(f"Jobs processed: {len(scored_job_ids)}")
+    if leftover_jobs:
+        print(f"Jobs left for the next run ({budget.stop_reason} reached): {len(leftover_jobs)}")
+    if failed_jobs:
+        print(f"Jobs skipped (ideal resume failed): {len(failed_jobs)}")
+    if llm_calls_saved:
+        print(f"Ideal-resume calls saved by near-duplicate grouping: {llm_calls_saved}")
     print(f"Candidates evaluated: {len(candidates)}")
+    prune_ratio = 1 - pairs_scored / pairs_total if pairs_total else 0.0
+    print(f"Pairs scored: {pairs_scored}/{pairs_total} ({prune_ratio:.1%} pruned by prefilter/recall)")
     print(f"Total matches created: {len(all_matches)}")
+    print(f"Writes: {writes['inserted']} inserted, {writes['updated']} updated, "
+          f"{writes['deleted']} deleted, {writes['unchanged']} unchanged skipped")
     
     if all_matches:
         avg_score = np.mean([m.similarity_score for m in all_matches])
         print(f"Average match score: {avg_score:.2%}")
     
-    return {
-        "jobs": len(jobs),
+    results = {
+        "jobs": len(scored_job_ids),
         "candidates": len(candidates),
-        "matches": len(all_matches)
+        "matches": len(all_matches),
+        "failed_jobs": failed_jobs,
+        "llm_calls_saved": llm_calls_saved,
+        "pairs_total": pairs_total,
+        "pairs_scored": pairs_scored,
+        "prune_ratio": prune_ratio,
+        "shard_by": shard_by,
+        "writes": writes,
+        "leftover_jobs": leftover_jobs,
+        "stop_reason": budget.stop_reason,
+        "llm_calls": budget.llm_calls,
+        "stage_utilization": {
+            name: entry["utilization"] for name, entry in pipeline.report().items()
+        }
     }
+    if artifacts is not None:
+        results["artifacts"] = artifacts.close(summary=results)
+        print(f"Run artifacts: {results['artifacts']}")
+    return results
 
 
 # ============================================================================
@@ -0,0 +1,151 @@
+"""
+Execution planning for --dry-run.
+
+Both matching scripts describe a prospective run as an ExecutionPlan: LLM
+calls and tokens left after cache hits, texts to encode versus already
+cached, expected DB writes, and projected wall time per stage. Time is
+projected from per-stage throughput measured on previous runs
+(pipeline_stats.json, override with PIPELINE_STATS_PATH); stages that have
+never been measured fall back to conservative defaults.
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+STATS_PATH = os.getenv("PIPELINE_STATS_PATH", "pipeline_stats.json")
+
+# USD per 1M tokens (input, output)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# Seconds per unit when a stage has never been measured
+DEFAULT_SECONDS_PER_UNIT = {
+    "ideal_resume": 20.0,   # per GPT-4o call
+    "match_score": 0.8,     # per gpt-4o-mini scoring call
+    "encode": 0.25,         # per text on CPU
+    "db_write": 0.05,       # per Supabase request
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English)."""
+    return max(1, len(text) // 4)
+
+
+class ThroughputStats:
+    """
+    Measured per-stage throughput, accumulated across runs.
+    Each stage stores total units processed and total seconds spent, plus
+    free-form averages (e.g. completion tokens per call, match rate).
+    """
+
+    def __init__(self, path: str = STATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data: Dict[str, Dict[str, float]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+
+    def record(self, stage: str, units: float, seconds: float) -> None:
+        """Add measured work for a stage (thread-safe)."""
+        with self._lock:
+            entry = self.data.setdefault(stage, {"units": 0.0, "seconds": 0.0})
+            entry["units"] += units
+            entry["seconds"] += seconds
+
+    def set_value(self, name: str, value: float) -> None:
+        with self._lock:
+            self.data.setdefault("values", {})[name] = value
+
+    def value(self, name: str, default: float) -> float:
+        return self.data.get("values", {}).get(name, default)
+
+    def seconds_per_unit(self, stage: str) -> float:
+        entry = self.data.get(stage)
+        if not entry or not entry["units"]:
+            return DEFAULT_SECONDS_PER_UNIT[stage]
+        return entry["seconds"] / entry["units"]
+
+    def is_measured(self, stage: str) -> bool:
+        return bool(self.data.get(stage, {}).get("units"))
+
+    def save(self) -> None:
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+@dataclass
+class ExecutionPlan:
+    """What a run would do and roughly how long and how much it would cost"""
+    jobs: int
+    candidates: int
+    pairs_total: int
+    pairs_scored: int
+    llm_model: str
+    llm_calls: int
+    llm_cache_hits: int = 0
+    llm_calls_saved: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    texts_to_encode: int = 0
+    texts_cached: int = 0
+    db_writes: int = 0
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    measured_stages: Dict[str, bool] = field(default_factory=dict)
+
+    @property
+    def estimated_cost(self) -> float:
+        input_price, output_price = MODEL_PRICES.get(self.llm_model, MODEL_PRICES["gpt-4o"])
+        return (self.prompt_tokens * input_price + self.completion_tokens * output_price) / 1_000_000
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.stage_seconds.values())
+
+    def print(self) -> None:
+        print("\n📐 EXECUTION PLAN")
+        print("-" * 60)
+        print(f"Jobs: {self.jobs}   Candidates: {self.candidates}")
+        print(f"Pairs to score: {self.pairs_scored}/{self.pairs_total}")
+        print(f"LLM calls ({self.llm_model}): {self.llm_calls}"
+              f"  (cache hits: {self.llm_cache_hits}, saved by dedup/filters: {self.llm_calls_saved})")
+        print(f"Tokens: ~{self.prompt_tokens:,} prompt + ~{self.completion_tokens:,} completion"
+              f"  (~${self.estimated_cost:,.2f})")
+        if self.texts_to_encode or self.texts_cached:
+            print(f"Texts to encode: {self.texts_to_encode}  (already cached: {self.texts_cached})")
+        print(f"Expected DB writes: ~{self.db_writes}")
+        print("Projected wall time:")
+        for stage, seconds in self.stage_seconds.items():
+            source = "measured" if self.measured_stages.get(stage) else "default estimate"
+            print(f"   {stage:<14} {format_duration(seconds):>10}  ({source})")
+        print(f"   {'total':<14} {format_duration(self.total_seconds):>10}")
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def project_llm_seconds(
+    calls: int,
+    seconds_per_call: float,
+    concurrency: int = 1,
+    requests_per_minute: Optional[float] = None
+) -> float:
+    """Wall time for LLM calls: latency spread over the concurrency, but never faster than the rate limit."""
+    seconds = calls * seconds_per_call / max(1, concurrency)
+    if requests_per_minute:
+        seconds = max(seconds, calls * 60.0 / requests_per_minute)
+    return seconds
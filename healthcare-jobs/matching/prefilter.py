@@ -0,0 +1,188 @@
+"""
+Hard-constraint prefiltering for the matching pipeline.
+
+Before any embeddings are compared, each job's candidate pool is cut down to
+the candidates whose saved preferences allow the job at all (location, wage,
+department). Preferences come from the `preferences` column of u_candidates,
+in the camelCase shape written by the Next.js preferences page.
+
+Candidates who did not state a preference for a constraint are never pruned
+by it.
+"""
+
+import json
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from matching_algorithm import Job, Candidate
+
+
+STATE_ABBREVIATIONS = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR",
+    "california": "CA", "colorado": "CO", "connecticut": "CT", "delaware": "DE",
+    "district of columbia": "DC", "florida": "FL", "georgia": "GA", "hawaii": "HI",
+    "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA",
+    "kansas": "KS", "kentucky": "KY", "louisiana": "LA", "maine": "ME",
+    "maryland": "MD", "massachusetts": "MA", "michigan": "MI", "minnesota": "MN",
+    "mississippi": "MS", "missouri": "MO", "montana": "MT", "nebraska": "NE",
+    "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM",
+    "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH",
+    "oklahoma": "OK", "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI",
+    "south carolina": "SC", "south dakota": "SD", "tennessee": "TN", "texas": "TX",
+    "utah": "UT", "vermont": "VT", "virginia": "VA", "washington": "WA",
+    "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+}
+
+
+def normalize_state(state: Optional[str]) -> str:
+    """Normalize a state name or abbreviation to its two-letter code."""
+    state = (state or "").strip()
+    if len(state) == 2:
+        return state.upper()
+    return STATE_ABBREVIATIONS.get(state.lower(), state.upper())
+
+
+def normalize_city(city: Optional[str]) -> str:
+    """Normalize a city/town name for lookups."""
+    return " ".join((city or "").lower().replace(".", "").split())
+
+
+def normalize_department(department: Optional[str]) -> str:
+    """Normalize a department name into a tag."""
+    return " ".join((department or "").lower().split())
+
+
+@dataclass
+class CandidateConstraints:
+    """Hard constraints parsed from a candidate's saved preferences"""
+    city: str = ""
+    state: str = ""
+    willing_to_relocate: bool = False
+    min_hourly_wage: Optional[float] = None
+    departments: Set[str] = field(default_factory=set)
+
+
+def parse_preferences(preferences) -> CandidateConstraints:
+    """
+    Parse the preferences saved by the Next.js app into hard constraints.
+    Accepts the raw dict or its JSON string; anything unparseable means
+    "no constraints".
+    """
+    if isinstance(preferences, str):
+        try:
+            preferences = json.loads(preferences)
+        except ValueError:
+            preferences = None
+    if not isinstance(preferences, dict):
+        return CandidateConstraints()
+
+    # "Hanover, NH" -> city="hanover", state="NH"; a lone value is a state if it looks like one
+    city, state = "", ""
+    location = preferences.get("preferredLocation") or ""
+    parts = [p.strip() for p in location.split(",") if p.strip()]
+    if len(parts) >= 2:
+        city, state = normalize_city(parts[0]), normalize_state(parts[-1])
+    elif len(parts) == 1:
+        if len(parts[0]) == 2 or parts[0].lower() in STATE_ABBREVIATIONS:
+            state = normalize_state(parts[0])
+        else:
+            city = normalize_city(parts[0])
+
+    try:
+        min_wage = float(preferences.get("minHourlyWage") or 0) or None
+    except (TypeError, ValueError):
+        min_wage = None
+
+    departments = {
+        normalize_department(d)
+        for d in preferences.get("preferredDepartments") or []
+        if normalize_department(d)
+    }
+
+    return CandidateConstraints(
+        city=city,
+        state=state,
+        willing_to_relocate=bool(preferences.get("willingToRelocate")),
+        min_hourly_wage=min_wage,
+        departments=departments
+    )
+
+
+class CandidateIndex:
+    """
+    Inverted indexes over candidate constraints, built once per run.
+
+    - state/city postings lists: candidate positions by preferred location
+      (city only when the candidate gave no state)
+    - wage interval index: candidate positions sorted by minimum desired wage,
+      so "who accepts at most $X/hr" is one binary search
+    - department tags: candidate positions by preferred department
+
+    Each index also keeps the set of candidates without that constraint.
+    """
+
+    def __init__(self, candidates: List["Candidate"]):
+        self.size = len(candidates)
+        self.constraints = [parse_preferences(c.preferences) for c in candidates]
+
+        self.any_location: Set[int] = set()
+        self.state_postings: Dict[str, Set[int]] = {}
+        self.city_postings: Dict[str, Set[int]] = {}
+        self.any_wage: Set[int] = set()
+        self.any_department: Set[int] = set()
+        self.department_postings: Dict[str, Set[int]] = {}
+
+        wage_entries: List[Tuple[float, int]] = []
+
+        for i, c in enumerate(self.constraints):
+            if c.willing_to_relocate or not (c.state or c.city):
+                self.any_location.add(i)
+            elif c.state:
+                self.state_postings.setdefault(c.state, set()).add(i)
+            else:
+                self.city_postings.setdefault(c.city, set()).add(i)
+
+            if c.min_hourly_wage is None:
+                self.any_wage.add(i)
+            else:
+                wage_entries.append((c.min_hourly_wage, i))
+
+            if not c.departments:
+                self.any_department.add(i)
+            for department in c.departments:
+                self.department_postings.setdefault(department, set()).add(i)
+
+        wage_entries.sort()
+        self._wage_minimums = np.array([w for w, _ in wage_entries], dtype=float)
+        self._wage_order = np.array([i for _, i in wage_entries], dtype=int)
+
+    def _location_feasible(self, job: "Job") -> Set[int]:
+        return (
+            self.any_location
+            | self.state_postings.get(normalize_state(job.state), set())
+            | self.city_postings.get(normalize_city(job.city), set())
+        )
+
+    def _wage_feasible(self, job: "Job") -> Optional[Set[int]]:
+        # A job without a posted maximum can't rule anyone out
+        if job.hourly_wage_maximum <= 0:
+            return None
+        # Candidates whose minimum desired wage the job can reach
+        cutoff = np.searchsorted(self._wage_minimums, job.hourly_wage_maximum, side="right")
+        return self.any_wage | set(self._wage_order[:cutoff].tolist())
+
+    def _department_feasible(self, job: "Job") -> Optional[Set[int]]:
+        department = normalize_department(getattr(job, "department", ""))
+        if not department:
+            return None
+        return self.any_department | self.department_postings.get(department, set())
+
+    def feasible_candidates(self, job: "Job") -> List[int]:
+        """Return the positions of candidates that satisfy every hard constraint for this job."""
+        feasible = self._location_feasible(job)
+        for constraint_set in (self._wage_feasible(job), self._department_feasible(job)):
+            if constraint_set is not None:
+                feasible &= constraint_set
+        return sorted(feasible)
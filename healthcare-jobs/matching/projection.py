@@ -0,0 +1,170 @@
+"""
+2-D projection of embeddings for visualization at large N.
+
+Exact t-SNE on the raw 1024-dim e5 vectors stops being usable after a few
+thousand resumes. Here embeddings are first reduced (PCA or random
+projection), optionally stratified-subsampled for plotting, and then laid out
+with an approximate-neighbor t-SNE (openTSNE if installed, otherwise
+sklearn's Barnes-Hut). Clustering runs on the reduced embeddings, never on
+the 2-D layout.
+"""
+
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.manifold import TSNE
+from sklearn.random_projection import GaussianRandomProjection
+
+
+@dataclass
+class Projection:
+    """Reduced embeddings for every point plus a 2-D layout of the plotted points"""
+    reduced: np.ndarray    # (n, n_components) for all n embeddings
+    coords: np.ndarray     # (m, 2) t-SNE coordinates, m <= n
+    indices: np.ndarray    # (m,) row in the original embeddings for each coords row
+
+
+def reduce_dimensions(
+    embeddings: np.ndarray,
+    n_components: int = 50,
+    method: str = "pca",
+    random_state: int = 42
+) -> np.ndarray:
+    """
+    Reduce embeddings to n_components dimensions.
+    "pca" uses randomized SVD; "random" uses a Gaussian random projection,
+    which is cheaper still for very large corpora.
+    """
+    n_samples, n_features = embeddings.shape
+    n_components = min(n_components, n_samples, n_features)
+    if n_components >= n_features:
+        return embeddings
+
+    if method == "random":
+        reducer = GaussianRandomProjection(n_components=n_components, random_state=random_state)
+    else:
+        reducer = PCA(n_components=n_components, svd_solver="randomized", random_state=random_state)
+    return reducer.fit_transform(embeddings)
+
+
+def stratified_sample(
+    labels: Sequence[int],
+    max_points: int,
+    always_include: Optional[Sequence[int]] = None,
+    random_state: int = 42
+) -> np.ndarray:
+    """
+    Pick at most max_points row indices, keeping each label's share of the
+    data. Rows in always_include (e.g. the ideal resume) are always kept.
+    """
+    labels = np.asarray(labels)
+    n_samples = len(labels)
+    if n_samples <= max_points:
+        return np.arange(n_samples)
+
+    rng = np.random.default_rng(random_state)
+    keep = np.unique(np.asarray(always_include or [], dtype=int))
+    budget = max(max_points - len(keep), 0)
+
+    chosen = []
+    for label in np.unique(labels):
+        members = np.setdiff1d(np.flatnonzero(labels == label), keep)
+        if members.size == 0:
+            continue
+        take = max(1, int(round(budget * members.size / n_samples)))
+        chosen.append(rng.choice(members, size=min(take, members.size), replace=False))
+
+    return np.sort(np.concatenate(chosen + [keep]).astype(int))
+
+
+def run_tsne(X: np.ndarray, random_state: int = 42) -> np.ndarray:
+    """
+    Lay out X in 2-D with an approximate t-SNE.
+    Uses openTSNE (FFT gradients, Annoy neighbors) when installed and falls
+    back to sklearn's Barnes-Hut implementation.
+    """
+    n_samples = X.shape[0]
+    perplexity = min(30, n_samples - 1)
+
+    try:
+        from openTSNE import TSNE as OpenTSNE
+
+        print(f"Computing t-SNE with openTSNE (n={n_samples}, perplexity={perplexity})...")
+        tsne = OpenTSNE(
+            perplexity=perplexity,
+            neighbors="approx",
+            negative_gradient_method="fft",
+            n_jobs=-1,
+            random_state=random_state
+        )
+        return np.asarray(tsne.fit(X))
+    except ImportError:
+        print(f"Computing Barnes-Hut t-SNE (n={n_samples}, perplexity={perplexity})...")
+        tsne = TSNE(
+            n_components=2,
+            perplexity=perplexity,
+            method="barnes_hut",
+            init="pca",
+            learning_rate="auto",
+            random_state=random_state
+        )
+        return tsne.fit_transform(X)
+
+
+def layout_embeddings(
+    reduced: np.ndarray,
+    labels: Optional[Sequence[int]] = None,
+    max_points: Optional[int] = None,
+    always_include: Optional[List[int]] = None,
+    random_state: int = 42
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    t-SNE already-reduced embeddings. With max_points set, only a stratified
+    sample (by labels) is laid out. Returns (coords, indices).
+    """
+    if max_points is not None and reduced.shape[0] > max_points:
+        sample_labels = labels if labels is not None else np.zeros(reduced.shape[0], dtype=int)
+        indices = stratified_sample(sample_labels, max_points, always_include, random_state)
+        print(f"Plotting a stratified sample of {len(indices)}/{reduced.shape[0]} points")
+    else:
+        indices = np.arange(reduced.shape[0])
+
+    return run_tsne(reduced[indices], random_state), indices
+
+
+def project_embeddings(
+    embeddings: np.ndarray,
+    labels: Optional[Sequence[int]] = None,
+    n_components: int = 50,
+    reduction: str = "pca",
+    max_points: Optional[int] = None,
+    always_include: Optional[List[int]] = None,
+    random_state: int = 42
+) -> Projection:
+    """
+    Reduce, optionally subsample, then t-SNE the embeddings.
+    With max_points set, only a stratified sample (by labels) is laid out;
+    the reduced embeddings still cover every point.
+    """
+    print(f"Reducing {embeddings.shape[0]} embeddings to {n_components} dimensions ({reduction})...")
+    reduced = reduce_dimensions(embeddings, n_components, reduction, random_state)
+    coords, indices = layout_embeddings(reduced, labels, max_points, always_include, random_state)
+    return Projection(reduced=reduced, coords=coords, indices=indices)
+
+
+def cluster_embeddings(
+    reduced: np.ndarray,
+    n_clusters: int = 5,
+    random_state: int = 42
+) -> np.ndarray:
+    """Cluster reduced embeddings with MiniBatchKMeans."""
+    print(f"Clustering {reduced.shape[0]} embeddings into {n_clusters} clusters...")
+    kmeans = MiniBatchKMeans(
+        n_clusters=n_clusters,
+        batch_size=1024,
+        n_init=3,
+        random_state=random_state
+    )
+    return kmeans.fit_predict(reduced)
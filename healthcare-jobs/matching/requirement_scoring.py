@@ -0,0 +1,105 @@
+"""
+Requirement-level scoring without an ideal resume.
+
+Instead of asking GPT-4o to write one ideal resume per job, each requirement
+string is embedded on its own. Requirements are deduplicated across all jobs
+(many postings share "BLS certification" or "Active RN license"), so each
+distinct string is encoded once and then served from the embedding cache.
+
+Resumes are split into chunks (lines / sentences), and a candidate's score
+for a requirement is its best-matching chunk (max-similarity). Scoring all
+candidates against a job is one matrix product plus a segmented max, and the
+per-requirement maxima double as a coverage report.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from matching_algorithm import Job
+
+# Resume chunks longer than this many words are split further
+MAX_CHUNK_WORDS = 60
+
+
+def normalize_requirement(text: str) -> str:
+    """Canonical form used to deduplicate requirement strings across jobs."""
+    return re.sub(r"\s+", " ", (text or "").strip().strip("•-*").strip()).lower()
+
+
+def job_requirements(job: "Job") -> List[str]:
+    """Normalized, de-duplicated requirements of a job (falls back to the title)."""
+    seen = []
+    for requirement in job.job_requirements or []:
+        normalized = normalize_requirement(requirement)
+        if normalized and normalized not in seen:
+            seen.append(normalized)
+    return seen or [normalize_requirement(job.job_name)]
+
+
+def unique_requirements(jobs: Sequence["Job"]) -> Tuple[List[str], Dict[str, List[int]]]:
+    """
+    Distinct requirement strings over all jobs, and for each job the rows of
+    its requirements in that list.
+    """
+    texts: List[str] = []
+    rows: Dict[str, int] = {}
+    job_rows: Dict[str, List[int]] = {}
+    for job in jobs:
+        job_rows[job.job_id] = []
+        for requirement in job_requirements(job):
+            if requirement not in rows:
+                rows[requirement] = len(texts)
+                texts.append(requirement)
+            job_rows[job.job_id].append(rows[requirement])
+    return texts, job_rows
+
+
+def resume_chunks(text: str, max_words: int = MAX_CHUNK_WORDS) -> List[str]:
+    """Split a resume into line/sentence chunks of at most max_words words."""
+    chunks = []
+    for piece in re.split(r"[\n\r•;]+|(?<=[.!?])\s+", text or ""):
+        words = piece.split()
+        for start in range(0, len(words), max_words):
+            chunk = " ".join(words[start:start + max_words])
+            if len(chunk) > 2:
+                chunks.append(chunk)
+    return chunks or [(text or "").strip() or "empty"]
+
+
+@dataclass
+class CandidateChunks:
+    """Chunk embeddings of several candidates stacked into one matrix"""
+    embeddings: np.ndarray  # (total chunks, dim)
+    offsets: np.ndarray     # first chunk row of each candidate
+
+    @classmethod
+    def from_blocks(cls, blocks: Sequence[np.ndarray]) -> "CandidateChunks":
+        """Stack per-candidate chunk matrices (each with at least one row)."""
+        offsets = np.cumsum([0] + [len(block) for block in blocks[:-1]])
+        return cls(np.vstack(blocks), offsets)
+
+    def candidate_means(self) -> np.ndarray:
+        """One normalized embedding per candidate (mean of its chunks)."""
+        means = np.add.reduceat(self.embeddings, self.offsets, axis=0)
+        return means / np.linalg.norm(means, axis=1, keepdims=True)
+
+
+def max_similarity(requirement_embeddings: np.ndarray, chunks: CandidateChunks) -> np.ndarray:
+    """
+    Best chunk similarity for every (requirement, candidate), as an
+    R x n_candidates matrix in [0, 1]. Embeddings must be normalized.
+    """
+    similarities = (requirement_embeddings @ chunks.embeddings.T + 1) / 2
+    return np.maximum.reduceat(similarities, chunks.offsets, axis=1)
+
+
+def requirement_scores(
+    per_requirement: np.ndarray,
+    coverage_threshold: float = 0.9
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean best-match similarity and fraction of requirements covered, per candidate."""
+    return per_requirement.mean(axis=0), (per_requirement >= coverage_threshold).mean(axis=0)
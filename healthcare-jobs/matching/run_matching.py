@@ -5,8 +5,56 @@ This can be run as a cron job or manually triggered.
 """
 
 import argparse
+import os
 import sys
-from matching_algorithm import run_matching_pipeline, fetch_jobs_from_db, fetch_candidates_from_db
+from typing import Optional
+
+from sharding import (
+    parse_shard_spec, write_shard_summary,
+    merge_shard_summaries, merge_job_indexes
+)
+from scheduler import PRIORITY_CRITERIA, parse_deadline, parse_priority
+
+
+def print_summary(results: dict) -> None:
+    print("\n📊 Results Summary:")
+    print(f"   Jobs processed: {results['jobs']}")
+    print(f"   Candidates evaluated: {results['candidates']}")
+    print(f"   Pairs scored: {results['pairs_scored']}/{results['pairs_total']} "
+          f"({results['prune_ratio']:.1%} pruned)")
+    print(f"   Matches created: {results['matches']}")
+    if results.get("writes"):
+        writes = results["writes"]
+        print(f"   DB writes: {writes['inserted']} inserted, {writes['updated']} updated, "
+              f"{writes['deleted']} deleted ({writes['unchanged']} unchanged skipped)")
+    if results.get("llm_calls_saved"):
+        print(f"   LLM calls saved by near-duplicate grouping: {results['llm_calls_saved']}")
+    if results.get("failed_jobs"):
+        print(f"   Jobs skipped (ideal resume failed): {len(results['failed_jobs'])}")
+    if results.get("leftover_jobs"):
+        print(f"   Jobs left for the next run: {len(results['leftover_jobs'])}"
+              + (f" ({results['stop_reason']} reached)" if results.get("stop_reason") else ""))
+    if results.get("stage_utilization"):
+        busiest = max(results["stage_utilization"], key=results["stage_utilization"].get)
+        print(f"   Bottleneck stage: {busiest} ({results['stage_utilization'][busiest]:.0%} busy)")
+
+
+def merge_shards(summary_dir: str, num_shards: Optional[int] = None) -> int:
+    """Coordinator: merge per-shard summaries and job indexes into one report."""
+    merged = merge_shard_summaries(summary_dir, num_shards)
+    print(f"🧩 Merged {merged['shards_completed']}/{merged['shards_expected']} shards (by {merged['shard_by']})")
+    if merged["missing_shards"]:
+        print(f"   ⚠️ Missing shards: {merged['missing_shards']}")
+    if merged["stale_summaries"]:
+        print(f"   Ignored {merged['stale_summaries']} summaries from runs with a different shard count")
+    
+    if merged["shard_by"] == "jobs":
+        index_path = merge_job_indexes(os.getenv("JOB_INDEX_PATH", "job_index.npz"), merged["shards_expected"])
+        if index_path:
+            print(f"   Job index merged into {index_path}")
+    
+    print_summary(merged)
+    return 0 if not merged["missing_shards"] else 1
 
 
 def main():
@@ -19,27 +67,187 @@ def main():
         default=0.5,
         help="Similarity threshold for matches (0-1). Default: 0.5"
     )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=None,
+        help="Keep at most this many matches per job (best first)"
+    )
+    parser.add_argument(
+        "--top-m",
+        type=int,
+        default=None,
+        help="Keep at most this many matches per candidate across all jobs (not with --shard-by jobs)"
+    )
+    parser.add_argument(
+        "--scoring",
+        choices=["ideal_resume", "requirements"],
+        default="ideal_resume",
+        help="'requirements' scores each job requirement separately without GPT-4o. Default: ideal_resume"
+    )
+    parser.add_argument(
+        "--recall-size",
+        type=int,
+        default=None,
+        help="Only encode and score each job's N best candidates by BM25 over its title and requirements"
+    )
+    parser.add_argument(
+        "--lexical-weight",
+        type=float,
+        default=0.0,
+        help="Blend this much normalized BM25 into the similarity score (0-1). Default: 0"
+    )
+    parser.add_argument(
+        "--no-prefilter",
+        action="store_true",
+        help="Score every candidate against every job, ignoring location/wage/department preferences"
+    )
+    parser.add_argument(
+        "--llm-concurrency",
+        type=int,
+        default=8,
+        help="Maximum ideal-resume GPT-4o calls in flight. Default: 8"
+    )
+    parser.add_argument(
+        "--llm-rpm",
+        type=float,
+        default=120,
+        help="Maximum ideal-resume GPT-4o calls started per minute. Default: 120"
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=16,
+        help="Items buffered between pipeline stages before the earlier stage waits. Default: 16"
+    )
+    parser.add_argument(
+        "--priority",
+        type=parse_priority,
+        default=list(PRIORITY_CRITERIA),
+        help="Job order, most significant first, from priority, unscored, stale, newest. "
+             "Default: priority,unscored,stale,newest"
+    )
+    parser.add_argument(
+        "--deadline",
+        type=parse_deadline,
+        default=None,
+        help="Start no new jobs after this time: a duration (90m, 2h) or a clock time (06:30). "
+             "Results so far are saved and leftover jobs go first next run"
+    )
+    parser.add_argument(
+        "--max-llm-calls",
+        type=int,
+        default=None,
+        help="Stop generating ideal resumes after this many GPT-4o calls; jobs needing more wait for the next run"
+    )
+    parser.add_argument(
+        "--write-epsilon",
+        type=float,
+        default=0.001,
+        help="Only rewrite an existing match if its score moved by more than this. Default: 0.001"
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.9,
+        help="Near-duplicate jobs at or above this MinHash similarity share one ideal resume. Default: 0.9"
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Generate an ideal resume for every job, even near-duplicates"
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard_spec,
+        default=None,
+        metavar="i/N",
+        help="Only process shard i of N (stable hash partitioning), e.g. --shard 0/4"
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=["jobs", "candidates"],
+        default="jobs",
+        help="What --shard partitions. 'candidates' reuses the existing job index. Default: jobs"
+    )
+    parser.add_argument(
+        "--summary-dir",
+        default="shard_summaries",
+        help="Where sharded workers write their summaries. Default: shard_summaries"
+    )
+    parser.add_argument(
+        "--merge-summaries",
+        action="store_true",
+        help="Coordinator mode: merge the shard summaries in --summary-dir and exit"
+    )
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        default=None,
+        help="With --merge-summaries: the run's shard count N. Default: N of the newest summary"
+    )
+    parser.add_argument(
+        "--artifacts-dir",
+        default=os.getenv("RUN_ARTIFACTS_DIR", "run_artifacts"),
+        help="Where the run's score table and embeddings are written. Default: run_artifacts"
+    )
+    parser.add_argument(
+        "--no-artifacts",
+        action="store_true",
+        help="Don't write run artifacts"
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
-        help="Show what would be matched without saving to database"
+        help="Print the execution plan (LLM calls, tokens, cost, projected time) without running it"
     )
     
     args = parser.parse_args()
     
+    if args.merge_summaries:
+        return merge_shards(args.summary_dir, args.num_shards)
+    if args.top_m and args.shard is not None and args.shard_by == "jobs":
+        # Each job shard only sees its own jobs, so N shards could keep N x M per candidate
+        parser.error("--top-m needs every job in one run; use --shard-by candidates")
+    
+    # Loads the embedding model, so only import when actually matching
+    from matching_algorithm import run_matching_pipeline, plan_matching_pipeline
+    
+    pipeline_args = dict(
+        similarity_threshold=args.threshold,
+        use_prefilter=not args.no_prefilter,
+        shard=args.shard,
+        shard_by=args.shard_by,
+        llm_concurrency=args.llm_concurrency,
+        llm_requests_per_minute=args.llm_rpm,
+        dedup_threshold=None if args.no_dedup else args.dedup_threshold,
+        top_k=args.top_k,
+        top_m=args.top_m,
+        lexical_weight=args.lexical_weight,
+        recall_size=args.recall_size,
+        scoring=args.scoring
+    )
+    
     if args.dry_run:
         print("🔍 DRY RUN MODE - No changes will be saved")
-        jobs = fetch_jobs_from_db()
-        candidates = fetch_candidates_from_db()
-        print(f"Would process {len(jobs)} jobs and {len(candidates)} candidates")
-        return
+        plan_matching_pipeline(**pipeline_args).print()
+        return 0
     
-    results = run_matching_pipeline(similarity_threshold=args.threshold)
+    results = run_matching_pipeline(
+        **pipeline_args,
+        queue_size=args.queue_size,
+        write_epsilon=args.write_epsilon,
+        artifacts_dir=None if args.no_artifacts else args.artifacts_dir,
+        priority=args.priority,
+        deadline=args.deadline,
+        max_llm_calls=args.max_llm_calls
+    )
     
-    print("\n📊 Results Summary:")
-    print(f"   Jobs processed: {results['jobs']}")
-    print(f"   Candidates evaluated: {results['candidates']}")
-    print(f"   Matches created: {results['matches']}")
+    print_summary(results)
+    
+    if args.shard is not None:
+        path = write_shard_summary(results, args.shard, args.summary_dir)
+        print(f"   Shard summary written to {path}")
     
     return 0 if results['matches'] > 0 else 1
 
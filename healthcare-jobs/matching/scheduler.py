@@ -0,0 +1,142 @@
+"""
+Job ordering and run budgets for the matching pipeline.
+
+A nightly run that overruns should have spent its time on the jobs that
+matter most. JobScheduler orders jobs by a list of criteria, applied in turn:
+
+- priority: higher jobs.priority first (e.g. paying employers)
+- unscored: jobs never scored, or whose posting changed since, first
+- stale:    jobs scored longest ago first, so leftovers of an interrupted
+            run are picked up before anything else by the next one
+- newest:   most recently created postings first
+
+RunBudget stops a run cleanly at a wall-clock deadline or after a number of
+ideal-resume LLM calls. Jobs that were not reached keep their old scores
+and are first in line next time (they are the stalest), because the
+scheduler records when each job was last scored in SCHEDULE_STATE_PATH.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, TYPE_CHECKING
+
+from cache import job_fingerprint
+
+if TYPE_CHECKING:
+    from matching_algorithm import Job
+
+SCHEDULE_STATE_PATH = os.getenv("SCHEDULE_STATE_PATH", "schedule_state.json")
+PRIORITY_CRITERIA = ("priority", "unscored", "stale", "newest")
+
+
+def parse_deadline(spec: str, now: Optional[datetime] = None) -> float:
+    """
+    Deadline as a Unix timestamp, from a duration ('90m', '2h', '45s') or a
+    local clock time ('06:30', tomorrow if already past).
+    """
+    now = now or datetime.now()
+    duration = re.fullmatch(r"(\d+(?:\.\d+)?)([smh])", spec.strip())
+    if duration:
+        seconds = float(duration.group(1)) * {"s": 1, "m": 60, "h": 3600}[duration.group(2)]
+        return now.timestamp() + seconds
+    clock = re.fullmatch(r"(\d{1,2}):(\d{2})", spec.strip())
+    if clock:
+        deadline = now.replace(hour=int(clock.group(1)), minute=int(clock.group(2)), second=0, microsecond=0)
+        if deadline <= now:
+            deadline += timedelta(days=1)
+        return deadline.timestamp()
+    raise ValueError(f"Invalid deadline '{spec}', expected e.g. 90m, 2h or 06:30")
+
+
+def parse_priority(spec: str) -> List[str]:
+    """Comma-separated PRIORITY_CRITERIA, most significant first."""
+    return _check_criteria([name.strip() for name in spec.split(",") if name.strip()])
+
+
+def _check_criteria(order: Sequence[str]) -> List[str]:
+    unknown = set(order) - set(PRIORITY_CRITERIA)
+    if unknown:
+        raise ValueError(f"Unknown priority criteria {sorted(unknown)}; choose from {PRIORITY_CRITERIA}")
+    return list(order)
+
+
+def _timestamp(value: Optional[str]) -> float:
+    """Unix time of an ISO timestamp; 0 if missing or unparseable (sorts as oldest)."""
+    try:
+        return datetime.fromisoformat((value or "").replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0.0
+
+
+class RunBudget:
+    """Wall-clock deadline and LLM call allowance for one run (thread-safe)."""
+
+    def __init__(self, deadline: Optional[float] = None, max_llm_calls: Optional[int] = None):
+        self.deadline = deadline
+        self.max_llm_calls = max_llm_calls
+        self.llm_calls = 0
+        self.stop_reason: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def expired(self) -> bool:
+        """True once the deadline has passed; the run should start no new jobs."""
+        if self.deadline is not None and time.time() >= self.deadline:
+            with self._lock:
+                self.stop_reason = self.stop_reason or "deadline"
+            return True
+        return False
+
+    def take_llm_call(self) -> bool:
+        """Reserve one LLM call. False when the allowance is used up."""
+        with self._lock:
+            if self.max_llm_calls is not None and self.llm_calls >= self.max_llm_calls:
+                self.stop_reason = self.stop_reason or "llm_budget"
+                return False
+            self.llm_calls += 1
+            return True
+
+
+class JobScheduler:
+    """Orders jobs by PRIORITY_CRITERIA and remembers when each was last scored."""
+
+    def __init__(self, order: Sequence[str] = PRIORITY_CRITERIA, state_path: str = SCHEDULE_STATE_PATH):
+        self.order = _check_criteria(order)
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        # job_id -> {"fingerprint": ..., "scored_at": unix time}
+        self._state: Dict[str, Dict] = {}
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                self._state = json.load(f)
+
+    def _key(self, job: "Job") -> tuple:
+        entry = self._state.get(job.job_id)
+        unscored = entry is None or entry["fingerprint"] != job_fingerprint(job)
+        keys = {
+            "priority": -job.priority,
+            "unscored": not unscored,
+            "stale": entry["scored_at"] if entry else 0.0,
+            "newest": -_timestamp(job.created_at),
+        }
+        return tuple(keys[name] for name in self.order)
+
+    def prioritize(self, jobs: Iterable["Job"]) -> List["Job"]:
+        """Jobs in the order they should be processed (stable for ties)."""
+        return sorted(jobs, key=self._key)
+
+    def mark_scored(self, jobs: Iterable["Job"]) -> None:
+        now = time.time()
+        with self._lock:
+            for job in jobs:
+                self._state[job.job_id] = {"fingerprint": job_fingerprint(job), "scored_at": now}
+
+    def save(self) -> None:
+        with self._lock:
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._state, f)
+            os.replace(tmp_path, self.state_path)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Pre-fork server for the matching API.
+
+`uvicorn --workers N` starts N fresh interpreters, each loading its own copy
+of the embedding model, job index and embedding caches. Here the parent loads
+all of that once, binds the listening socket, then forks N workers that
+serve from the same socket. Model weights and numpy matrices are only read
+after the fork, so their pages stay shared copy-on-write between workers and
+memory stays close to a single copy.
+
+gc.freeze() moves everything loaded so far out of the garbage collector's
+reach; otherwise the first collection in each worker touches (and copies)
+every object header. Each worker uses a single torch thread so N workers
+don't oversubscribe the cores.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+# Tokenizer thread pools don't survive fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def load_shared_state():
+    """Import the app (loads the model) and read everything workers only read."""
+    import api_endpoint
+    job_index = api_endpoint.get_job_index()
+    print(f"Job index: {len(job_index.job_ids) if job_index else 0} jobs")
+    print(f"Requirement cache: {len(api_endpoint.requirement_cache)} embeddings")
+    return api_endpoint.app
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket) -> None:
+    """Serve requests from the shared socket until told to stop."""
+    import torch
+    import uvicorn
+
+    # Restore default handling so uvicorn can install its own
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    torch.set_num_threads(1)
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+    server.run(sockets=[sock])
+
+
+def spawn(app, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(app, sock)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the matching API with pre-forked workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes. Default: one per core"
+    )
+    args = parser.parse_args()
+
+    app = load_shared_state()
+    sock = bind_socket(args.host, args.port)
+
+    # Everything loaded so far is long-lived; keep the GC off those pages
+    gc.collect()
+    gc.freeze()
+
+    workers: Dict[int, int] = {}
+    for slot in range(args.workers):
+        workers[spawn(app, sock)] = slot
+    print(f"🚀 Serving on {args.host}:{args.port} with {args.workers} workers (parent pid {os.getpid()})")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Supervise: replace workers that die unexpectedly
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = workers.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        print(f"⚠️ Worker {pid} exited with status {status}; restarting")
+        time.sleep(1)
+        workers[spawn(app, sock)] = slot
+
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Sharding helpers for running the matching pipeline on several machines.
+
+Jobs (or candidates) are assigned to shards by a stable hash of their id, so
+every worker started with the same --shard i/N spec picks the same disjoint
+slice on every run and no (job, candidate) pair is written twice. Each worker
+writes a JSON summary; the coordinator merges them into one report.
+"""
+
+import glob
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+Shard = Tuple[int, int]  # (index, count)
+
+
+def parse_shard_spec(spec: str) -> Shard:
+    """Parse "i/N" into (i, N). Raises ValueError for malformed specs."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard spec '{spec}', expected i/N (e.g. 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard spec '{spec}', need 0 <= i < N")
+    return index, count
+
+
+def shard_of(key: str, num_shards: int) -> int:
+    """Stable shard number for a key (same on every machine and Python run)."""
+    digest = hashlib.md5(str(key).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % num_shards
+
+
+def in_shard(key: str, shard: Optional[Shard]) -> bool:
+    """True if the key belongs to the shard (always true when not sharding)."""
+    if shard is None:
+        return True
+    index, count = shard
+    return shard_of(key, count) == index
+
+
+def shard_label(shard: Shard) -> str:
+    return f"{shard[0]}-of-{shard[1]}"
+
+
+def shard_path(path: str, shard: Optional[Shard]) -> str:
+    """Per-shard variant of a file path, e.g. job_index.npz -> job_index.shard-0-of-4.npz."""
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard_label(shard)}{ext}"
+
+
+def write_shard_summary(results: Dict, shard: Shard, summary_dir: str) -> str:
+    """Write one worker's results as JSON. Returns the file path."""
+    os.makedirs(summary_dir, exist_ok=True)
+    path = os.path.join(summary_dir, f"shard-{shard_label(shard)}.json")
+    with open(path, "w") as f:
+        json.dump({**results, "shard": list(shard)}, f, indent=2)
+    return path
+
+
+def merge_shard_summaries(summary_dir: str, num_shards: Optional[int] = None) -> Dict:
+    """
+    Combine the per-shard summaries of one N-shard run into one run report.
+    N defaults to that of the most recently written summary; summaries left
+    over from runs with a different N are ignored (and counted as stale).
+    Reports missing shards so an incomplete run isn't mistaken for a full one.
+    """
+    paths = sorted(glob.glob(os.path.join(summary_dir, "shard-*.json")), key=os.path.getmtime)
+    if not paths:
+        raise FileNotFoundError(f"No shard summaries found in {summary_dir}")
+    all_summaries = []
+    for path in paths:
+        with open(path) as f:
+            all_summaries.append(json.load(f))
+
+    if num_shards is None:
+        num_shards = all_summaries[-1]["shard"][1]
+    summaries = [s for s in all_summaries if s["shard"][1] == num_shards]
+    if not summaries:
+        raise FileNotFoundError(f"No summaries of a {num_shards}-shard run in {summary_dir}")
+    seen = {s["shard"][0] for s in summaries}
+    shard_by = summaries[0].get("shard_by", "jobs")
+
+    merged = {
+        "shards_expected": num_shards,
+        "shards_completed": len(seen),
+        "missing_shards": sorted(set(range(num_shards)) - seen),
+        "stale_summaries": len(all_summaries) - len(summaries),
+        "shard_by": shard_by,
+    }
+    for key in ("jobs", "matches", "pairs_total", "pairs_scored", "llm_calls_saved"):
+        merged[key] = sum(s.get(key, 0) for s in summaries)
+    merged["writes"] = {
+        key: sum(s.get("writes", {}).get(key, 0) for s in summaries)
+        for key in ("inserted", "updated", "deleted", "unchanged")
+    }
+    merged["failed_jobs"] = [job_id for s in summaries for job_id in s.get("failed_jobs", [])]
+    merged["leftover_jobs"] = [job_id for s in summaries for job_id in s.get("leftover_jobs", [])]
+    # The unsharded side is the same full set on every worker
+    if shard_by == "jobs":
+        merged["candidates"] = max(s.get("candidates", 0) for s in summaries)
+    else:
+        merged["candidates"] = sum(s.get("candidates", 0) for s in summaries)
+        merged["jobs"] = max(s.get("jobs", 0) for s in summaries)
+    merged["prune_ratio"] = (
+        1 - merged["pairs_scored"] / merged["pairs_total"] if merged["pairs_total"] else 0.0
+    )
+    return merged
+
+
+def merge_job_indexes(index_path: str, num_shards: int) -> Optional[str]:
+    """
+    Concatenate the per-shard job indexes of an N-shard run
+    (job_index.shard-*-of-N.npz) into index_path. Indexes written by runs
+    with another shard count are ignored. Raises ValueError if the shards
+    were built with different embedding models or dimensions.
+    Returns the merged path, or None if there were no shard indexes.
+    """
+    root, ext = os.path.splitext(index_path)
+    paths = sorted(glob.glob(f"{root}.shard-*-of-{num_shards}{ext}"))
+    if not paths:
+        return None
+
+    loaded = [(path, np.load(path)) for path in paths]
+    paths = [path for path, p in loaded if len(p["job_ids"])]
+    parts = [p for _, p in loaded if len(p["job_ids"])]
+    if not parts:
+        return None
+    models = [str(p["model"]) if "model" in p else None for p in parts]
+    dims = [p["embeddings"].shape[1] for p in parts]
+    for path, model, dim in zip(paths, models, dims):
+        if model != models[0] or dim != dims[0]:
+            raise ValueError(
+                f"{path} was built with {model} ({dim}-d) but {paths[0]} with "
+                f"{models[0]} ({dims[0]}-d); rerun the shards with one model"
+            )
+    np.savez_compressed(
+        index_path,
+        job_ids=np.concatenate([p["job_ids"] for p in parts]),
+        ideal_resumes=np.concatenate([p["ideal_resumes"] for p in parts]),
+        embeddings=np.vstack([p["embeddings"] for p in parts]),
+        **({"model": parts[0]["model"]} if "model" in parts[0] else {})
+    )
+    return index_path
@@ -0,0 +1,188 @@
+"""
+Staged execution with bounded queues.
+
+A StagePipeline is a chain of stages, each run by its own worker threads and
+connected to the next by a bounded queue. A stage function takes one item and
+returns an iterable of items for the next stage (empty to drop it), so a
+stage can filter, pass through or fan out. When a downstream stage falls
+behind its queue fills up and upstream workers block (backpressure) instead
+of piling results up in memory.
+
+Every stage tracks time spent working, waiting for input and blocked on a full
+output queue, so the report shows which stage is the bottleneck: it is the
+one that is busy while the others wait.
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """One step of the pipeline and its timing counters"""
+    name: str
+    fn: Callable[[Any], Optional[Iterable[Any]]]
+    workers: int = 1
+    queue_size: int = 16
+    items_in: int = 0
+    items_out: int = 0
+    busy_seconds: float = 0.0
+    idle_seconds: float = 0.0
+    blocked_seconds: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def utilization(self, wall_seconds: float) -> float:
+        """Fraction of the run this stage's workers spent working."""
+        if wall_seconds <= 0:
+            return 0.0
+        return self.busy_seconds / (wall_seconds * self.workers)
+
+
+class StagePipeline:
+    """Runs items from a source through stages connected by bounded queues (one run per instance)."""
+
+    def __init__(self):
+        self.stages: List[Stage] = []
+        self.wall_seconds = 0.0
+
+    def add_stage(
+        self,
+        name: str,
+        fn: Callable[[Any], Optional[Iterable[Any]]],
+        workers: int = 1,
+        queue_size: int = 16
+    ) -> "StagePipeline":
+        """Append a stage; queue_size bounds the queue feeding it."""
+        self.stages.append(Stage(name, fn, max(1, workers), max(1, queue_size)))
+        return self
+
+    def run(self, source: Iterable[Any], source_name: str = "fetch") -> None:
+        """
+        Feed every item of source through the stages and wait for them to
+        drain. The source is consumed on its own thread and reported as a
+        stage named source_name. If any stage raises, the run stops and the
+        first error is re-raised here.
+        """
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        source_stage = Stage(source_name, fn=lambda item: [item])
+        self.stages.insert(0, source_stage)
+        errors: List[BaseException] = []
+        stop = threading.Event()
+
+        def put(stage: Stage, q: "queue.Queue", item: Any) -> None:
+            started = time.perf_counter()
+            # After a failure only end markers still flow, so every worker exits
+            while item is _DONE or not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            with stage.lock:
+                stage.blocked_seconds += time.perf_counter() - started
+
+        def feed() -> None:
+            out = queues[0] if queues else None
+            iterator = iter(source)
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        break
+                    finally:
+                        source_stage.busy_seconds += time.perf_counter() - started
+                    source_stage.items_out += 1
+                    if out is not None:
+                        put(source_stage, out, item)
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                if out is not None:
+                    put(source_stage, out, _DONE)
+
+        finished_workers = [0] * len(self.stages)
+
+        def work(position: int) -> None:
+            stage = self.stages[position + 1]
+            inbox = queues[position]
+            outbox = queues[position + 1] if position + 1 < len(queues) else None
+            while True:
+                started = time.perf_counter()
+                item = inbox.get()
+                with stage.lock:
+                    stage.idle_seconds += time.perf_counter() - started
+                if item is _DONE:
+                    # Let sibling workers see the end marker too
+                    inbox.put(_DONE)
+                    break
+                if stop.is_set():
+                    continue
+                started = time.perf_counter()
+                try:
+                    outputs = list(stage.fn(item) or [])
+                except BaseException as e:
+                    errors.append(e)
+                    stop.set()
+                    continue
+                finally:
+                    with stage.lock:
+                        stage.busy_seconds += time.perf_counter() - started
+                        stage.items_in += 1
+                with stage.lock:
+                    stage.items_out += len(outputs)
+                if outbox is not None:
+                    for output in outputs:
+                        put(stage, outbox, output)
+
+            with stage.lock:
+                finished_workers[position] += 1
+                last = finished_workers[position] == stage.workers
+            if last and outbox is not None:
+                put(stage, outbox, _DONE)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=feed, name=source_name, daemon=True)]
+        for position, stage in enumerate(self.stages[1:]):
+            threads += [
+                threading.Thread(target=work, args=(position,), name=f"{stage.name}-{i}", daemon=True)
+                for i in range(stage.workers)
+            ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.wall_seconds = time.perf_counter() - started
+
+        if errors:
+            raise errors[0]
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage counters and utilization for the last run."""
+        return {
+            stage.name: {
+                "workers": stage.workers,
+                "items_in": stage.items_in,
+                "items_out": stage.items_out,
+                "busy_seconds": round(stage.busy_seconds, 3),
+                "idle_seconds": round(stage.idle_seconds, 3),
+                "blocked_seconds": round(stage.blocked_seconds, 3),
+                "utilization": round(stage.utilization(self.wall_seconds), 3),
+            }
+            for stage in self.stages
+        }
+
+    def print_report(self) -> None:
+        print(f"\n⏱️ Stage utilization (wall time {self.wall_seconds:.1f}s)")
+        bottleneck = max(self.stages, key=lambda s: s.utilization(self.wall_seconds), default=None)
+        for stage in self.stages:
+            marker = "  ← bottleneck" if stage is bottleneck else ""
+            print(f"   {stage.name:<10} x{stage.workers:<3} {stage.utilization(self.wall_seconds):>6.1%} busy, "
+                  f"{stage.blocked_seconds:>7.1f}s blocked downstream, {stage.items_out} out{marker}")
@@ -0,0 +1,417 @@
+"""
+Data access for the jobs, candidates and matches tables.
+
+Both matching scripts read and write rows through a Storage backend instead
+of a Supabase client directly:
+
+- SupabaseStorage: the production database (paginated reads, bulk inserts)
+- SQLiteStorage: an embedded local database with bulk insert/upsert and
+  indexed key lookups, for offline backfills and benchmarking at scale
+
+Pick the backend with STORAGE_BACKEND=supabase|sqlite (SQLITE_PATH sets the
+file, default matching.db). To work offline, copy the tables once:
+
+    python storage.py copy --to matching.db jobs u_candidates
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Sequence
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "matching.db")
+
+# Columns identifying a row in each table; these are indexed by SQLiteStorage
+TABLE_KEYS: Dict[str, Sequence[str]] = {
+    "jobs": ("job_id",),
+    "u_candidates": ("user_id",),
+    "matches": ("job_id", "user_id"),
+    "matching_jobs": ("Job ID",),
+    "matching_candidates": ("Number",),
+    "matches_duplicates": (),
+}
+
+
+class Storage:
+    """Row-level access to named tables. Rows are plain dicts."""
+
+    def select_all(self, table: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def select_where(self, table: str, **equals) -> List[Dict]:
+        """Rows whose columns equal the given values."""
+        raise NotImplementedError
+
+    def insert_many(self, table: str, rows: List[Dict]) -> None:
+        raise NotImplementedError
+
+    def upsert_many(
+        self,
+        table: str,
+        rows: List[Dict],
+        key_columns: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None
+    ) -> None:
+        """
+        Insert rows, or update rows that already exist with the same key.
+        Existing rows only have update_columns changed (all columns if None),
+        so fields other processes own (e.g. questionnaire_sent) are kept.
+        """
+        raise NotImplementedError
+
+    def update_many(
+        self,
+        table: str,
+        rows: List[Dict],
+        key_columns: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
+        """
+        Like upsert_many, but rows whose key does not exist yet are skipped
+        instead of inserted. Returns the rows that were updated.
+        """
+        raise NotImplementedError
+
+    def delete_many(
+        self,
+        table: str,
+        keys: List[Dict],
+        key_columns: Sequence[str],
+        where: Optional[Dict] = None
+    ) -> None:
+        """
+        Delete the rows whose key_columns equal those of each dict in keys
+        and, if given, whose other columns equal where (rows that don't are kept).
+        """
+        raise NotImplementedError
+
+
+class SupabaseStorage(Storage):
+    """Supabase/PostgREST backend."""
+
+    def __init__(self, client=None, page_size: int = 1000):
+        if client is None:
+            from supabase import create_client
+            client = create_client(os.getenv("SUPABASE_URL", ""), os.getenv("SUPABASE_SERVICE_KEY", ""))
+        self.client = client
+        self.page_size = page_size
+
+    def select_all(self, table: str) -> List[Dict]:
+        # PostgREST caps each response, so read in pages. Without an order the
+        # database may return rows in a different order per request, and pages
+        # would skip or repeat rows, so order by the table's key columns.
+        rows = []
+        while True:
+            query = self.client.table(table).select("*")
+            for column in TABLE_KEYS.get(table, ()):
+                query = query.order(column)
+            page = query.range(len(rows), len(rows) + self.page_size - 1).execute().data
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+
+    def select_where(self, table: str, **equals) -> List[Dict]:
+        query = self.client.table(table).select("*")
+        for column, value in equals.items():
+            query = query.eq(column, value)
+        return query.execute().data
+
+    def insert_many(self, table: str, rows: List[Dict]) -> None:
+        for start in range(0, len(rows), self.page_size):
+            self.client.table(table).insert(rows[start:start + self.page_size]).execute()
+
+    def upsert_many(
+        self,
+        table: str,
+        rows: List[Dict],
+        key_columns: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None
+    ) -> None:
+        if not rows:
+            return
+        existing = self._existing_keys(table, rows, key_columns)
+        self.insert_many(table, [r for r in rows if tuple(r[c] for c in key_columns) not in existing])
+        self._update_rows(
+            table, [r for r in rows if tuple(r[c] for c in key_columns) in existing], key_columns, update_columns
+        )
+
+    def update_many(
+        self,
+        table: str,
+        rows: List[Dict],
+        key_columns: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
+        if not rows:
+            return []
+        existing = self._existing_keys(table, rows, key_columns)
+        updated = [r for r in rows if tuple(r[c] for c in key_columns) in existing]
+        self._update_rows(table, updated, key_columns, update_columns)
+        return updated
+
+    def _existing_keys(self, table: str, rows: List[Dict], key_columns: Sequence[str]) -> set:
+        # One lookup per batch for which keys exist, keyed on the first column
+        first = key_columns[0]
+        existing = set()
+        values = sorted({row[first] for row in rows}, key=str)
+        for start in range(0, len(values), self.page_size):
+            found = self.client.table(table).select(",".join(key_columns)).in_(
+                first, values[start:start + self.page_size]
+            ).execute().data
+            existing.update(tuple(r[c] for c in key_columns) for r in found)
+        return existing
+
+    def _update_rows(
+        self,
+        table: str,
+        rows: List[Dict],
+        key_columns: Sequence[str],
+        update_columns: Optional[Sequence[str]]
+    ) -> None:
+        # PostgREST has no multi-row update with per-row values
+        for row in rows:
+            changes = {c: row[c] for c in (update_columns or row) if c not in key_columns}
+            query = self.client.table(table).update(changes)
+            for column in key_columns:
+                query = query.eq(column, row[column])
+            query.execute()
+
+    def delete_many(
+        self,
+        table: str,
+        keys: List[Dict],
+        key_columns: Sequence[str],
+        where: Optional[Dict] = None
+    ) -> None:
+        # One request per value of the leading key columns, filtering the last with in_
+        *leading, last = key_columns
+        groups: Dict[tuple, List] = {}
+        for key in keys:
+            groups.setdefault(tuple(key[c] for c in leading), []).append(key[last])
+        for prefix, values in groups.items():
+            for start in range(0, len(values), self.page_size):
+                query = self.client.table(table).delete()
+                for column, value in list(zip(leading, prefix)) + list((where or {}).items()):
+                    query = query.eq(column, value)
+                query.in_(last, values[start:start + self.page_size]).execute()
+
+
+# SQLite connections must not be used across fork() (serve.py forks workers
+# after matching_algorithm created its module-level storage), so each child
+# reopens its own on first use
+_sqlite_instances: "weakref.WeakSet[SQLiteStorage]" = weakref.WeakSet()
+_inherited_connections: List[sqlite3.Connection] = []
+
+
+def _reset_sqlite_after_fork() -> None:
+    for instance in list(_sqlite_instances):
+        instance._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_sqlite_after_fork)
+
+
+class SQLiteStorage(Storage):
+    """
+    Embedded backend. Each table keeps its key columns as indexed SQL columns
+    and the full row as JSON, so any row shape can be stored.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._tables = set()
+        _sqlite_instances.add(self)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """
+        This process's connection, opened on first use. Callers hold self._lock,
+        which is what makes sharing it across threads (check_same_thread=False) safe.
+        """
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        return self._connection
+
+    def _after_fork(self) -> None:
+        """
+        Drop the parent's connection and lock in a forked child. The inherited
+        connection is kept referenced, never closed: closing it here could run a
+        WAL checkpoint or release file locks on behalf of the parent.
+        """
+        if self._connection is not None:
+            _inherited_connections.append(self._connection)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _table(self, table: str) -> Sequence[str]:
+        """Create the table and its key index on first use; returns its key columns."""
+        keys = TABLE_KEYS.get(table, ())
+        if table not in self._tables:
+            columns = "".join(f", {_quote(c)}" for c in keys)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {_quote(table)} (rowid INTEGER PRIMARY KEY{columns}, data TEXT NOT NULL)"
+            )
+            if keys:
+                self._conn.execute(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote(table + '_key')} "
+                    f"ON {_quote(table)} ({', '.join(_quote(c) for c in keys)})"
+                )
+            self._tables.add(table)
+        return keys
+
+    def select_all(self, table: str) -> List[Dict]:
+        with self._lock:
+            self._table(table)
+            cursor = self._conn.execute(f"SELECT data FROM {_quote(table)} ORDER BY rowid")
+            return [json.loads(data) for (data,) in cursor]
+
+    def select_where(self, table: str, **equals) -> List[Dict]:
+        with self._lock:
+            keys = self._table(table)
+            # Key columns use the index; anything else is read from the JSON
+            clauses = [
+                f"{_quote(c)} = ?" if c in keys else "json_extract(data, ?) = ?"
+                for c in equals
+            ]
+            params: List = []
+            for column, value in equals.items():
+                params += [value] if column in keys else [f'$."{column}"', value]
+            cursor = self._conn.execute(
+                f"SELECT data FROM {_quote(table)}" + (f" WHERE {' AND '.join(clauses)}" if clauses else ""),
+                params
+            )
+            return [json.loads(data) for (data,) in cursor]
+
+    def insert_many(self, table: str, rows: List[Dict]) -> None:
+        with self._lock:
+            keys = self._table(table)
+            columns = [_quote(c) for c in keys] + ["data"]
+            self._conn.executemany(
+                f"INSERT INTO {_quote(table)} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                ([row.get(c) for c in keys] + [json.dumps(row, default=str)] for row in rows)
+            )
+            self._conn.commit()
+
+    def upsert_many(
+        self,
+        table: str,
+        rows: List[Dict],
+        key_columns: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None
+    ) -> None:
+        with self._lock:
+            self._upsert(table, rows, key_columns, update_columns)
+
+    def update_many(
+        self,
+        table: str,
+        rows: List[Dict],
+        key_columns: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
+        with self._lock:
+            self._table(table)
+            lookup = f"SELECT 1 FROM {_quote(table)} WHERE " + " AND ".join(f"{_quote(c)} = ?" for c in key_columns)
+            updated = [
+                row for row in rows
+                if self._conn.execute(lookup, [row[c] for c in key_columns]).fetchone() is not None
+            ]
+            self._upsert(table, updated, key_columns, update_columns)
+            return updated
+
+    def _upsert(
+        self,
+        table: str,
+        rows: List[Dict],
+        key_columns: Sequence[str],
+        update_columns: Optional[Sequence[str]]
+    ) -> None:
+        """upsert_many; the caller holds self._lock."""
+        keys = self._table(table)
+        if tuple(key_columns) != tuple(keys):
+            raise ValueError(f"{table} is keyed on {keys}, not {tuple(key_columns)}")
+        columns = [_quote(c) for c in keys] + ["data"]
+        # Merge only update_columns into the stored JSON of existing rows
+        if update_columns is None:
+            merged = "excluded.data"
+        else:
+            merged = "json_set(data, " + ", ".join(
+                f"'$.\"{c}\"', json_extract(excluded.data, '$.\"{c}\"')" for c in update_columns
+            ) + ")"
+        self._conn.executemany(
+            f"INSERT INTO {_quote(table)} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT ({', '.join(_quote(c) for c in keys)}) DO UPDATE SET data = {merged}",
+            ([row.get(c) for c in keys] + [json.dumps(row, default=str)] for row in rows)
+        )
+        self._conn.commit()
+
+    def delete_many(
+        self,
+        table: str,
+        keys: List[Dict],
+        key_columns: Sequence[str],
+        where: Optional[Dict] = None
+    ) -> None:
+        with self._lock:
+            self._table(table)
+            where = where or {}
+            clauses = [f"{_quote(c)} = ?" for c in key_columns] + ["json_extract(data, ?) = ?" for _ in where]
+            extra: List = []
+            for column, value in where.items():
+                extra += [f'$."{column}"', value]
+            self._conn.executemany(
+                f"DELETE FROM {_quote(table)} WHERE " + " AND ".join(clauses),
+                ([key[c] for c in key_columns] + extra for key in keys)
+            )
+            self._conn.commit()
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def get_storage(backend: Optional[str] = None) -> Storage:
+    """Storage backend named by STORAGE_BACKEND (default: supabase)."""
+    backend = backend or os.getenv("STORAGE_BACKEND", "supabase")
+    if backend == "supabase":
+        return SupabaseStorage()
+    if backend == "sqlite":
+        return SQLiteStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}', expected supabase or sqlite")
+
+
+def copy_tables(source: Storage, destination: Storage, tables: Iterable[str]) -> Dict[str, int]:
+    """Copy whole tables between backends. Returns rows copied per table."""
+    copied = {}
+    for table in tables:
+        rows = source.select_all(table)
+        keys = TABLE_KEYS.get(table, ())
+        if keys:
+            destination.upsert_many(table, rows, keys)
+        else:
+            destination.insert_many(table, rows)
+        copied[table] = len(rows)
+    return copied
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Copy tables from Supabase into a local SQLite database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    copy_parser = subparsers.add_parser("copy", help="Copy tables from Supabase into SQLite")
+    copy_parser.add_argument("tables", nargs="+", choices=sorted(TABLE_KEYS))
+    copy_parser.add_argument("--to", default=SQLITE_PATH, help=f"SQLite file. Default: {SQLITE_PATH}")
+    args = parser.parse_args()
+
+    for table, count in copy_tables(SupabaseStorage(), SQLiteStorage(args.to), args.tables).items():
+        print(f"Copied {count} rows from {table}")
@@ -5,37 +5,47 @@ Based on professor's t-SNE and clustering code.
 
 import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.manifold import TSNE
-from sklearn.cluster import KMeans
-from sklearn.feature_extraction.text import TfidfVectorizer
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Sequence, Tuple
 from matching_algorithm import compute_embeddings
+from artifacts import latest_run, load_embeddings, load_manifest, load_scores
+from projection import project_embeddings, cluster_embeddings
+from analysis_session import AnalysisSession, fit_tfidf, keywords_for_groups
+
+
+def _marker_size(n_points: int, small: int = 100) -> float:
+    """Shrink markers as the number of plotted points grows."""
+    return small if n_points <= 1000 else max(1.0, small * 1000 / n_points)
 
 
 def visualize_embeddings_tsne(
     embeddings: np.ndarray,
     labels: List[int],
     label_names: Dict[int, str],
-    save_path: str = "tsne_visualization.png"
-) -> None:
+    save_path: str = "tsne_visualization.png",
+    max_points: Optional[int] = None,
+    session: Optional[AnalysisSession] = None
+) -> np.ndarray:
     """
     Create t-SNE visualization of embeddings with labeled clusters.
     Based on professor's visualization code.
+    Set max_points to plot a stratified sample of very large corpora.
+    With a session, its cached projection is reused and embeddings may be None.
+    Returns the 2-D coordinates of the plotted points.
     """
-    n_samples = embeddings.shape[0]
-    perplexity = min(30, n_samples - 1)
-    
-    print(f"Computing t-SNE (perplexity={perplexity})...")
-    tsne = TSNE(n_components=2, perplexity=perplexity, learning_rate=200, random_state=42)
-    X_embedded = tsne.fit_transform(embeddings)
+    if session is not None:
+        projection = session.projection()
+    else:
+        projection = project_embeddings(embeddings, labels, max_points=max_points)
+    X_embedded = projection.coords
+    plotted_labels = np.asarray(labels)[projection.indices]
     
     # Define markers for different sources
     markers = {0: "o", 1: "^", 2: "s", 3: "D", 4: "v", 5: "p", 6: "*", 7: "h"}
     
     plt.figure(figsize=(12, 10))
     
-    for source in np.unique(labels):
-        indices = [i for i, label in enumerate(labels) if label == source]
+    for source in np.unique(plotted_labels):
+        indices = np.flatnonzero(plotted_labels == source)
         marker = markers.get(source % len(markers), "o")
         plt.scatter(
             X_embedded[indices, 0], 
@@ -43,7 +53,7 @@ def visualize_embeddings_tsne(
             marker=marker,
             label=label_names.get(source, f"Source {source}"),
             alpha=0.7,
-            s=100
+            s=_marker_size(len(X_embedded))
         )
     
     plt.title("t-SNE Visualization of Job Matching Embeddings")
@@ -62,24 +72,28 @@ def cluster_and_visualize(
     embeddings: np.ndarray,
     texts: List[str],
     n_clusters: int = 5,
-    save_path: str = "cluster_visualization.png"
+    save_path: str = "cluster_visualization.png",
+    max_points: Optional[int] = None,
+    session: Optional[AnalysisSession] = None
 ) -> Tuple[np.ndarray, Dict[int, List[str]]]:
     """
     Cluster embeddings and visualize with cluster centers.
     Based on professor's KMeans clustering code.
+    Clusters are computed on the reduced embeddings for every text; only the
+    plot is subsampled when max_points is set.
+    With a session, its cached projection, clusters and TF-IDF are reused.
     """
-    # Compute t-SNE first
-    n_samples = embeddings.shape[0]
-    perplexity = min(30, n_samples - 1)
+    if session is not None:
+        projection = session.projection()
+        cluster_labels = session.cluster_labels(n_clusters)
+        texts = session.texts
+    else:
+        projection = project_embeddings(embeddings, max_points=max_points)
+        # Cluster the reduced embeddings, not the 2-D t-SNE output
+        cluster_labels = cluster_embeddings(projection.reduced, n_clusters)
     
-    print("Computing t-SNE...")
-    tsne = TSNE(n_components=2, perplexity=perplexity, learning_rate=200, random_state=42)
-    X_embedded = tsne.fit_transform(embeddings)
-    
-    # Cluster the t-SNE output
-    print(f"Clustering into {n_clusters} clusters...")
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    cluster_labels = kmeans.fit_predict(X_embedded)
+    X_embedded = projection.coords
+    plotted_clusters = cluster_labels[projection.indices]
     
     # Group texts by cluster
     clustered_texts = {}
@@ -89,13 +103,15 @@ def cluster_and_visualize(
         clustered_texts[label].append(texts[i])
     
     # Get top keywords for each cluster using TF-IDF
-    cluster_keywords = get_cluster_keywords(clustered_texts)
+    if session is not None:
+        cluster_keywords = session.cluster_keywords(n_clusters)
+    else:
+        cluster_keywords = get_cluster_keywords(clustered_texts)
     
-    # Compute cluster centers
+    # Compute cluster centers in the 2-D layout
     cluster_centers = {}
-    for label in np.unique(cluster_labels):
-        indices = [i for i, lab in enumerate(cluster_labels) if lab == label]
-        center = np.mean(X_embedded[indices], axis=0)
+    for label in np.unique(plotted_clusters):
+        center = np.mean(X_embedded[plotted_clusters == label], axis=0)
         cluster_centers[label] = center
     
     # Plot
@@ -103,10 +119,10 @@ def cluster_and_visualize(
     scatter = plt.scatter(
         X_embedded[:, 0], 
         X_embedded[:, 1], 
-        c=cluster_labels, 
+        c=plotted_clusters, 
         cmap='viridis', 
         alpha=0.7,
-        s=100
+        s=_marker_size(len(X_embedded))
     )
     
     # Annotate cluster centers with keywords
@@ -142,74 +158,54 @@ def get_cluster_keywords(
     """
     Get representative keywords for each cluster using TF-IDF.
     Based on professor's TF-IDF keyword extraction.
+    One TF-IDF model is fit over all clusters and sliced per cluster.
     """
-    # Custom stopwords for healthcare/resume context
-    custom_stopwords = [
-        "the", "to", "and", "of", "at", "my", "a", "an", "in", "is", "for", "with",
-        "i", "we", "this", "about", "by", "your", "as", "be", "that", "can",
-        "have", "has", "will", "would", "should", "may", "must", "could",
-        "it", "on", "or", "are", "was", "were", "been", "being", "do", "does",
-        "did", "but", "if", "so", "such", "no", "not", "only", "than", "too",
-        "very", "just", "also", "more", "most", "some", "any", "each", "all",
-        "both", "few", "own", "other", "same", "different", "new", "old",
-        "work", "working", "experience", "years", "year", "patient", "patients"
-    ]
-    
-    cluster_keywords = {}
+    groups = {}
+    docs = []
+    for label, cluster_docs in clustered_texts.items():
+        groups[label] = list(range(len(docs), len(docs) + len(cluster_docs)))
+        docs.extend(cluster_docs)
     
-    for label, docs in clustered_texts.items():
-        if not docs:
-            cluster_keywords[label] = f"Cluster {label}"
-            continue
-            
-        try:
-            vectorizer = TfidfVectorizer(
-                stop_words=custom_stopwords,
-                ngram_range=(1, 2),
-                max_features=1000
-            )
-            X = vectorizer.fit_transform(docs)
-            
-            # Sum TF-IDF scores for each term
-            scores = X.sum(axis=0).A1
-            terms = vectorizer.get_feature_names_out()
-            top_indices = scores.argsort()[::-1][:top_n]
-            
-            top_terms = [terms[i] for i in top_indices]
-            cluster_keywords[label] = ", ".join(top_terms[:2])  # Top 2 for label
-        except Exception as e:
-            cluster_keywords[label] = f"Cluster {label}"
+    try:
+        matrix, terms = fit_tfidf(docs)
+    except ValueError:
+        # Empty vocabulary (e.g. only stopwords)
+        return {label: f"Cluster {label}" for label in clustered_texts}
     
-    return cluster_keywords
+    return keywords_for_groups(matrix, terms, groups, top_n)
 
 
 def compare_candidates_to_ideal(
     ideal_resume_text: str,
     candidate_texts: List[str],
     candidate_names: List[str],
-    save_path: str = "candidate_comparison.png"
+    save_path: str = "candidate_comparison.png",
+    max_points: Optional[int] = None,
+    session: Optional[AnalysisSession] = None
 ) -> None:
     """
     Visualize how candidates compare to the ideal resume.
+    With max_points set, a random sample of candidates is plotted (the ideal
+    resume is always included).
+    With a session, texts already in its corpus are not re-encoded and the
+    projection is cached.
     """
     # Combine texts
     all_texts = [ideal_resume_text] + candidate_texts
     labels = [0] + [1] * len(candidate_texts)  # 0 = ideal, 1 = candidates
     
-    # Compute embeddings
-    print("Computing embeddings...")
-    embeddings = compute_embeddings(all_texts)
-    
-    # t-SNE
-    n_samples = len(all_texts)
-    perplexity = min(30, n_samples - 1)
-    
-    tsne = TSNE(n_components=2, perplexity=perplexity, learning_rate=200, random_state=42)
-    X_embedded = tsne.fit_transform(embeddings)
+    if session is not None:
+        projection = session.projection(all_texts, labels, always_include=[0])
+    else:
+        # Compute embeddings
+        print("Computing embeddings...")
+        embeddings = compute_embeddings(all_texts)
+        projection = project_embeddings(embeddings, labels, max_points=max_points, always_include=[0])
+    X_embedded = projection.coords
     
     plt.figure(figsize=(12, 10))
     
-    # Plot ideal resume
+    # Plot ideal resume (row 0 is always kept, so it stays at position 0)
     plt.scatter(
         X_embedded[0, 0], 
         X_embedded[0, 1], 
@@ -222,8 +218,10 @@ def compare_candidates_to_ideal(
     )
     
     # Plot candidates
-    for i, name in enumerate(candidate_names):
-        idx = i + 1  # Skip ideal at index 0
+    for idx, original_idx in enumerate(projection.indices):
+        if original_idx == 0:
+            continue  # Skip ideal
+        name = candidate_names[original_idx - 1]
         plt.scatter(
             X_embedded[idx, 0], 
             X_embedded[idx, 1], 
@@ -250,29 +248,63 @@ def compare_candidates_to_ideal(
 
 
 def plot_similarity_distribution(
-    similarity_scores: List[float],
-    threshold: float = 0.5,
-    save_path: str = "similarity_distribution.png"
+    similarity_scores: Optional[Sequence[float]] = None,
+    threshold: Optional[float] = 0.5,
+    save_path: str = "similarity_distribution.png",
+    run_dir: Optional[str] = None
 ) -> None:
     """
     Plot histogram of similarity scores with threshold line.
+    With run_dir (see artifacts.py), every pair scored in that run is read
+    from its score table and the threshold defaults to the run's own.
     """
+    if run_dir is not None:
+        similarity_scores = load_scores(run_dir, ["score"])["score"]
+        similarity_scores = similarity_scores[~np.isnan(similarity_scores)]
+        threshold = load_manifest(run_dir)["params"].get("similarity_threshold", threshold)
+    
     plt.figure(figsize=(10, 6))
     
     plt.hist(similarity_scores, bins=20, edgecolor='black', alpha=0.7, color='steelblue')
-    plt.axvline(x=threshold, color='red', linestyle='--', linewidth=2, label=f'Threshold ({threshold})')
+    if threshold is not None:
+        plt.axvline(x=threshold, color='red', linestyle='--', linewidth=2, label=f'Threshold ({threshold})')
     
     plt.xlabel('Similarity Score')
-    plt.ylabel('Number of Matches')
+    plt.ylabel('Number of Scored Pairs' if run_dir is not None else 'Number of Matches')
     plt.title('Distribution of Match Similarity Scores')
-    plt.legend()
+    if threshold is not None:
+        plt.legend()
     plt.tight_layout()
     plt.savefig(save_path, dpi=150)
     plt.show()
     print(f"Distribution plot saved to {save_path}")
 
 
+def visualize_run_embeddings(
+    run_dir: Optional[str] = None,
+    save_path: str = "run_embeddings_tsne.png",
+    max_points: Optional[int] = None
+) -> np.ndarray:
+    """
+    t-SNE of the job and candidate embeddings saved by a run (the latest
+    pipeline run by default), read from its memory-mapped matrix instead of
+    re-encoding anything.
+    """
+    run_dir = run_dir or latest_run(kind="matching_pipeline")
+    if run_dir is None:
+        raise FileNotFoundError("No run artifacts found; run run_matching.py first")
+    run = load_embeddings(run_dir)
+    if run is None:
+        raise ValueError(f"{run_dir} has no embeddings")
+    labels = (run.kinds == "candidate").astype(int)
+    return visualize_embeddings_tsne(
+        run.matrix, labels, {0: "Jobs", 1: "Candidates"}, save_path=save_path, max_points=max_points
+    )
+
+
 if __name__ == "__main__":
     # Example usage
     print("Visualization utilities loaded.")
     print("Use visualize_embeddings_tsne(), cluster_and_visualize(), etc.")
+    print("Pass session=AnalysisSession(texts) to reuse embeddings, projections and TF-IDF across calls.")
+    print("Use plot_similarity_distribution(run_dir=...) and visualize_run_embeddings() on saved runs.")